@@ -1,15 +1,58 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { MongoClient } from 'mongodb';
 import { v4 as uuidv4 } from 'uuid';
-import { DhanBroker, mapProductTypeToDhan, mapExchangeSegment } from '@/lib/brokers/dhan';
+import { DhanBroker, dhanScheduler, mapProductTypeToDhan, mapExchangeSegment, orderCorrelationId } from '@/lib/brokers/dhan';
+import { MockBroker } from '@/lib/brokers/mock';
+import { OrderReconciler, FINAL_ORDER_STATUSES } from '@/lib/reconciler';
+import { ConnectionVerifier } from '@/lib/verifier';
+import { mapWithConcurrency, BatchWriter, DEFAULT_FANOUT_CONCURRENCY } from '@/lib/fanout';
+import { LRUCache } from '@/lib/cache';
+import { SnapshotCache } from '@/lib/snapshots';
+import { decodeCursor, parsePageSize, fetchPage, keysetFilter, ndjsonResponse, KEYSET_SORT } from '@/lib/pagination';
+import { InstrumentSearchIndex } from '@/lib/search';
+import { metrics, PhaseTimer } from '@/lib/metrics';
+import { TrafficRecorder } from '@/lib/recorder';
+import { ActiveSubscriberSet, resolveDhanConnection } from '@/lib/subscribers';
+import { ROLLUP_COLLECTION, recordExecutionRollups, rollupDay, withRates } from '@/lib/rollups';
 
 const client = new MongoClient(process.env.MONGO_URL);
 let db;
 
+// Polls Dhan for the final state of accepted orders (ORDER_RECONCILE_INTERVAL_MS=0 disables)
+const orderReconciler = new OrderReconciler({
+  intervalMs: parseInt(process.env.ORDER_RECONCILE_INTERVAL_MS || '5000', 10),
+  batchSize: parseInt(process.env.ORDER_RECONCILE_BATCH_SIZE || '200', 10),
+  concurrency: parseInt(process.env.ORDER_RECONCILE_CONCURRENCY || '10', 10),
+  ratePerSec: parseFloat(process.env.ORDER_RECONCILE_RPS || '20'),
+  leaseMs: parseInt(process.env.ORDER_RECONCILE_LEASE_MS || '60000', 10)
+});
+
+// Verifies pending Dhan connections and re-verifies connected ones before
+// market open (BROKER_VERIFY_INTERVAL_MS=0 disables, BROKER_VERIFY_SWEEP_AT='' skips the sweep)
+const connectionVerifier = new ConnectionVerifier({
+  intervalMs: parseInt(process.env.BROKER_VERIFY_INTERVAL_MS || '5000', 10),
+  batchSize: parseInt(process.env.BROKER_VERIFY_BATCH_SIZE || '200', 10),
+  concurrency: parseInt(process.env.BROKER_VERIFY_CONCURRENCY || '10', 10),
+  ratePerSec: parseFloat(process.env.BROKER_VERIFY_RPS || '10'),
+  reverifyMs: parseInt(process.env.BROKER_REVERIFY_MS || '21600000', 10),
+  leaseMs: parseInt(process.env.BROKER_VERIFY_LEASE_MS || '60000', 10),
+  sweepAt: process.env.BROKER_VERIFY_SWEEP_AT ?? '08:30',
+  onChange: async (userIds) => {
+    for (const userId of userIds) {
+      invalidateUser(userId);
+      invalidateBrokerSnapshots(userId);
+      await activeSubscribers.refresh(userId);
+    }
+  }
+});
+
 async function connectDB() {
   if (!db) {
     await client.connect();
     db = client.db(process.env.DB_NAME || 'stocksync');
+    orderReconciler.start(db);
+    connectionVerifier.start(db);
+    mockBroker.connect(db);
   }
   return db;
 }
@@ -28,46 +71,53 @@ const dhanMock = {
     { symbol: 'BHARTIARTL', securityId: '10604', name: 'Bharti Airtel Ltd', price: 1520.40, exchange: 'NSE' },
     { symbol: 'KOTAKBANK', securityId: '1922', name: 'Kotak Mahindra Bank Ltd', price: 1890.65, exchange: 'NSE' },
     { symbol: 'LT', securityId: '11483', name: 'Larsen & Toubro Ltd', price: 3560.25, exchange: 'NSE' }
-  ],
+  ]
+};
 
-  // Mock order placement response
-  placeOrder: (orderData) => {
-    const orderId = `ORD${Date.now()}${Math.floor(Math.random() * 1000)}`;
-    return {
-      orderId: orderId,
-      status: 'PENDING',
-      orderStatus: 'PLACED',
-      transactionType: orderData.transactionType,
-      exchangeSegment: orderData.exchangeSegment,
-      productType: orderData.productType,
-      orderType: orderData.orderType,
-      tradingSymbol: orderData.tradingSymbol,
-      securityId: orderData.securityId,
-      quantity: orderData.quantity,
-      price: orderData.price,
-      timestamp: new Date().toISOString()
-    };
-  },
-
-  // Mock holdings response
-  getHoldings: (userId) => {
-    return [
-      { symbol: 'RELIANCE', quantity: 50, avgPrice: 2800, currentPrice: 2950.50, totalValue: 147525 },
-      { symbol: 'TCS', quantity: 25, avgPrice: 4000, currentPrice: 4120.75, totalValue: 103018.75 },
-      { symbol: 'HDFCBANK', quantity: 100, avgPrice: 1500, currentPrice: 1580.25, totalValue: 158025 }
-    ];
-  },
-
-  // Mock funds response
-  getFunds: (userId) => {
-    return {
-      availablecash: Math.floor(Math.random() * 500000) + 100000, // Random between 1L to 6L
-      collateral: 0,
-      intraday: Math.floor(Math.random() * 1000000) + 200000,
-      total: function() { return this.availablecash + this.intraday; }
-    };
+// Seeded, Mongo-backed broker for subscribers without a broker connection
+const mockBroker = new MockBroker({
+  seed: parseInt(process.env.MOCK_BROKER_SEED || '42', 10),
+  failureRate: parseFloat(process.env.MOCK_BROKER_FAILURE_RATE || '0.1'),
+  latencyMs: parseFloat(process.env.MOCK_BROKER_LATENCY_MS || '0'),
+  jitterMs: parseFloat(process.env.MOCK_BROKER_JITTER_MS || '0'),
+  universe: dhanMock.stocks
+});
+
+// Instrument master search index, built once per process. INSTRUMENTS_FILE
+// points at a compact instrument file (see InstrumentSearchIndex.toCompact);
+// without it the mock stock list is indexed.
+const SEARCH_DEFAULT_LIMIT = 20;
+let instrumentIndex;
+
+function getInstrumentIndex() {
+  if (!instrumentIndex) {
+    instrumentIndex = process.env.INSTRUMENTS_FILE
+      ? InstrumentSearchIndex.fromFile(process.env.INSTRUMENTS_FILE)
+      : new InstrumentSearchIndex(dhanMock.stocks);
   }
-};
+  return instrumentIndex;
+}
+
+// Token -> user cache so protected requests skip the users lookup.
+// tokenByUserId lets writes keyed by user id invalidate the right entry.
+const tokenByUserId = new Map();
+const userCache = new LRUCache({
+  maxSize: parseInt(process.env.AUTH_CACHE_MAX_ENTRIES || '10000', 10),
+  ttlMs: parseInt(process.env.AUTH_CACHE_TTL_MS || '30000', 10),
+  onEvict: (token, user) => {
+    if (tokenByUserId.get(user.id) === token) {
+      tokenByUserId.delete(user.id);
+    }
+  }
+});
+
+// Drop a user's cached document after any write that changes it
+function invalidateUser(userId) {
+  const token = tokenByUserId.get(userId);
+  if (token) {
+    userCache.delete(token);
+  }
+}
 
 // Authentication helper
 async function authenticateUser(request) {
@@ -77,17 +127,593 @@ async function authenticateUser(request) {
   }
 
   const token = authHeader.substring(7);
+  const cached = userCache.get(token);
+  if (cached) {
+    return cached;
+  }
+
   const database = await connectDB();
   const user = await database.collection('users').findOne({ token });
+  if (user) {
+    userCache.set(token, user);
+    tokenByUserId.set(user.id, token);
+  }
   return user;
 }
 
+// In-memory active subscribers for execute-order, kept current by the write
+// hooks below, a users change stream (replica sets) and a periodic reload
+const activeSubscribers = new ActiveSubscriberSet({
+  resyncMs: parseInt(process.env.ACTIVE_SUBSCRIBERS_RESYNC_MS || '60000', 10),
+  useChangeStream: process.env.ACTIVE_SUBSCRIBERS_CHANGE_STREAM !== 'false'
+});
+
+// Broker holdings/funds snapshots shared by SELL sizing and the portfolio
+// and funds endpoints (keys: holdings:<userId>, funds:<userId>)
+const brokerSnapshots = new SnapshotCache({
+  ttlMs: parseInt(process.env.SNAPSHOT_TTL_MS || '15000', 10),
+  staleTtlMs: parseInt(process.env.SNAPSHOT_STALE_TTL_MS || '120000', 10),
+  maxSize: parseInt(process.env.SNAPSHOT_MAX_ENTRIES || '50000', 10)
+});
+
+// Active subscriber records carry the connection already resolved
+function getDhanConnection(user) {
+  return 'dhanConnection' in user ? user.dhanConnection : resolveDhanConnection(user);
+}
+
+function snapshotFetcher(kind, dhanConnection) {
+  return async () => {
+    const dhanBroker = new DhanBroker(dhanConnection.clientId, dhanConnection.accessToken);
+    return kind === 'holdings' ? dhanBroker.getHoldings() : dhanBroker.getFunds();
+  };
+}
+
+function getBrokerSnapshot(kind, user, dhanConnection, options) {
+  return brokerSnapshots.get(`${kind}:${user.id}`, snapshotFetcher(kind, dhanConnection), options);
+}
+
+function invalidateBrokerSnapshots(userId) {
+  brokerSnapshots.invalidate(`holdings:${userId}`);
+  brokerSnapshots.invalidate(`funds:${userId}`);
+}
+
+// Dhan holdings rows -> the { symbol, quantity } shape used for SELL sizing
+function normalizeDhanHoldings(data) {
+  const rows = Array.isArray(data) ? data : (data?.data || []);
+  return rows.map(row => ({
+    symbol: row.tradingSymbol,
+    quantity: row.availableQty ?? row.totalQty ?? 0,
+    avgPrice: row.avgCostPrice
+  }));
+}
+
 // Admin check helper
 function isAdmin(user) {
   return user && user.role === 'admin';
 }
 
-export async function POST(request, { params }) {
+// Paged (?limit=&cursor=) or NDJSON-streamed (?format=ndjson) execution history
+async function executionHistoryResponse(database, filter, url, defaultPageSize, key) {
+  const collection = database.collection('order_executions');
+
+  let cursorKey = null;
+  if (url.searchParams.get('cursor')) {
+    cursorKey = decodeCursor(url.searchParams.get('cursor'));
+    if (!cursorKey) {
+      return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+    }
+  }
+
+  if (url.searchParams.get('format') === 'ndjson') {
+    return ndjsonResponse(collection.find(keysetFilter(filter, cursorKey)).sort(KEYSET_SORT));
+  }
+
+  const pageSize = parsePageSize(url.searchParams.get('limit'), defaultPageSize);
+  const { docs, nextCursor } = await fetchPage(collection, filter, cursorKey, pageSize);
+  return NextResponse.json({ [key]: docs, nextCursor });
+}
+
+// Share of maxCapital a single BUY order may use. execution_worker.py and
+// tests/validate_sizing.py read the same BUY_CAPITAL_FRACTION setting.
+const BUY_CAPITAL_FRACTION = parseFloat(process.env.BUY_CAPITAL_FRACTION || '0.25');
+
+// A subscriber's holdings for SELL sizing: { holdings } or, when the broker
+// call fails, { holdings: null, errorReason }. Only a fresh snapshot is
+// used; a stale one is for display and could oversell.
+async function loadSubscriberHoldings(subscriber) {
+  const dhanConnection = getDhanConnection(subscriber);
+  if (!dhanConnection) {
+    return { holdings: await mockBroker.getHoldings(subscriber.id) };
+  }
+  try {
+    const snapshot = await getBrokerSnapshot('holdings', subscriber, dhanConnection, { allowStale: false });
+    return { holdings: normalizeDhanHoldings(snapshot.value) };
+  } catch (error) {
+    return { holdings: null, errorReason: `Dhan API error: ${error.message}` };
+  }
+}
+
+// Size and place one subscriber's order. Never throws: failures are
+// recorded on the returned execution document. Sizing and broker placement
+// times are recorded on `timer` when given. Basket legs pass their share of
+// the BUY budget as `capitalToUse`, the holdings loaded once for all SELL
+// legs, and the `basketId` stored on the execution.
+async function executeForSubscriber(subscriber, executionId, stock, order, timer = null, { capitalToUse, holdings: loadedHoldings, basketId } = {}) {
+  const { symbol, transactionType, orderType, quantity, price, productType } = order;
+  const sizingStarted = performance.now();
+
+  try {
+    let orderQuantity = quantity;
+    let canExecute = true;
+    let errorReason = null;
+
+    if (transactionType === 'BUY') {
+      // For buy orders, size by the order's share of max capital at the
+      // instrument's reference price (the order price only when it has none)
+      const budget = capitalToUse ?? subscriber.maxCapital * BUY_CAPITAL_FRACTION;
+      const maxQuantityBuyable = Math.floor(budget / (stock.price || price));
+      orderQuantity = Math.min(quantity, maxQuantityBuyable);
+
+      if (orderQuantity === 0) {
+        canExecute = false;
+        errorReason = 'Insufficient funds - cannot afford even 1 share';
+      }
+    } else if (transactionType === 'SELL') {
+      // For sell orders, check if user has the stock in portfolio
+      const loaded = loadedHoldings ?? await loadSubscriberHoldings(subscriber);
+      const holdings = loaded.holdings;
+      errorReason = loaded.errorReason || null;
+      const holding = holdings?.find(h => h.symbol === symbol);
+      
+      if (!holdings) {
+        canExecute = false;
+      } else if (!holding) {
+        canExecute = false;
+        errorReason = 'Stock not available in portfolio';
+      } else if (holding.quantity < quantity) {
+        orderQuantity = holding.quantity; // Sell available quantity
+      }
+    }
+
+    timer?.record('sizing', performance.now() - sizingStarted);
+
+    let orderResult = null;
+    if (canExecute) {
+      const dhanConnection = getDhanConnection(subscriber);
+      const placementStarted = performance.now();
+
+      if (dhanConnection) {
+        try {
+          const dhanBroker = new DhanBroker(dhanConnection.clientId, dhanConnection.accessToken);
+
+          const dhanOrderParams = {
+            transactionType,
+            exchangeSegment: mapExchangeSegment(stock.exchange),
+            productType: mapProductTypeToDhan(productType),
+            orderType,
+            securityId: stock.securityId,
+            tradingSymbol: symbol,
+            quantity: orderQuantity,
+            price: orderType === 'LIMIT' ? (price || stock.price) : undefined,
+            correlationId: orderCorrelationId(executionId, subscriber.id)
+          };
+
+          try {
+            orderResult = await dhanBroker.placeOrder(dhanOrderParams);
+          } finally {
+            timer?.record('broker', performance.now() - placementStarted);
+          }
+          orderResult.status = ['PENDING', 'TRANSIT', 'TRADED'].includes(orderResult.orderStatus) ? 'EXECUTED' : 'FAILED';
+          // The order changes holdings and funds; don't size the next one off the old snapshot
+          invalidateBrokerSnapshots(subscriber.id);
+        } catch (error) {
+          canExecute = false;
+          errorReason = `Dhan API error: ${error.message}`;
+        }
+      } else {
+        orderResult = await mockBroker.placeOrder(subscriber.id, `${executionId}:${subscriber.id}`, {
+          transactionType,
+          exchangeSegment: stock.exchange,
+          productType,
+          orderType,
+          tradingSymbol: symbol,
+          securityId: stock.securityId,
+          quantity: orderQuantity,
+          price: price || stock.price
+        });
+        timer?.record('broker', performance.now() - placementStarted);
+        if (orderResult.status !== 'EXECUTED') {
+          errorReason = orderResult.reason;
+        }
+      }
+
+      // A rejected order filled nothing (execution_worker.py records it the same way)
+      if (orderResult && orderResult.status !== 'EXECUTED') {
+        canExecute = false;
+      }
+    }
+
+    const status = canExecute && orderResult?.status === 'EXECUTED' ? 'SUCCESS' : 'FAILED';
+    // Accepted broker orders aren't filled yet; the reconciler records their final state
+    const awaitingFill = status === 'SUCCESS' && orderResult.broker === 'Dhan' && !FINAL_ORDER_STATUSES.has(orderResult.orderStatus);
+    return {
+      id: uuidv4(),
+      executionId,
+      userId: subscriber.id,
+      userEmail: subscriber.email,
+      symbol,
+      transactionType,
+      orderType,
+      productType,
+      requestedQuantity: quantity,
+      executedQuantity: canExecute ? orderQuantity : 0,
+      price: price || stock.price,
+      status,
+      errorReason,
+      orderDetails: orderResult,
+      ...(awaitingFill && { reconciliation: 'pending', nextReconcileAt: new Date() }),
+      ...(basketId && { basketId }),
+      timestamp: new Date()
+    };
+  } catch (error) {
+    return {
+      id: uuidv4(),
+      executionId,
+      userId: subscriber.id,
+      userEmail: subscriber.email,
+      symbol,
+      transactionType,
+      orderType,
+      productType,
+      requestedQuantity: quantity,
+      executedQuantity: 0,
+      price: price || stock.price,
+      status: 'FAILED',
+      errorReason: 'System error: ' + error.message,
+      ...(basketId && { basketId }),
+      timestamp: new Date()
+    };
+  }
+}
+
+const PREVIEW_DEFAULT_ROWS = 1000;
+const PREVIEW_MAX_ROWS = 20000;
+
+// Aggregation stages that size an order for every active subscriber the way
+// executeForSubscriber does, without calling the broker. SELL rows read mock
+// holdings from mock_accounts; Dhan-connected subscribers (broker holdings
+// aren't stored in Mongo) and mock accounts not created yet keep the
+// requested quantity and are flagged holdingsVerified: false. BUY rows are
+// sized at the instrument's reference price (the order price only when it
+// has none); notional uses the order price when given.
+function sizingPipeline(order, stock) {
+  const { symbol, transactionType, quantity, price } = order;
+  const unitPrice = price || stock.price;
+  const sizingPrice = stock.price || price;
+
+  const quantityExpr = transactionType === 'BUY'
+    ? { $min: [quantity, { $floor: { $divide: [{ $multiply: ['$maxCapital', BUY_CAPITAL_FRACTION] }, sizingPrice] } }] }
+    : { $cond: [{ $or: ['$brokerConnected', { $not: ['$hasMockAccount'] }] }, quantity, { $min: [quantity, '$mockHeld'] }] };
+  const mockHoldingStages = transactionType === 'BUY' ? [] : [
+    { $lookup: { from: 'mock_accounts', localField: 'userId', foreignField: 'userId', as: 'mockAccount' } },
+    {
+      $addFields: {
+        hasMockAccount: { $gt: [{ $size: '$mockAccount' }, 0] },
+        // Holdings are matched by symbol; symbols may contain '.', so never build a path from one
+        mockHeld: {
+          $sum: {
+            $map: {
+              input: {
+                $filter: {
+                  input: { $ifNull: [{ $arrayElemAt: ['$mockAccount.holdings', 0] }, []] },
+                  cond: { $eq: ['$$this.symbol', { $literal: symbol }] }
+                }
+              },
+              in: '$$this.quantity'
+            }
+          }
+        }
+      }
+    }
+  ];
+  const reasonExpr = transactionType === 'BUY'
+    ? { $cond: [{ $lte: ['$quantity', 0] }, 'Insufficient funds - cannot afford even 1 share', null] }
+    : { $cond: [{ $lte: ['$quantity', 0] }, 'Stock not available in portfolio', null] };
+
+  return [
+    { $match: { subscriptionStatus: 'active', role: 'user' } },
+    {
+      $project: {
+        _id: 0,
+        userId: '$id',
+        userEmail: '$email',
+        maxCapital: { $ifNull: ['$maxCapital', 0] },
+        brokerConnected: {
+          $anyElementTrue: [{
+            $map: {
+              input: { $ifNull: ['$brokerConnections', []] },
+              as: 'bc',
+              in: { $and: [{ $eq: ['$$bc.brokerName', 'Dhan'] }, { $eq: ['$$bc.status', 'connected'] }] }
+            }
+          }]
+        }
+      }
+    },
+    ...mockHoldingStages,
+    { $addFields: { quantity: quantityExpr } },
+    {
+      $addFields: {
+        quantity: { $max: ['$quantity', 0] },
+        notional: { $multiply: [{ $max: ['$quantity', 0] }, unitPrice] },
+        reason: reasonExpr,
+        holdingsVerified: transactionType === 'BUY' ? true : { $and: [{ $not: ['$brokerConnected'] }, '$hasMockAccount'] }
+      }
+    },
+    ...(mockHoldingStages.length ? [{ $project: { mockAccount: 0, hasMockAccount: 0, mockHeld: 0 } }] : [])
+  ];
+}
+
+const PROGRESS_UPDATE_INTERVAL_MS = 500;
+
+// Batched order_executions inserts, each followed by its rollup update. The
+// timer gets the inserts as db_write and the rollup updates as rollups.
+function executionBatchWriter(database, timer) {
+  return new BatchWriter(database.collection('order_executions'), undefined, {
+    onWrite: timer ? (ms) => timer.record('db_write', ms) : null,
+    afterInsert: (docs) => recordExecutionRollups(database, docs),
+    onAfterInsert: timer ? (ms) => timer.record('rollups', ms) : null
+  });
+}
+
+// Fan an order out to every subscriber with bounded concurrency. Execution
+// records are written in batches; counts are kept incrementally so callers
+// that don't need the rows (keepResults: false) hold none of them in memory.
+async function runOrderFanout(database, { executionId, activeUsers, stock, order, concurrency, keepResults = true, onProgress = null, onResult = null, timer = null }) {
+  const executionWriter = executionBatchWriter(database, timer);
+  const counts = { processed: 0, successful: 0, failed: 0 };
+  const errorSummary = {};
+  let lastProgressAt = Date.now();
+
+  const results = await mapWithConcurrency(activeUsers, concurrency, async (subscriber) => {
+    const execution = await executeForSubscriber(subscriber, executionId, stock, order, timer);
+    executionWriter.add(execution);
+
+    counts.processed++;
+    if (execution.status === 'SUCCESS') {
+      counts.successful++;
+    } else {
+      counts.failed++;
+    }
+    if (execution.errorReason) {
+      errorSummary[execution.errorReason] = (errorSummary[execution.errorReason] || 0) + 1;
+    }
+    if (onResult) {
+      onResult(execution, counts);
+    }
+
+    if (onProgress && Date.now() - lastProgressAt >= PROGRESS_UPDATE_INTERVAL_MS) {
+      lastProgressAt = Date.now();
+      onProgress(counts);
+    }
+    return keepResults ? execution : null;
+  });
+
+  await executionWriter.flush();
+  return { results: keepResults ? results : null, counts, errorSummary };
+}
+
+const MAX_BASKET_LEGS = parseInt(process.env.MAX_BASKET_LEGS || '20', 10);
+
+// Fan a basket out in one pass over the subscribers. Each subscriber's
+// holdings are loaded once for all SELL legs; SELL legs are then placed
+// together, followed by the BUY legs, which split capitalFraction of
+// maxCapital by leg weight. Every leg has its own executionId, all
+// executions carry the basketId and go through one BatchWriter. Counts are
+// kept per leg and for the whole basket.
+async function runBasketFanout(database, { basketId, activeUsers, legs, capitalFraction, concurrency, keepResults = true, timer = null }) {
+  const executionWriter = executionBatchWriter(database, timer);
+  const counts = { processed: 0, successful: 0, failed: 0 };
+  const legCounts = legs.map(() => ({ processed: 0, successful: 0, failed: 0 }));
+  const errorSummary = {};
+  const sellLegs = legs.map((leg, index) => index).filter(index => legs[index].order.transactionType === 'SELL');
+  const buyLegs = legs.map((leg, index) => index).filter(index => legs[index].order.transactionType === 'BUY');
+  const buyWeight = buyLegs.reduce((sum, index) => sum + legs[index].weight, 0);
+
+  const results = await mapWithConcurrency(activeUsers, concurrency, async (subscriber) => {
+    const holdings = sellLegs.length > 0
+      ? (timer ? await timer.time('sizing', () => loadSubscriberHoldings(subscriber)) : await loadSubscriberHoldings(subscriber))
+      : undefined;
+    const place = (index) => {
+      const { executionId, stock, order, weight } = legs[index];
+      const capitalToUse = order.transactionType === 'BUY' ? subscriber.maxCapital * capitalFraction * weight / buyWeight : undefined;
+      return executeForSubscriber(subscriber, executionId, stock, order, timer, { capitalToUse, holdings, basketId });
+    };
+    const executions = [...await Promise.all(sellLegs.map(place)), ...await Promise.all(buyLegs.map(place))];
+    const legIndexes = [...sellLegs, ...buyLegs];
+
+    executions.forEach((execution, position) => {
+      executionWriter.add(execution);
+      const legCount = legCounts[legIndexes[position]];
+      for (const tally of [counts, legCount]) {
+        tally.processed++;
+        if (execution.status === 'SUCCESS') {
+          tally.successful++;
+        } else {
+          tally.failed++;
+        }
+      }
+      if (execution.errorReason) {
+        errorSummary[execution.errorReason] = (errorSummary[execution.errorReason] || 0) + 1;
+      }
+    });
+    return keepResults ? executions : null;
+  });
+
+  await executionWriter.flush();
+  return { results: keepResults ? results.flat() : null, counts, legCounts, errorSummary };
+}
+
+// JSON response carrying the timer's phases in a Server-Timing header
+function timedJsonResponse(timer, body, status = 200) {
+  const json = timer.timeSync('serialize', () => JSON.stringify(body));
+  return new NextResponse(json, {
+    status,
+    headers: { 'Content-Type': 'application/json', 'Server-Timing': timer.finish() }
+  });
+}
+
+// NDJSON progress stream for execute-order with `stream: true`: a `started`
+// line, a `result` line per subscriber as its placement finishes (with the
+// running counts) and a final `completed` line carrying the errorSummary and
+// the timer's phases. Lines finishing in the same turn share one chunk.
+// The fan-out always runs to the end, even if the client disconnects.
+function executionStreamResponse(database, { executionId, activeUsers, stock, order, concurrency, timer }) {
+  const encoder = new TextEncoder();
+  const startedAt = Date.now();
+  let controller;
+  let open = true;
+  let pending = [];
+  let flushScheduled = false;
+
+  const flush = () => {
+    flushScheduled = false;
+    if (open && pending.length > 0) {
+      controller.enqueue(encoder.encode(pending.join('')));
+    }
+    pending = [];
+  };
+  const send = (line) => {
+    if (!open) {
+      return;
+    }
+    pending.push(JSON.stringify(line) + '\n');
+    if (!flushScheduled) {
+      flushScheduled = true;
+      setImmediate(flush);
+    }
+  };
+  const end = (line) => {
+    send(line);
+    flush();
+    if (open) {
+      open = false;
+      controller.close();
+    }
+  };
+
+  const stream = new ReadableStream({
+    start(streamController) {
+      controller = streamController;
+      send({ type: 'started', executionId, totalSubscribers: activeUsers.length });
+
+      runOrderFanout(database, {
+        executionId,
+        activeUsers,
+        stock,
+        order,
+        concurrency,
+        keepResults: false,
+        timer,
+        onResult: (execution, counts) => send({
+          type: 'result',
+          result: compactExecution(execution),
+          ...counts,
+          elapsedMs: Date.now() - startedAt
+        })
+      }).then(({ counts, errorSummary }) => end({
+        type: 'completed',
+        executionId,
+        totalSubscribers: activeUsers.length,
+        successfulExecutions: counts.successful,
+        failedExecutions: counts.failed,
+        errorSummary,
+        elapsedMs: Date.now() - startedAt,
+        serverTiming: timer.finish()
+      })).catch((error) => {
+        console.error('Streamed execution failed:', error);
+        end({ type: 'error', executionId, error: error.message });
+      });
+    },
+    cancel() {
+      open = false;
+    }
+  });
+
+  return new Response(stream, {
+    headers: { 'Content-Type': 'application/x-ndjson', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no' }
+  });
+}
+
+// Queue one execution task per subscriber for execution_worker.py. Tasks
+// carry the order and instrument; workers load the subscriber when they run.
+async function enqueueExecutionTasks(database, { executionId, activeUsers, stock, order }) {
+  const writer = new BatchWriter(database.collection('execution_tasks'));
+  const createdAt = new Date();
+  const { symbol, securityId, price, exchange } = stock;
+  for (const subscriber of activeUsers) {
+    writer.add({
+      id: uuidv4(),
+      executionId,
+      userId: subscriber.id,
+      order,
+      stock: { symbol, securityId, price, exchange },
+      status: 'queued',
+      attempts: 0,
+      leaseUntil: null,
+      createdAt
+    });
+  }
+  await writer.flush();
+}
+
+// Fields the dashboard and tester read from each result row
+function compactExecution(execution) {
+  const { id, userId, userEmail, symbol, status, executedQuantity, errorReason } = execution;
+  return { id, userId, userEmail, symbol, status, executedQuantity, errorReason };
+}
+
+// Traffic recording for replay_traffic.py, enabled by TRAFFIC_LOG_FILE.
+// Bodies are kept only for routes that can't be replayed without them.
+const trafficRecorder = process.env.TRAFFIC_LOG_FILE ? new TrafficRecorder(process.env.TRAFFIC_LOG_FILE) : null;
+const RECORDED_BODIES = new Set(['admin/execute-order', 'admin/execute-basket', 'admin/update-subscription', 'user/update-capital']);
+
+async function withTrafficRecording(request, context, handler) {
+  if (!trafficRecorder) {
+    return handler(request, context);
+  }
+
+  const startedAt = Date.now();
+  const started = performance.now();
+  const path = context.params.path ? context.params.path.join('/') : '';
+  const body = request.method === 'POST' && RECORDED_BODIES.has(path)
+    ? await request.clone().json().catch(() => null)
+    : null;
+
+  const response = await handler(request, context);
+
+  // Served from the auth cache the handler just filled
+  const user = await authenticateUser(request).catch(() => null);
+  trafficRecorder.record({
+    startedAt,
+    durationMs: performance.now() - started,
+    method: request.method,
+    path: path + new URL(request.url).search,
+    status: response.status,
+    actor: user ? `${user.role}:${user.id}` : null,
+    body
+  });
+  return response;
+}
+
+export async function POST(request, context) {
+  return withTrafficRecording(request, context, handlePost);
+}
+
+export async function GET(request, context) {
+  return withTrafficRecording(request, context, handleGet);
+}
+
+async function handlePost(request, { params }) {
   try {
     const database = await connectDB();
     const path = params.path ? params.path.join('/') : '';
@@ -149,8 +775,11 @@ export async function POST(request, { params }) {
       });
     }
 
+    // Phase timing for the order fan-out (Server-Timing + admin/metrics)
+    const timer = path === 'admin/execute-order' || path === 'admin/execute-basket' ? new PhaseTimer(path) : null;
+
     // Protected routes - require authentication
-    const user = await authenticateUser(request);
+    const user = timer ? await timer.time('auth', () => authenticateUser(request)) : await authenticateUser(request);
     if (!user) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     }
@@ -163,153 +792,311 @@ export async function POST(request, { params }) {
 
       const { symbol, transactionType, orderType, quantity, price, productType = 'CNC' } = body;
 
-      // Get all active subscribers
-      const activeUsers = await database.collection('users').find({ 
-        subscriptionStatus: 'active',
-        role: 'user'
-      }).toArray();
+      // Get all active subscribers (from memory once the set is loaded)
+      const activeUsers = await timer.time('scan', async () => (await activeSubscribers.ready(database)).list());
 
       if (activeUsers.length === 0) {
         return NextResponse.json({ error: 'No active subscribers found' }, { status: 400 });
       }
 
       // Find stock data
-      const stock = dhanMock.stocks.find(s => s.symbol === symbol);
+      const stock = getInstrumentIndex().getBySymbol(symbol);
       if (!stock) {
         return NextResponse.json({ error: 'Stock not found' }, { status: 404 });
       }
+      // Instruments ingested from the scrip master carry no price
+      if (!stock.price && !price) {
+        return NextResponse.json({ error: `No reference price for ${symbol}; pass price` }, { status: 400 });
+      }
 
-      const executionResults = [];
       const executionId = uuidv4();
+      const concurrency = Math.max(1, parseInt(body.concurrency, 10) || DEFAULT_FANOUT_CONCURRENCY);
+      const order = { symbol, transactionType, orderType, quantity, price, productType };
+      const responseMode = ['full', 'compact', 'summary'].includes(body.responseMode) ? body.responseMode : 'full';
+
+      if (body.async || body.queue) {
+        // Return a job handle right away; progress is tracked on execution_jobs
+        const jobs = database.collection('execution_jobs');
+        const job = {
+          executionId,
+          status: 'running',
+          mode: body.queue ? 'queue' : 'async',
+          symbol,
+          transactionType,
+          orderType,
+          productType,
+          requestedQuantity: quantity,
+          totalSubscribers: activeUsers.length,
+          processed: 0,
+          successfulExecutions: 0,
+          failedExecutions: 0,
+          createdBy: user.id,
+          createdAt: new Date(),
+          updatedAt: new Date()
+        };
+        await timer.time('db_write', () => jobs.insertOne(job));
+
+        if (body.queue) {
+          // One task per subscriber; execution_worker.py processes execution_tasks
+          await timer.time('db_write', () => enqueueExecutionTasks(database, { executionId, activeUsers, stock, order }));
+          return timedJsonResponse(timer, {
+            message: 'Bulk order execution queued',
+            executionId,
+            status: 'running',
+            totalSubscribers: activeUsers.length
+          }, 202);
+        }
 
-      for (const subscriber of activeUsers) {
-        try {
-          let orderQuantity = quantity;
-          let canExecute = true;
-          let errorReason = null;
-
-          if (transactionType === 'BUY') {
-            // For buy orders, calculate quantity based on 25% of max capital
-            const capitalToUse = subscriber.maxCapital * 0.25;
-            const maxQuantityBuyable = Math.floor(capitalToUse / stock.price);
-            orderQuantity = Math.min(quantity, maxQuantityBuyable);
-
-            if (orderQuantity === 0) {
-              canExecute = false;
-              errorReason = 'Insufficient funds - cannot afford even 1 share';
-            }
-          } else if (transactionType === 'SELL') {
-            // For sell orders, check if user has the stock in portfolio
-            const holdings = dhanMock.getHoldings(subscriber.id);
-            const holding = holdings.find(h => h.symbol === symbol);
-            
-            if (!holding) {
-              canExecute = false;
-              errorReason = 'Stock not available in portfolio';
-            } else if (holding.quantity < quantity) {
-              orderQuantity = holding.quantity; // Sell available quantity
-            }
-          }
+        const updateJob = (fields) => jobs.updateOne({ executionId }, { $set: { ...fields, updatedAt: new Date() } })
+          .catch((error) => console.error('Execution job update failed:', error));
+
+        // The request timer is finished by the 202 below; the fan-out that
+        // outlives it is timed on its own and its phases land on the job
+        const fanoutTimer = new PhaseTimer(`${path}:background`);
+        runOrderFanout(database, {
+          executionId,
+          activeUsers,
+          stock,
+          order,
+          concurrency,
+          keepResults: false,
+          timer: fanoutTimer,
+          onProgress: (counts) => updateJob({
+            processed: counts.processed,
+            successfulExecutions: counts.successful,
+            failedExecutions: counts.failed
+          })
+        }).then(({ counts, errorSummary }) => updateJob({
+          status: 'completed',
+          processed: counts.processed,
+          successfulExecutions: counts.successful,
+          failedExecutions: counts.failed,
+          errorSummary,
+          serverTiming: fanoutTimer.finish(),
+          completedAt: new Date()
+        })).catch((error) => {
+          console.error('Background execution failed:', error);
+          updateJob({ status: 'failed', error: error.message, serverTiming: fanoutTimer.finish(), completedAt: new Date() });
+        });
+
+        return timedJsonResponse(timer, {
+          message: 'Bulk order execution started',
+          executionId,
+          status: 'running',
+          totalSubscribers: activeUsers.length
+        }, 202);
+      }
 
-          let orderResult = null;
-          if (canExecute) {
-            const dhanConnection = subscriber.brokerConnections?.find(bc => bc.brokerName === 'Dhan' && bc.status === 'connected');
-
-            if (dhanConnection && dhanConnection.accessToken) {
-              try {
-                const dhanBroker = new DhanBroker(dhanConnection.clientId, dhanConnection.accessToken);
-
-                const dhanOrderParams = {
-                  transactionType,
-                  exchangeSegment: mapExchangeSegment(stock.exchange),
-                  productType: mapProductTypeToDhan(productType),
-                  orderType,
-                  securityId: stock.securityId,
-                  tradingSymbol: symbol,
-                  quantity: orderQuantity,
-                  price: orderType === 'LIMIT' ? (price || stock.price) : undefined
-                };
-
-                orderResult = await dhanBroker.placeOrder(dhanOrderParams);
-                orderResult.status = orderResult.orderStatus === 'PENDING' || orderResult.orderStatus === 'TRANSIT' ? 'EXECUTED' : 'FAILED';
-              } catch (error) {
-                canExecute = false;
-                errorReason = `Dhan API error: ${error.message}`;
-              }
-            } else {
-              orderResult = dhanMock.placeOrder({
-                transactionType,
-                exchangeSegment: stock.exchange,
-                productType,
-                orderType,
-                tradingSymbol: symbol,
-                securityId: stock.securityId,
-                quantity: orderQuantity,
-                price: price || stock.price
-              });
-
-              const executionSuccess = Math.random() > 0.1;
-              orderResult.status = executionSuccess ? 'EXECUTED' : 'FAILED';
-              if (!executionSuccess) {
-                errorReason = 'Mock execution - broker not connected';
-              }
-            }
-          }
+      if (body.stream) {
+        return executionStreamResponse(database, { executionId, activeUsers, stock, order, concurrency, timer });
+      }
 
-          const execution = {
-            id: uuidv4(),
-            executionId,
-            userId: subscriber.id,
-            userEmail: subscriber.email,
-            symbol,
-            transactionType,
-            orderType,
-            productType,
-            requestedQuantity: quantity,
-            executedQuantity: canExecute ? orderQuantity : 0,
-            price: price || stock.price,
-            status: canExecute && orderResult?.status === 'EXECUTED' ? 'SUCCESS' : 'FAILED',
-            errorReason,
-            orderDetails: orderResult,
-            timestamp: new Date()
-          };
+      const { results, counts, errorSummary } = await runOrderFanout(database, {
+        executionId,
+        activeUsers,
+        stock,
+        order,
+        concurrency,
+        keepResults: responseMode !== 'summary',
+        timer
+      });
 
-          await database.collection('order_executions').insertOne(execution);
-          executionResults.push(execution);
+      const response = {
+        message: 'Bulk order execution completed',
+        executionId,
+        totalSubscribers: activeUsers.length,
+        successfulExecutions: counts.successful,
+        failedExecutions: counts.failed
+      };
+      if (responseMode === 'summary') {
+        response.errorSummary = errorSummary;
+      } else {
+        response.results = responseMode === 'compact' ? results.map(compactExecution) : results;
+      }
 
-        } catch (error) {
-          const execution = {
-            id: uuidv4(),
-            executionId,
-            userId: subscriber.id,
-            userEmail: subscriber.email,
-            symbol,
-            transactionType,
-            orderType,
-            productType,
-            requestedQuantity: quantity,
-            executedQuantity: 0,
-            price: price || stock.price,
-            status: 'FAILED',
-            errorReason: 'System error: ' + error.message,
-            timestamp: new Date()
-          };
+      return timedJsonResponse(timer, response);
+    }
 
-          await database.collection('order_executions').insertOne(execution);
-          executionResults.push(execution);
+    if (path === 'admin/execute-basket') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      const { legs: requestedLegs, orderType = 'MARKET', productType = 'CNC' } = body;
+      if (!Array.isArray(requestedLegs) || requestedLegs.length === 0) {
+        return NextResponse.json({ error: 'legs must be a non-empty array' }, { status: 400 });
+      }
+      if (requestedLegs.length > MAX_BASKET_LEGS) {
+        return NextResponse.json({ error: `A basket can have at most ${MAX_BASKET_LEGS} legs` }, { status: 400 });
+      }
+      const capitalFraction = body.capitalFraction ?? BUY_CAPITAL_FRACTION;
+      if (!(capitalFraction > 0 && capitalFraction <= 1)) {
+        return NextResponse.json({ error: 'capitalFraction must be in (0, 1]' }, { status: 400 });
+      }
+
+      const legs = [];
+      for (const leg of requestedLegs) {
+        const { symbol, transactionType, quantity, price, weight = 1 } = leg;
+        const stock = getInstrumentIndex().getBySymbol(symbol);
+        if (!stock) {
+          return NextResponse.json({ error: `Stock not found: ${symbol}` }, { status: 404 });
+        }
+        if (!stock.price && !price) {
+          return NextResponse.json({ error: `No reference price for ${symbol}; pass price` }, { status: 400 });
+        }
+        if (transactionType !== 'BUY' && transactionType !== 'SELL') {
+          return NextResponse.json({ error: `${symbol}: transactionType must be BUY or SELL` }, { status: 400 });
+        }
+        if (!(Number.isInteger(quantity) && quantity > 0) || !(weight > 0)) {
+          return NextResponse.json({ error: `${symbol}: quantity and weight must be positive` }, { status: 400 });
         }
+        const order = {
+          symbol,
+          transactionType,
+          orderType: leg.orderType || orderType,
+          quantity,
+          price,
+          productType: leg.productType || productType
+        };
+        legs.push({ executionId: uuidv4(), stock, order, weight });
       }
 
-      return NextResponse.json({
-        message: 'Bulk order execution completed',
-        executionId,
+      // One scan for every leg
+      const activeUsers = await timer.time('scan', async () => (await activeSubscribers.ready(database)).list());
+      if (activeUsers.length === 0) {
+        return NextResponse.json({ error: 'No active subscribers found' }, { status: 400 });
+      }
+
+      const basketId = uuidv4();
+      const concurrency = Math.max(1, parseInt(body.concurrency, 10) || DEFAULT_FANOUT_CONCURRENCY);
+      const responseMode = ['full', 'compact', 'summary'].includes(body.responseMode) ? body.responseMode : 'full';
+      const { results, counts, legCounts, errorSummary } = await runBasketFanout(database, {
+        basketId,
+        activeUsers,
+        legs,
+        capitalFraction,
+        concurrency,
+        keepResults: responseMode !== 'summary',
+        timer
+      });
+
+      const response = {
+        message: 'Basket execution completed',
+        basketId,
         totalSubscribers: activeUsers.length,
-        successfulExecutions: executionResults.filter(r => r.status === 'SUCCESS').length,
-        failedExecutions: executionResults.filter(r => r.status === 'FAILED').length,
-        results: executionResults
+        totalExecutions: counts.processed,
+        successfulExecutions: counts.successful,
+        failedExecutions: counts.failed,
+        legs: legs.map(({ executionId, order, weight }, index) => ({
+          executionId,
+          symbol: order.symbol,
+          transactionType: order.transactionType,
+          requestedQuantity: order.quantity,
+          weight,
+          successfulExecutions: legCounts[index].successful,
+          failedExecutions: legCounts[index].failed
+        }))
+      };
+      if (responseMode === 'summary') {
+        response.errorSummary = errorSummary;
+      } else {
+        response.results = responseMode === 'compact' ? results.map(compactExecution) : results;
+      }
+
+      return timedJsonResponse(timer, response);
+    }
+
+    if (path === 'admin/preview-order') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      const { symbol, transactionType, quantity, price } = body;
+      const stock = getInstrumentIndex().getBySymbol(symbol);
+      if (!stock) {
+        return NextResponse.json({ error: 'Stock not found' }, { status: 404 });
+      }
+      if (!stock.price && !price) {
+        return NextResponse.json({ error: `No reference price for ${symbol}; pass price` }, { status: 400 });
+      }
+      if (transactionType !== 'BUY' && transactionType !== 'SELL') {
+        return NextResponse.json({ error: 'transactionType must be BUY or SELL' }, { status: 400 });
+      }
+
+      const order = { symbol, transactionType, quantity: parseInt(quantity, 10) || 0, price };
+      const users = database.collection('users');
+
+      // Every row, unbounded, for exports and cross-checks
+      if (body.stream) {
+        return ndjsonResponse(users.aggregate(sizingPipeline(order, stock)));
+      }
+
+      const rowLimit = Math.min(parseInt(body.rows ?? PREVIEW_DEFAULT_ROWS, 10) || 0, PREVIEW_MAX_ROWS);
+      const started = Date.now();
+      const facets = {
+        totals: [{
+          $group: {
+            _id: null,
+            subscribers: { $sum: 1 },
+            sizable: { $sum: { $cond: [{ $eq: ['$reason', null] }, 1, 0] } },
+            rejected: { $sum: { $cond: [{ $eq: ['$reason', null] }, 0, 1] } },
+            unverified: { $sum: { $cond: ['$holdingsVerified', 0, 1] } },
+            totalQuantity: { $sum: '$quantity' },
+            totalNotional: { $sum: '$notional' }
+          }
+        }, { $project: { _id: 0 } }],
+        rejections: [
+          { $match: { reason: { $ne: null } } },
+          { $group: { _id: '$reason', count: { $sum: 1 } } }
+        ]
+      };
+      if (rowLimit > 0) {
+        facets.rows = [{ $limit: rowLimit }];
+      }
+      const [preview] = await users.aggregate([...sizingPipeline(order, stock), { $facet: facets }]).toArray();
+      const rows = preview.rows || [];
+
+      const totals = preview.totals[0] || {
+        subscribers: 0, sizable: 0, rejected: 0, unverified: 0, totalQuantity: 0, totalNotional: 0
+      };
+      return NextResponse.json({
+        symbol,
+        transactionType,
+        requestedQuantity: order.quantity,
+        price: price || stock.price,
+        totals,
+        rejections: Object.fromEntries(preview.rejections.map(r => [r._id, r.count])),
+        rows,
+        rowsTruncated: rows.length < totals.subscribers,
+        durationMs: Date.now() - started
       });
     }
 
+    if (path === 'admin/prewarm-snapshots') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      // Fetch broker snapshots for every connected active subscriber ahead of a known order
+      const kinds = (body.kinds || ['holdings', 'funds']).filter(kind => kind === 'holdings' || kind === 'funds');
+      const concurrency = Math.max(1, parseInt(body.concurrency, 10) || DEFAULT_FANOUT_CONCURRENCY);
+      const connections = new Map();
+      for (const subscriber of (await activeSubscribers.ready(database)).list()) {
+        if (subscriber.dhanConnection) {
+          connections.set(subscriber.id, subscriber.dhanConnection);
+        }
+      }
+
+      const keys = kinds.flatMap(kind => [...connections.keys()].map(userId => `${kind}:${userId}`));
+      const started = Date.now();
+      const { warmed, failed } = await brokerSnapshots.prewarm(keys, (key) => {
+        const [kind, userId] = key.split(':');
+        return snapshotFetcher(kind, connections.get(userId));
+      }, concurrency);
+
+      return NextResponse.json({ subscribers: connections.size, warmed, failed, durationMs: Date.now() - started });
+    }
+
     if (path === 'admin/subscribers') {
       if (!isAdmin(user)) {
         return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
@@ -333,6 +1120,8 @@ export async function POST(request, { params }) {
         { id: userId },
         { $set: { subscriptionStatus, updatedAt: new Date() } }
       );
+      invalidateUser(userId);
+      await activeSubscribers.refresh(userId);
 
       return NextResponse.json({ message: 'Subscription status updated successfully' });
     }
@@ -352,24 +1141,30 @@ export async function POST(request, { params }) {
         connectedAt: new Date()
       };
 
-      if (brokerName === 'Dhan' && accessToken && clientId) {
-        try {
-          const dhanBroker = new DhanBroker(clientId, accessToken);
-          const fundsResponse = await dhanBroker.getFunds();
-
-          brokerConnection.verified = true;
-          brokerConnection.verifiedAt = new Date();
-        } catch (error) {
-          brokerConnection.status = 'error';
-          brokerConnection.error = error.message;
-        }
+      // Dhan credentials are checked by connectionVerifier, not in the request
+      const pending = brokerName === 'Dhan' && accessToken && clientId;
+      if (pending) {
+        brokerConnection.status = 'pending';
+        brokerConnection.verified = false;
+        brokerConnection.verifyAttempts = 0;
+        brokerConnection.nextVerifyAt = new Date();
       }
 
       await database.collection('users').updateOne(
         { id: user.id },
         { $push: { brokerConnections: brokerConnection } }
       );
-
+      invalidateUser(user.id);
+      invalidateBrokerSnapshots(user.id);
+      await activeSubscribers.refresh(user.id);
+
+      if (pending) {
+        connectionVerifier.wake();
+        return NextResponse.json(
+          { message: 'Broker connection pending verification', connection: brokerConnection },
+          { status: 202 }
+        );
+      }
       return NextResponse.json({ message: 'Broker connected successfully', connection: brokerConnection });
     }
 
@@ -380,6 +1175,8 @@ export async function POST(request, { params }) {
         { id: user.id },
         { $set: { maxCapital, updatedAt: new Date() } }
       );
+      invalidateUser(user.id);
+      await activeSubscribers.refresh(user.id);
 
       return NextResponse.json({ message: 'Capital allocation updated successfully' });
     }
@@ -392,7 +1189,7 @@ export async function POST(request, { params }) {
   }
 }
 
-export async function GET(request, { params }) {
+async function handleGet(request, { params }) {
   try {
     const database = await connectDB();
     const path = params.path ? params.path.join('/') : '';
@@ -401,11 +1198,8 @@ export async function GET(request, { params }) {
     // Public endpoints
     if (path === 'stocks/search') {
       const query = url.searchParams.get('q') || '';
-      const filteredStocks = dhanMock.stocks.filter(stock => 
-        stock.symbol.toLowerCase().includes(query.toLowerCase()) ||
-        stock.name.toLowerCase().includes(query.toLowerCase())
-      );
-      return NextResponse.json({ stocks: filteredStocks });
+      const limit = parsePageSize(url.searchParams.get('limit'), SEARCH_DEFAULT_LIMIT);
+      return NextResponse.json({ stocks: getInstrumentIndex().search(query, limit) });
     }
 
     // Protected routes
@@ -419,57 +1213,117 @@ export async function GET(request, { params }) {
         return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
       }
 
-      const executions = await database.collection('order_executions')
-        .find({})
-        .sort({ timestamp: -1 })
-        .limit(100)
-        .toArray();
+      const filter = {};
+      if (url.searchParams.get('userId')) {
+        filter.userId = url.searchParams.get('userId');
+      }
+      return executionHistoryResponse(database, filter, url, 100, 'executions');
+    }
+
+    if (path === 'admin/execution-status') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
 
-      return NextResponse.json({ executions });
+      const executionId = url.searchParams.get('executionId');
+      const job = await database.collection('execution_jobs').findOne({ executionId }, { projection: { _id: 0 } });
+      if (job) {
+        return NextResponse.json({
+          ...job,
+          progress: job.totalSubscribers > 0 ? job.processed / job.totalSubscribers : 1
+        });
+      }
+
+      // Synchronous executions have no job document; read their rollup
+      const rollup = await database.collection(ROLLUP_COLLECTION).findOne({ _id: `execution:${executionId}` });
+      if (rollup) {
+        return NextResponse.json({
+          executionId,
+          status: 'completed',
+          totalSubscribers: rollup.executions,
+          processed: rollup.executions,
+          successfulExecutions: rollup.successful,
+          failedExecutions: rollup.failed,
+          progress: 1
+        });
+      }
+
+      // History written before rollups existed (until rollup_executions.py backfill has run)
+      const groups = await database.collection('order_executions').aggregate([
+        { $match: { executionId } },
+        { $group: { _id: '$status', count: { $sum: 1 } } }
+      ]).toArray();
+      if (groups.length === 0) {
+        return NextResponse.json({ error: 'Execution not found' }, { status: 404 });
+      }
+
+      const countFor = (status) => groups.find(g => g._id === status)?.count || 0;
+      const processed = groups.reduce((sum, g) => sum + g.count, 0);
+      return NextResponse.json({
+        executionId,
+        status: 'completed',
+        totalSubscribers: processed,
+        processed,
+        successfulExecutions: countFor('SUCCESS'),
+        failedExecutions: countFor('FAILED'),
+        progress: 1
+      });
+    }
+
+    if (path === 'admin/execution-results') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      const executionId = url.searchParams.get('executionId');
+      if (!executionId) {
+        return NextResponse.json({ error: 'executionId is required' }, { status: 400 });
+      }
+      return executionHistoryResponse(database, { executionId }, url, 100, 'results');
     }
 
     if (path === 'user/portfolio') {
-      const dhanConnection = user.brokerConnections?.find(bc => bc.brokerName === 'Dhan' && bc.status === 'connected');
+      const dhanConnection = getDhanConnection(user);
 
-      if (dhanConnection && dhanConnection.accessToken) {
+      if (dhanConnection) {
         try {
-          const dhanBroker = new DhanBroker(dhanConnection.clientId, dhanConnection.accessToken);
-          const holdings = await dhanBroker.getHoldings();
-          return NextResponse.json({ holdings: holdings.data || [] });
+          const snapshot = await getBrokerSnapshot('holdings', user, dhanConnection);
+          const holdings = snapshot.value;
+          return NextResponse.json({ holdings: holdings.data || [], snapshotAgeMs: snapshot.ageMs });
         } catch (error) {
-          return NextResponse.json({ holdings: dhanMock.getHoldings(user.id), mock: true, error: error.message });
+          return NextResponse.json({ holdings: await mockBroker.getHoldings(user.id), mock: true, error: error.message });
         }
       }
 
-      const holdings = dhanMock.getHoldings(user.id);
+      const holdings = await mockBroker.getHoldings(user.id);
       return NextResponse.json({ holdings, mock: true });
     }
 
     if (path === 'user/funds') {
-      const dhanConnection = user.brokerConnections?.find(bc => bc.brokerName === 'Dhan' && bc.status === 'connected');
+      const dhanConnection = getDhanConnection(user);
 
-      if (dhanConnection && dhanConnection.accessToken) {
+      if (dhanConnection) {
         try {
-          const dhanBroker = new DhanBroker(dhanConnection.clientId, dhanConnection.accessToken);
-          const funds = await dhanBroker.getFunds();
-          return NextResponse.json({ funds: funds.data || funds, real: true });
+          const snapshot = await getBrokerSnapshot('funds', user, dhanConnection);
+          const funds = snapshot.value;
+          return NextResponse.json({ funds: funds.data || funds, real: true, snapshotAgeMs: snapshot.ageMs });
         } catch (error) {
-          return NextResponse.json({ funds: dhanMock.getFunds(user.id), mock: true, error: error.message });
+          return NextResponse.json({ funds: await mockBroker.getFunds(user.id), mock: true, error: error.message });
         }
       }
 
-      const funds = dhanMock.getFunds(user.id);
+      const funds = await mockBroker.getFunds(user.id);
       return NextResponse.json({ funds, mock: true });
     }
 
     if (path === 'user/orders') {
-      const orders = await database.collection('order_executions')
-        .find({ userId: user.id })
-        .sort({ timestamp: -1 })
-        .limit(50)
-        .toArray();
+      return executionHistoryResponse(database, { userId: user.id }, url, 50, 'orders');
+    }
 
-      return NextResponse.json({ orders });
+    // Poll target after connect-broker returns 'pending' (credentials omitted)
+    if (path === 'user/broker-connections') {
+      const connections = (user.brokerConnections || []).map(({ apiKey, apiSecret, accessToken, verifyToken, ...connection }) => connection);
+      return NextResponse.json({ connections });
     }
 
     if (path === 'admin/subscribers') {
@@ -484,6 +1338,88 @@ export async function GET(request, { params }) {
       return NextResponse.json({ subscribers });
     }
 
+    if (path === 'admin/cache-stats') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      return NextResponse.json({
+        authCache: userCache.stats(),
+        brokerSnapshots: brokerSnapshots.stats(),
+        activeSubscribers: activeSubscribers.stats()
+      });
+    }
+
+    if (path === 'admin/metrics') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      return new NextResponse(metrics.render(), {
+        headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' }
+      });
+    }
+
+    if (path === 'admin/execution-stats') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      const rollups = database.collection(ROLLUP_COLLECTION);
+      const executionId = url.searchParams.get('executionId');
+      if (executionId) {
+        const rollup = await rollups.findOne({ _id: `execution:${executionId}` });
+        if (!rollup) {
+          return NextResponse.json({ error: 'Execution not found' }, { status: 404 });
+        }
+        return NextResponse.json(withRates(rollup));
+      }
+
+      // Daily rollups of one symbol or one subscriber (default: the last 30 days)
+      const symbol = url.searchParams.get('symbol');
+      const userId = url.searchParams.get('userId');
+      if (!symbol === !userId) {
+        return NextResponse.json({ error: 'Pass exactly one of executionId, symbol or userId' }, { status: 400 });
+      }
+      const to = url.searchParams.get('to') || rollupDay(Date.now());
+      const from = url.searchParams.get('from') || rollupDay(Date.parse(to) - 29 * 86400000);
+      const filter = symbol ? { scope: 'symbol', symbol } : { scope: 'user', userId };
+      const days = await rollups.find({ ...filter, day: { $gte: from, $lte: to } })
+        .sort({ day: 1 }).toArray();
+
+      const totals = { executions: 0, successful: 0, failed: 0, requestedQuantity: 0, executedQuantity: 0, notional: 0 };
+      for (const day of days) {
+        for (const field of Object.keys(totals)) {
+          totals[field] += day[field] || 0;
+        }
+      }
+      return NextResponse.json({ ...filter, from, to, totals: withRates(totals), days: days.map(withRates) });
+    }
+
+    if (path === 'admin/reconciler-stats') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      return NextResponse.json({ reconciler: orderReconciler.stats() });
+    }
+
+    if (path === 'admin/verifier-stats') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      return NextResponse.json({ verifier: connectionVerifier.stats() });
+    }
+
+    if (path === 'admin/broker-stats') {
+      if (!isAdmin(user)) {
+        return NextResponse.json({ error: 'Admin access required' }, { status: 403 });
+      }
+
+      return NextResponse.json({ dhan: dhanScheduler.stats(), mock: mockBroker.stats() });
+    }
+
     return NextResponse.json({ error: 'Endpoint not found' }, { status: 404 });
 
   } catch (error) {
@@ -15,6 +15,9 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@
 import { Progress } from '@/components/ui/progress';
 import { ArrowUpIcon, ArrowDownIcon, Users, TrendingUp, Wallet, Activity, Search, Play, Settings } from 'lucide-react';
 
+// Result rows kept in the live execution table (counts cover every subscriber)
+const MAX_LIVE_RESULTS = 200;
+
 export default function StockSyncApp() {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -124,6 +127,38 @@ export default function StockSyncApp() {
     return response.json();
   };
 
+  // POST to an NDJSON streaming endpoint; onLines gets the parsed lines of each chunk as it arrives
+  const streamApiCall = async (endpoint, body, onLines) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`/api/${endpoint}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token && { Authorization: `Bearer ${token}` })
+      },
+      body: JSON.stringify(body)
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Request failed');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      onLines(lines.filter(Boolean).map(line => JSON.parse(line)));
+    }
+  };
+
   const handleLogin = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -215,17 +250,33 @@ export default function StockSyncApp() {
     }
 
     setLoading(true);
+    setExecutionResults(null);
     try {
-      const result = await apiCall('admin/execute-order', {
-        method: 'POST',
-        body: JSON.stringify({
-          symbol: selectedStock.symbol,
-          ...orderData,
-          price: orderData.orderType === 'LIMIT' ? parseFloat(orderData.price) : undefined
-        })
+      // Live progress: counts and rows update as each placement finishes
+      let result = null;
+      let recent = [];
+      await streamApiCall('admin/execute-order', {
+        symbol: selectedStock.symbol,
+        ...orderData,
+        price: orderData.orderType === 'LIMIT' ? parseFloat(orderData.price) : undefined,
+        stream: true
+      }, (lines) => {
+        for (const line of lines) {
+          if (line.type === 'started') {
+            result = { totalSubscribers: line.totalSubscribers, processed: 0, successfulExecutions: 0, failedExecutions: 0 };
+          } else if (line.type === 'result') {
+            result = { ...result, processed: line.processed, successfulExecutions: line.successful, failedExecutions: line.failed };
+            recent.push(line.result);
+          } else if (line.type === 'completed') {
+            result = { ...result, successfulExecutions: line.successfulExecutions, failedExecutions: line.failedExecutions, completed: true };
+          } else if (line.type === 'error') {
+            throw new Error(line.error);
+          }
+        }
+        recent = recent.slice(-MAX_LIVE_RESULTS);
+        setExecutionResults({ ...result, results: recent });
       });
-      
-      setExecutionResults(result);
+
       setMessage(`Order executed for ${result.totalSubscribers} subscribers. ${result.successfulExecutions} successful, ${result.failedExecutions} failed.`);
       await loadAdminData(); // Refresh data
     } catch (error) {
@@ -249,11 +300,11 @@ export default function StockSyncApp() {
 
   const connectBroker = async () => {
     try {
-      await apiCall('user/connect-broker', {
+      const result = await apiCall('user/connect-broker', {
         method: 'POST',
         body: JSON.stringify(brokerData)
       });
-      setMessage('Broker connected successfully');
+      setMessage(result.message);
       await loadUserData();
     } catch (error) {
       setMessage(error.message);
@@ -561,7 +612,9 @@ export default function StockSyncApp() {
                       className="w-full" 
                       disabled={loading || !selectedStock}
                     >
-                      {loading ? 'Executing...' : `Execute for All Subscribers`}
+                      {loading
+                        ? `Executing... ${executionResults ? `${executionResults.processed}/${executionResults.totalSubscribers}` : ''}`
+                        : `Execute for All Subscribers`}
                     </Button>
                   </CardContent>
                 </Card>
@@ -572,7 +625,9 @@ export default function StockSyncApp() {
                   <CardHeader>
                     <CardTitle>Execution Results</CardTitle>
                     <CardDescription>
-                      Executed for {executionResults.totalSubscribers} subscribers
+                      {executionResults.completed
+                        ? `Executed for ${executionResults.totalSubscribers} subscribers`
+                        : `Executing: ${executionResults.processed} of ${executionResults.totalSubscribers} placed`}
                     </CardDescription>
                   </CardHeader>
                   <CardContent>
@@ -592,7 +647,7 @@ export default function StockSyncApp() {
                     </div>
                     
                     <Progress 
-                      value={(executionResults.successfulExecutions / executionResults.totalSubscribers) * 100} 
+                      value={(executionResults.processed / executionResults.totalSubscribers) * 100} 
                       className="mb-4" 
                     />
                     
@@ -4,19 +4,130 @@ StockSync Backend API Test Suite
 Tests all backend functionality including authentication, order execution, and broker integration
 """
 
-import requests
+import argparse
+import asyncio
 import json
+import math
+import random
 import time
 import os
-from typing import Dict, Any, List
+import httpx
+from typing import Dict, Any, List, Optional
+
+from stocksync_client import (
+    DEFAULT_BASE_URL, AsyncStockSyncClient, StockSyncClient, StockSyncError
+)
+
+# Weighted endpoint mix for load mode (relative weights, not percentages)
+DEFAULT_LOAD_MIX = {
+    "auth/login": 5,
+    "stocks/search": 30,
+    "user/portfolio": 20,
+    "user/funds": 20,
+    "user/orders": 20,
+    "admin/execute-order": 5
+}
+
+# Rebalance basket for the basket scenarios and --basket (symbol, side, quantity)
+DEFAULT_BASKET = [
+    {"symbol": "ITC", "transactionType": "BUY", "quantity": 2},
+    {"symbol": "INFY", "transactionType": "BUY", "quantity": 1},
+    {"symbol": "HDFCBANK", "transactionType": "BUY", "quantity": 1},
+    {"symbol": "TCS", "transactionType": "SELL", "quantity": 1}
+]
+
+SEARCH_QUERIES = ["REL", "TCS", "HDFC", "INFY", "ICICI", "ITC", "BHARTI", "KOTAK", "LT", "Bank"]
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram with a fixed number of significant digits.
+
+    Values are recorded in microseconds into log-linear buckets, so memory stays
+    bounded no matter how many samples are recorded and every reported
+    percentile is accurate to the configured precision.
+    """
+
+    def __init__(self, significant_digits: int = 3):
+        largest_single_unit = 2 * 10 ** significant_digits
+        self.sub_bucket_bits = max(1, math.ceil(math.log2(largest_single_unit)))
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = 0
+
+    def _lowest_equivalent(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return (value >> shift) << shift
+
+    def _highest_equivalent(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return (((value >> shift) + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        key = self._lowest_equivalent(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.total_count += 1
+        self.max_value = max(self.max_value, value)
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.total_count += other.total_count
+        self.max_value = max(self.max_value, other.max_value)
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+
+    def percentile(self, percentile: float) -> float:
+        """Return the latency in milliseconds at the given percentile"""
+        if self.total_count == 0:
+            return 0.0
+        if percentile >= 100:
+            return self.max_value / 1000
+        target = max(1, math.ceil(percentile / 100 * self.total_count))
+        running = 0
+        for key in sorted(self.counts):
+            running += self.counts[key]
+            if running >= target:
+                return min(self._highest_equivalent(key), self.max_value) / 1000
+        return self.max_value / 1000
+
+    def distribution(self) -> List[Dict[str, float]]:
+        """Percentile distribution in the usual HDR output layout"""
+        rows = []
+        for p in (50, 75, 90, 95, 99, 99.9, 99.99, 100):
+            rows.append({"percentile": p, "latency_ms": round(self.percentile(p), 3)})
+        return rows
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.total_count,
+            "min_ms": round((self.min_value or 0) / 1000, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_value / 1000, 3)
+        }
+
+
+def format_server_timing(phases: Dict[str, Dict[str, float]]) -> str:
+    return ", ".join(f"{name} {entry['dur_ms']:.1f}ms" + (f" (n={entry['count']})" if entry["count"] > 1 else "")
+                     for name, entry in phases.items())
+
 
 class StockSyncTester:
-    def __init__(self):
+    def __init__(self, base_url: str = None, max_connections: int = 100, max_retries: int = 3):
         # Get base URL from environment
-        self.base_url = "https://stocksync-app-2.preview.emergentagent.com/api"
+        self.base_url = base_url or os.environ.get("STOCKSYNC_BASE_URL", DEFAULT_BASE_URL)
         self.admin_token = None
         self.user_token = None
         self.test_results = []
+        # endpoint -> [(client latency ms, Server-Timing phases)] for timed responses
+        self.server_timings = {}
+        # One pooled keep-alive client for every request the suite makes
+        self.client = StockSyncClient(self.base_url, max_connections=max_connections, max_retries=max_retries)
+        self.client.on_call(self._record_server_timing)
         
         # Test data
         self.admin_credentials = {
@@ -51,35 +162,15 @@ class StockSyncTester:
         if details and not success:
             print(f"   Details: {details}")
 
+    def _record_server_timing(self, call: Dict[str, Any]):
+        if call["server_timing"]:
+            self.server_timings.setdefault(call["endpoint"], []).append((call["elapsed_ms"], call["server_timing"]))
+
     def make_request(self, method: str, endpoint: str, data: Dict = None, headers: Dict = None) -> Dict:
         """Make HTTP request with error handling"""
-        url = f"{self.base_url}/{endpoint}"
-        
-        try:
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, timeout=30)
-            elif method.upper() == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=30)
-            else:
-                raise ValueError(f"Unsupported method: {method}")
-            
-            return {
-                "status_code": response.status_code,
-                "data": response.json() if response.content else {},
-                "success": response.status_code < 400
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                "status_code": 0,
-                "data": {"error": str(e)},
-                "success": False
-            }
-        except json.JSONDecodeError as e:
-            return {
-                "status_code": response.status_code,
-                "data": {"error": f"Invalid JSON response: {str(e)}"},
-                "success": False
-            }
+        if method.upper() not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported method: {method}")
+        return self.client.request(method, endpoint, json=data, headers=headers)
 
     def test_user_registration(self):
         """Test user registration endpoint"""
@@ -259,6 +350,56 @@ class StockSyncTester:
             self.log_test("User Broker Connection", False, "Failed to connect broker", response["data"])
             return False
 
+    def test_pending_broker_verification(self):
+        """Test that Dhan credentials are accepted as pending and verified in the background"""
+        print("\n=== Testing Pending Broker Verification ===")
+        
+        # A fresh user, so the sample user's broker state is left alone
+        registration = self.make_request('POST', 'auth/register', {
+            "email": f"verify{int(time.time() * 1000)}@example.com",
+            "password": "testpass123",
+            "name": "Verification User"
+        })
+        if not registration["success"]:
+            self.log_test("Pending Broker Verification", False, "Could not register a test user", registration["data"])
+            return False
+        
+        headers = {"Authorization": f"Bearer {registration['data']['token']}"}
+        broker_data = {
+            "brokerName": "Dhan",
+            "clientId": "1100000001",
+            "accessToken": "verification_test_token"
+        }
+        response = self.make_request('POST', 'user/connect-broker', broker_data, headers)
+        if response["status_code"] != 202 or response["data"].get("connection", {}).get("status") != "pending":
+            self.log_test("Pending Broker Verification", False,
+                          f"Expected 202 pending, got {response['status_code']}", response["data"])
+            return False
+        connection_id = response["data"]["connection"]["id"]
+        
+        # The verifier decides connected or error; either way it must leave pending
+        deadline = time.time() + 30
+        status = "pending"
+        while status == "pending" and time.time() < deadline:
+            time.sleep(0.5)
+            listing = self.make_request('GET', 'user/broker-connections', headers=headers)
+            if not listing["success"]:
+                self.log_test("Pending Broker Verification", False, "Failed to list broker connections", listing["data"])
+                return False
+            connection = next((c for c in listing["data"]["connections"] if c["id"] == connection_id), {})
+            if "accessToken" in connection:
+                self.log_test("Pending Broker Verification", False, "broker-connections exposes credentials")
+                return False
+            status = connection.get("status", "missing")
+        
+        if status == "pending":
+            self.log_test("Pending Broker Verification", False, "Connection still pending after 30s (verifier disabled?)")
+            return False
+        
+        self.log_test("Pending Broker Verification", True,
+                      f"Returned pending in {response['elapsed_ms']:.0f}ms, verified as '{status}' in the background")
+        return True
+
     def test_user_capital_update(self):
         """Test user capital allocation update"""
         print("\n=== Testing User Capital Update ===")
@@ -352,10 +493,13 @@ class StockSyncTester:
             "transactionType": "BUY",
             "orderType": "MARKET",
             "quantity": 10,
-            "productType": "CNC"
+            "productType": "CNC",
+            "responseMode": "compact"
         }
         
+        started = time.perf_counter()
         response = self.make_request('POST', 'admin/execute-order', buy_order, headers)
+        fill_time = time.perf_counter() - started
         
         if response["success"]:
             data = response["data"]
@@ -363,9 +507,13 @@ class StockSyncTester:
                 total_subscribers = data.get("totalSubscribers", 0)
                 successful = data.get("successfulExecutions", 0)
                 failed = data.get("failedExecutions", 0)
+                per_subscriber_ms = fill_time * 1000 / max(total_subscribers, 1)
                 
                 self.log_test("Multi-User BUY Order", True, 
-                            f"Executed for {total_subscribers} subscribers: {successful} success, {failed} failed")
+                            f"Executed for {total_subscribers} subscribers: {successful} success, {failed} failed "
+                            f"in {fill_time:.2f}s ({per_subscriber_ms:.2f} ms/subscriber)")
+                if response["server_timing"]:
+                    print(f"   Server phases: {format_server_timing(response['server_timing'])}")
                 
                 # Verify 25% capital allocation logic
                 results = data["results"]
@@ -389,21 +537,223 @@ class StockSyncTester:
             "transactionType": "SELL",
             "orderType": "MARKET",
             "quantity": 5,
-            "productType": "CNC"
+            "productType": "CNC",
+            "responseMode": "summary"
         }
         
+        started = time.perf_counter()
         response = self.make_request('POST', 'admin/execute-order', sell_order, headers)
+        fill_time = time.perf_counter() - started
         
         if response["success"]:
             data = response["data"]
             self.log_test("Multi-User SELL Order", True, 
-                        f"SELL order executed for {data.get('totalSubscribers', 0)} subscribers")
+                        f"SELL order executed for {data.get('totalSubscribers', 0)} subscribers in {fill_time:.2f}s")
             return True
         else:
             self.log_test("Multi-User SELL Order", False, "SELL order execution failed", response["data"])
         
         return False
 
+    def test_metrics_endpoint(self):
+        """Test the Prometheus-format phase timing metrics"""
+        print("\n=== Testing Metrics Endpoint ===")
+        
+        if not self.admin_token:
+            self.log_test("Metrics Endpoint", False, "No admin token available")
+            return False
+        
+        try:
+            metrics = self.client.with_token(self.admin_token).metrics()
+        except StockSyncError as e:
+            self.log_test("Metrics Endpoint", False, f"Status {e.status_code}", str(e.data)[:200])
+            return False
+        
+        phases = {line.split('phase="')[1].split('"')[0] for line in metrics.splitlines()
+                  if line.startswith("stocksync_request_phase_seconds_count")}
+        expected = {"auth", "scan", "sizing", "broker", "db_write", "serialize", "total"}
+        missing = expected - phases
+        if missing:
+            self.log_test("Metrics Endpoint", False, f"Missing phases: {', '.join(sorted(missing))}")
+            return False
+        
+        self.log_test("Metrics Endpoint", True, f"Histograms exported for phases: {', '.join(sorted(phases))}")
+        return True
+
+    def print_server_timing_report(self):
+        """Print client latency next to the server's own phase breakdown"""
+        if not self.server_timings:
+            return
+        
+        print("\n⏱️  SERVER TIMING (avg per request)")
+        for endpoint, samples in self.server_timings.items():
+            client_ms = sum(elapsed for elapsed, _ in samples) / len(samples)
+            phases = {}
+            for _, timing in samples:
+                for name, entry in timing.items():
+                    phases[name] = phases.get(name, 0.0) + entry["dur_ms"]
+            total_ms = phases.get("total", 0.0) / len(samples)
+            print(f"  {endpoint} ({len(samples)} requests): client {client_ms:.1f}ms, server {total_ms:.1f}ms, "
+                  f"network/queueing {client_ms - total_ms:.1f}ms")
+            for name, dur in phases.items():
+                if name != "total":
+                    print(f"     {name:<10} {dur / len(samples):>9.1f}ms")
+
+    def test_async_order_execution(self):
+        """Test background execute-order with status polling and paged results"""
+        print("\n=== Testing Async Order Execution ===")
+        
+        if not self.admin_token:
+            self.log_test("Async Order Execution", False, "No admin token available")
+            return False
+        
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        order = {
+            "symbol": "ITC",
+            "transactionType": "BUY",
+            "orderType": "MARKET",
+            "quantity": 1,
+            "productType": "CNC",
+            "async": True
+        }
+        
+        started = time.perf_counter()
+        response = self.make_request('POST', 'admin/execute-order', order, headers)
+        accepted_in = time.perf_counter() - started
+        
+        if response["status_code"] != 202 or "executionId" not in response["data"]:
+            self.log_test("Async Order Execution", False, f"Expected 202 with executionId, got {response['status_code']}", response["data"])
+            return False
+        
+        execution_id = response["data"]["executionId"]
+        status = {}
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            status_response = self.make_request('GET', f'admin/execution-status?executionId={execution_id}', headers=headers)
+            status = status_response["data"]
+            if not status_response["success"] or status.get("status") != "running":
+                break
+            time.sleep(0.5)
+        
+        if status.get("status") != "completed":
+            self.log_test("Async Order Execution", False, "Execution did not complete", status)
+            return False
+        
+        try:
+            results = list(self.iter_execution_pages(f'admin/execution-results?executionId={execution_id}', self.admin_token, page_size=100))
+        except RuntimeError as e:
+            self.log_test("Async Order Execution", False, "Failed to page execution results", str(e))
+            return False
+        if len(results) != status.get("processed"):
+            self.log_test("Async Order Execution", False,
+                          f"Status reports {status.get('processed')} processed but {len(results)} results were returned")
+            return False
+        
+        self.log_test("Async Order Execution", True,
+                      f"Accepted in {accepted_in * 1000:.0f} ms; {status['successfulExecutions']} success, "
+                      f"{status['failedExecutions']} failed across {len(results)} results")
+        return True
+
+    def measure_execution_stream(self, token: str, order: Dict[str, Any], bucket_ms: float = 250) -> Dict[str, Any]:
+        """Execute `order` with a progress stream and time its results as they arrive.
+
+        Returns time-to-first-result, time to 50/90/99/100% of subscribers,
+        a completion timeline (results per `bucket_ms` bucket) and the final
+        `completed` line. Lines are consumed as they arrive, never buffered.
+        """
+        client = self.client.with_token(token)
+        started = time.perf_counter()
+        total = None
+        first_result_ms = None
+        arrivals = []
+        statuses = {}
+        last_processed = 0
+        monotonic = True
+        completed = None
+
+        for line in client.stream_ndjson('POST', 'admin/execute-order', json={**order, "stream": True}):
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if line["type"] == "started":
+                total = line["totalSubscribers"]
+            elif line["type"] == "result":
+                if first_result_ms is None:
+                    first_result_ms = elapsed_ms
+                arrivals.append(elapsed_ms)
+                status = line["result"]["status"]
+                statuses[status] = statuses.get(status, 0) + 1
+                monotonic = monotonic and line["processed"] > last_processed
+                last_processed = line["processed"]
+            elif line["type"] in ("completed", "error"):
+                completed = line
+
+        total_ms = (time.perf_counter() - started) * 1000
+        milestones = {}
+        for fraction in (0.5, 0.9, 0.99, 1.0):
+            index = math.ceil(fraction * (total or 0)) - 1
+            if 0 <= index < len(arrivals):
+                milestones[f"p{fraction * 100:g}_ms"] = round(arrivals[index], 1)
+
+        timeline = []
+        done = 0
+        for bucket in range(int(total_ms // bucket_ms) + 1):
+            end_ms = (bucket + 1) * bucket_ms
+            in_bucket = 0
+            while done < len(arrivals) and arrivals[done] < end_ms:
+                done += 1
+                in_bucket += 1
+            timeline.append({"until_ms": end_ms, "completed": done, "rate_per_s": round(in_bucket * 1000 / bucket_ms, 1)})
+
+        return {
+            "total_subscribers": total,
+            "results": len(arrivals),
+            "statuses": statuses,
+            "time_to_first_result_ms": round(first_result_ms, 1) if first_result_ms is not None else None,
+            "total_ms": round(total_ms, 1),
+            "results_per_s": round(len(arrivals) * 1000 / total_ms, 1) if total_ms else 0.0,
+            "milestones": milestones,
+            "monotonic_counts": monotonic,
+            "timeline": timeline,
+            "completed": completed
+        }
+
+    def test_streamed_order_execution(self):
+        """Test execute-order progress streaming (NDJSON) and measure time-to-first-result"""
+        print("\n=== Testing Streamed Order Execution ===")
+        
+        if not self.admin_token:
+            self.log_test("Streamed Order Execution", False, "No admin token available")
+            return False
+        
+        order = {
+            "symbol": "ITC",
+            "transactionType": "BUY",
+            "orderType": "MARKET",
+            "quantity": 1,
+            "productType": "CNC"
+        }
+        try:
+            report = self.measure_execution_stream(self.admin_token, order)
+        except (StockSyncError, httpx.HTTPError, json.JSONDecodeError) as e:
+            self.log_test("Streamed Order Execution", False, "Stream failed", str(e))
+            return False
+        
+        completed = report["completed"] or {}
+        if completed.get("type") != "completed":
+            self.log_test("Streamed Order Execution", False, "Stream did not end with a completed line", completed)
+            return False
+        if report["results"] != report["total_subscribers"]:
+            self.log_test("Streamed Order Execution", False,
+                          f"{report['results']} result lines for {report['total_subscribers']} subscribers")
+            return False
+        if report["statuses"].get("SUCCESS", 0) != completed["successfulExecutions"] or not report["monotonic_counts"]:
+            self.log_test("Streamed Order Execution", False, "Running counts disagree with the result lines", report["statuses"])
+            return False
+        
+        self.log_test("Streamed Order Execution", True,
+                      f"First result after {report['time_to_first_result_ms']:.0f} ms, "
+                      f"{report['results']} results in {report['total_ms']:.0f} ms ({report['results_per_s']:.0f}/s)")
+        return True
+
     def test_execution_history(self):
         """Test execution history retrieval"""
         print("\n=== Testing Execution History ===")
@@ -424,6 +774,57 @@ class StockSyncTester:
             self.log_test("Execution History", False, "Failed to get execution history", response["data"])
             return False
 
+    def iter_execution_pages(self, endpoint: str, token: str, page_size: int = 1000):
+        """Yield execution records page by page using keyset cursors"""
+        return self.client.with_token(token).paginate(endpoint, page_size)
+
+    def stream_executions(self, endpoint: str, token: str):
+        """Yield execution records from the NDJSON export one line at a time.
+
+        Memory stays constant regardless of history size, so this is the reader
+        to use for reconciling millions of records.
+        """
+        return self.client.with_token(token).export_executions(endpoint)
+
+    def reconcile_executions(self, token: str, endpoint: str = 'admin/execution-history') -> Dict[str, Any]:
+        """Stream the full execution history and tally it by status and transaction type"""
+        totals = {"records": 0, "executedQuantity": 0, "byStatus": {}, "byTransactionType": {}}
+        for execution in self.stream_executions(endpoint, token):
+            totals["records"] += 1
+            totals["executedQuantity"] += execution.get("executedQuantity") or 0
+            status = execution.get("status", "UNKNOWN")
+            side = execution.get("transactionType", "UNKNOWN")
+            totals["byStatus"][status] = totals["byStatus"].get(status, 0) + 1
+            totals["byTransactionType"][side] = totals["byTransactionType"].get(side, 0) + 1
+        return totals
+
+    def test_execution_history_pagination(self):
+        """Test keyset pagination and NDJSON export of execution history"""
+        print("\n=== Testing Execution History Pagination ===")
+        
+        if not self.admin_token:
+            self.log_test("Execution History Pagination", False, "No admin token available")
+            return False
+        
+        try:
+            paged_ids = [e["id"] for e in self.iter_execution_pages('admin/execution-history', self.admin_token, page_size=10)]
+            streamed_ids = [e["id"] for e in self.stream_executions('admin/execution-history', self.admin_token)]
+        except (StockSyncError, httpx.HTTPError, json.JSONDecodeError) as e:
+            self.log_test("Execution History Pagination", False, "Failed to page or stream history", str(e))
+            return False
+        
+        if len(paged_ids) != len(set(paged_ids)):
+            self.log_test("Execution History Pagination", False, "Duplicate records across pages")
+            return False
+        
+        if paged_ids != streamed_ids:
+            self.log_test("Execution History Pagination", False,
+                          f"Paged ({len(paged_ids)}) and streamed ({len(streamed_ids)}) histories differ")
+            return False
+        
+        self.log_test("Execution History Pagination", True, f"Paged and streamed {len(paged_ids)} records consistently")
+        return True
+
     def test_user_order_history(self):
         """Test user order history"""
         print("\n=== Testing User Order History ===")
@@ -444,6 +845,203 @@ class StockSyncTester:
             self.log_test("User Order History", False, "Failed to get order history", response["data"])
             return False
 
+    def measure_basket_throughput(self, token: str, legs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run `legs` as sequential single-symbol execute-order calls, then as one basket.
+
+        Returns wall time, executions/s and the basket's speedup. Both runs use
+        responseMode summary so serialization doesn't skew the comparison.
+        Note that the basket splits the BUY budget across legs, so fills differ.
+        """
+        headers = {"Authorization": f"Bearer {token}"}
+        sequential = {"executions": 0, "calls": []}
+        started = time.perf_counter()
+        for leg in legs:
+            order = {"orderType": "MARKET", "productType": "CNC", **leg, "responseMode": "summary"}
+            response = self.make_request('POST', 'admin/execute-order', order, headers)
+            if not response["success"]:
+                raise RuntimeError(f"execute-order {leg['symbol']} failed: {response['data']}")
+            executions = response["data"]["successfulExecutions"] + response["data"]["failedExecutions"]
+            sequential["executions"] += executions
+            sequential["calls"].append({"symbol": leg["symbol"], "executions": executions,
+                                        "elapsed_ms": round(response["elapsed_ms"], 1)})
+        sequential["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        response = self.make_request('POST', 'admin/execute-basket', {"legs": legs, "responseMode": "summary"}, headers)
+        if not response["success"]:
+            raise RuntimeError(f"execute-basket failed: {response['data']}")
+        basket = {
+            "executions": response["data"]["totalExecutions"],
+            "elapsed_ms": round(response["elapsed_ms"], 1),
+            "basketId": response["data"]["basketId"],
+            "server_timing": response["server_timing"]
+        }
+
+        for run in (sequential, basket):
+            run["executions_per_s"] = round(run["executions"] * 1000 / run["elapsed_ms"], 1) if run["elapsed_ms"] else 0.0
+        return {
+            "legs": len(legs),
+            "sequential": sequential,
+            "basket": basket,
+            "speedup": round(sequential["elapsed_ms"] / basket["elapsed_ms"], 2) if basket["elapsed_ms"] else None
+        }
+
+    def test_basket_order_execution(self):
+        """Test multi-symbol basket execution in one fan-out pass"""
+        print("\n=== Testing Basket Order Execution ===")
+        
+        if not self.admin_token:
+            self.log_test("Basket Order Execution", False, "No admin token available")
+            return False
+        
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        response = self.make_request('POST', 'admin/execute-basket',
+                                     {"legs": DEFAULT_BASKET, "responseMode": "compact"}, headers)
+        if not response["success"]:
+            self.log_test("Basket Order Execution", False, f"Basket failed with status {response['status_code']}", response["data"])
+            return False
+        
+        data = response["data"]
+        subscribers = data["totalSubscribers"]
+        if len(data["legs"]) != len(DEFAULT_BASKET) or len({leg["executionId"] for leg in data["legs"]}) != len(DEFAULT_BASKET):
+            self.log_test("Basket Order Execution", False, "Expected one distinct executionId per leg", data["legs"])
+            return False
+        for leg in data["legs"]:
+            if leg["successfulExecutions"] + leg["failedExecutions"] != subscribers:
+                self.log_test("Basket Order Execution", False, f"Leg {leg['symbol']} did not cover every subscriber", leg)
+                return False
+        if data["totalExecutions"] != subscribers * len(DEFAULT_BASKET) or len(data["results"]) != data["totalExecutions"]:
+            self.log_test("Basket Order Execution", False,
+                          f"{data['totalExecutions']} executions for {subscribers} subscribers x {len(DEFAULT_BASKET)} legs")
+            return False
+        
+        # Each leg is a regular execution: its stored rows carry the basket id
+        leg = data["legs"][0]
+        stored = list(self.iter_execution_pages(f"admin/execution-results?executionId={leg['executionId']}",
+                                                self.admin_token, page_size=100))
+        if len(stored) != subscribers or any(row.get("basketId") != data["basketId"] for row in stored):
+            self.log_test("Basket Order Execution", False, f"Stored rows for {leg['symbol']} don't match the basket")
+            return False
+        
+        self.log_test("Basket Order Execution", True,
+                      f"{data['totalExecutions']} executions across {len(DEFAULT_BASKET)} legs in {response['elapsed_ms']:.0f} ms "
+                      f"({data['successfulExecutions']} success, {data['failedExecutions']} failed)")
+        return True
+
+    def test_basket_validation(self):
+        """Test that malformed baskets are rejected before any order is placed"""
+        print("\n=== Testing Basket Validation ===")
+        
+        if not self.admin_token:
+            self.log_test("Basket Validation", False, "No admin token available")
+            return False
+        
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        cases = [
+            ("empty basket", {"legs": []}, 400),
+            ("unknown symbol", {"legs": [{"symbol": "NOSUCHSTOCK", "transactionType": "BUY", "quantity": 1}]}, 404),
+            ("bad side", {"legs": [{"symbol": "ITC", "transactionType": "HOLD", "quantity": 1}]}, 400),
+            ("bad quantity", {"legs": [{"symbol": "ITC", "transactionType": "BUY", "quantity": 0}]}, 400),
+            ("bad capital fraction", {"legs": DEFAULT_BASKET, "capitalFraction": 2}, 400)
+        ]
+        for name, body, expected in cases:
+            response = self.make_request('POST', 'admin/execute-basket', body, headers)
+            if response["status_code"] != expected:
+                self.log_test("Basket Validation", False, f"{name}: expected {expected}, got {response['status_code']}", response["data"])
+                return False
+        
+        user_headers = {"Authorization": f"Bearer {self.user_token}"}
+        response = self.make_request('POST', 'admin/execute-basket', {"legs": DEFAULT_BASKET}, user_headers)
+        if response["status_code"] != 403:
+            self.log_test("Basket Validation", False, f"Non-admin basket returned {response['status_code']}")
+            return False
+        
+        self.log_test("Basket Validation", True, f"{len(cases)} malformed baskets and a non-admin call rejected")
+        return True
+
+    def test_basket_throughput(self):
+        """Compare one basket call with sequential single-symbol execute-order calls"""
+        print("\n=== Testing Basket Throughput ===")
+        
+        if not self.admin_token:
+            self.log_test("Basket Throughput", False, "No admin token available")
+            return False
+        
+        try:
+            report = self.measure_basket_throughput(self.admin_token, DEFAULT_BASKET)
+        except RuntimeError as e:
+            self.log_test("Basket Throughput", False, "Comparison failed", str(e))
+            return False
+        
+        sequential, basket = report["sequential"], report["basket"]
+        if basket["executions"] != sequential["executions"]:
+            self.log_test("Basket Throughput", False,
+                          f"Basket placed {basket['executions']} executions, sequential calls {sequential['executions']}")
+            return False
+        
+        self.log_test("Basket Throughput", True,
+                      f"Sequential {sequential['elapsed_ms']:.0f} ms ({sequential['executions_per_s']:.0f}/s) vs "
+                      f"basket {basket['elapsed_ms']:.0f} ms ({basket['executions_per_s']:.0f}/s): {report['speedup']}x")
+        return True
+
+    def test_rollups_skip_rejected_orders(self):
+        """Test that an order the mock broker rejects adds nothing to the filled rollup counters"""
+        print("\n=== Testing Rollups Skip Rejected Orders ===")
+        
+        if not self.admin_token:
+            self.log_test("Rollups Skip Rejected Orders", False, "No admin token available")
+            return False
+        
+        # A fresh subscriber whose capital allows far more than its mock account's cash,
+        # so sizing passes and the mock broker rejects the fill
+        registration = self.make_request('POST', 'auth/register', {
+            "email": f"rollup{int(time.time() * 1000)}@example.com",
+            "password": "testpass123",
+            "name": "Rollup User"
+        })
+        if not registration["success"]:
+            self.log_test("Rollups Skip Rejected Orders", False, "Could not register a test user", registration["data"])
+            return False
+        user_id = registration["data"]["user"]["id"]
+        admin_headers = {"Authorization": f"Bearer {self.admin_token}"}
+        self.make_request('POST', 'user/update-capital', {"maxCapital": 1_000_000_000},
+                          {"Authorization": f"Bearer {registration['data']['token']}"})
+        self.make_request('POST', 'admin/update-subscription', {"userId": user_id, "subscriptionStatus": "active"},
+                          admin_headers)
+        
+        try:
+            order = {"symbol": "RELIANCE", "transactionType": "BUY", "orderType": "MARKET", "quantity": 5000,
+                     "productType": "CNC", "responseMode": "compact"}
+            response = self.make_request('POST', 'admin/execute-order', order, admin_headers)
+            if not response["success"]:
+                self.log_test("Rollups Skip Rejected Orders", False, "Order execution failed", response["data"])
+                return False
+            results = response["data"]["results"]
+            own = next((r for r in results if r["userId"] == user_id), None)
+            if own is None or own["status"] != "FAILED":
+                self.log_test("Rollups Skip Rejected Orders", False, "Expected the test user's order to be rejected", own)
+                return False
+            
+            stats = self.make_request('GET', f"admin/execution-stats?userId={user_id}", headers=admin_headers)
+            totals = stats["data"].get("totals", {}) if stats["success"] else {}
+            if totals.get("failed") != 1 or totals.get("executedQuantity") != 0 or totals.get("notional") != 0:
+                self.log_test("Rollups Skip Rejected Orders", False, "Rejected order counted as filled", totals)
+                return False
+            
+            execution_id = response["data"]["executionId"]
+            rollup = self.make_request('GET', f"admin/execution-stats?executionId={execution_id}", headers=admin_headers)
+            filled = sum(r["executedQuantity"] for r in results if r["status"] == "SUCCESS")
+            if not rollup["success"] or rollup["data"]["executedQuantity"] != filled:
+                self.log_test("Rollups Skip Rejected Orders", False,
+                              f"Execution rollup executedQuantity != {filled} filled", rollup["data"])
+                return False
+        finally:
+            self.make_request('POST', 'admin/update-subscription', {"userId": user_id, "subscriptionStatus": "inactive"},
+                              admin_headers)
+        
+        self.log_test("Rollups Skip Rejected Orders", True,
+                      f"Rejected order left executedQuantity at 0; execution rollup matches {filled} filled shares")
+        return True
+
     def test_insufficient_funds_scenario(self):
         """Test order execution with insufficient funds"""
         print("\n=== Testing Insufficient Funds Scenario ===")
@@ -460,17 +1058,18 @@ class StockSyncTester:
             "transactionType": "BUY", 
             "orderType": "MARKET",
             "quantity": 1000,  # Very large quantity
-            "productType": "CNC"
+            "productType": "CNC",
+            "responseMode": "summary"
         }
         
         response = self.make_request('POST', 'admin/execute-order', expensive_order, headers)
         
         if response["success"]:
             data = response["data"]
-            results = data.get("results", [])
+            error_summary = data.get("errorSummary", {})
             
             # Check if some orders failed due to insufficient funds
-            insufficient_funds_failures = [r for r in results if r.get("errorReason") and "insufficient" in r.get("errorReason", "").lower()]
+            insufficient_funds_failures = [reason for reason in error_summary if "insufficient" in reason.lower()]
             
             if len(insufficient_funds_failures) > 0:
                 self.log_test("Insufficient Funds Test", True, "System properly handles insufficient funds scenarios")
@@ -498,17 +1097,18 @@ class StockSyncTester:
             "transactionType": "SELL",
             "orderType": "MARKET", 
             "quantity": 10,
-            "productType": "CNC"
+            "productType": "CNC",
+            "responseMode": "summary"
         }
         
         response = self.make_request('POST', 'admin/execute-order', sell_order, headers)
         
         if response["success"]:
             data = response["data"]
-            results = data.get("results", [])
+            error_summary = data.get("errorSummary", {})
             
             # Check if orders failed due to stock not in portfolio
-            portfolio_failures = [r for r in results if r.get("errorReason") and "portfolio" in r.get("errorReason", "").lower()]
+            portfolio_failures = [reason for reason in error_summary if "portfolio" in reason.lower()]
             
             if len(portfolio_failures) > 0:
                 self.log_test("Sell Without Holdings", True, "System properly validates portfolio holdings for sell orders")
@@ -537,6 +1137,7 @@ class StockSyncTester:
         
         # User functionality tests
         self.test_user_broker_connection()
+        self.test_pending_broker_verification()
         self.test_user_capital_update()
         self.test_user_portfolio_and_funds()
         
@@ -545,15 +1146,27 @@ class StockSyncTester:
         
         # Core order execution engine tests (MOST CRITICAL)
         self.test_multi_user_order_execution()
+        self.test_metrics_endpoint()
+        self.test_async_order_execution()
+        self.test_streamed_order_execution()
         self.test_execution_history()
+        self.test_execution_history_pagination()
         self.test_user_order_history()
         
+        self.test_rollups_skip_rejected_orders()
+        
+        # Basket execution tests
+        self.test_basket_validation()
+        self.test_basket_order_execution()
+        self.test_basket_throughput()
+        
         # Edge case tests
         self.test_insufficient_funds_scenario()
         self.test_sell_without_holdings()
         
         # Print summary
         self.print_test_summary()
+        self.print_server_timing_report()
 
     def print_test_summary(self):
         """Print comprehensive test summary"""
@@ -597,6 +1210,258 @@ class StockSyncTester:
         
         print("\n" + "=" * 60)
 
+    # ------------------------------------------------------------------
+    # Load mode
+    # ------------------------------------------------------------------
+
+    def _load_request(self, endpoint: str, rng: random.Random, tokens: Dict[str, str]):
+        """Build (method, path, body, headers) for one load-mode operation"""
+        if endpoint == "auth/login":
+            return "POST", "auth/login", self.user_credentials, None
+        if endpoint == "stocks/search":
+            return "GET", f"stocks/search?q={rng.choice(SEARCH_QUERIES)}", None, None
+        if endpoint == "admin/execute-order":
+            order = {
+                "symbol": "RELIANCE",
+                "transactionType": "BUY",
+                "orderType": "MARKET",
+                "quantity": 1,
+                "productType": "CNC"
+            }
+            return "POST", endpoint, order, {"Authorization": f"Bearer {tokens['admin']}"}
+        return "GET", endpoint, None, {"Authorization": f"Bearer {tokens['user']}"}
+
+    async def _async_login(self, client: AsyncStockSyncClient, credentials: Dict) -> Optional[str]:
+        response = await client.request("POST", "auth/login", json=credentials)
+        if response["status_code"] != 200:
+            return None
+        return response["data"].get("token")
+
+    async def _virtual_user(self, client, user_index: int, endpoints: List[str], weights: List[float],
+                            tokens: Dict[str, str], interval: float, deadline: float,
+                            histograms: Dict[str, "LatencyHistogram"], errors: Dict[str, int],
+                            phase_histograms: Dict[str, Dict[str, "LatencyHistogram"]], seed: int):
+        rng = random.Random(seed + user_index)
+        # Stagger start so virtual users don't fire in lockstep
+        next_start = time.perf_counter() + (rng.random() * interval if interval else 0)
+
+        while True:
+            if interval:
+                delay = next_start - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            intended_start = next_start if interval else time.perf_counter()
+            if intended_start >= deadline:
+                break
+
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, path, body, headers = self._load_request(endpoint, rng, tokens)
+            response = await client.request(method, path, json=body, headers=headers)
+            failed = not response["success"]
+            for phase, entry in response["server_timing"].items():
+                phase_histograms[endpoint].setdefault(phase, LatencyHistogram()).record(entry["dur_ms"] / 1000)
+
+            # Measure from the intended start so a stalled server can't hide
+            # queueing delay (coordinated omission)
+            histograms[endpoint].record(time.perf_counter() - intended_start)
+            if failed:
+                errors[endpoint] += 1
+
+            if interval:
+                next_start += interval
+            elif time.perf_counter() >= deadline:
+                break
+
+    async def _run_load(self, users: int, duration: float, rate: Optional[float],
+                        mix: Dict[str, float], seed: int) -> Dict[str, Any]:
+        # No retries: a retried GET would hide the error and the latency it caused
+        async with AsyncStockSyncClient(self.base_url, max_connections=users, max_retries=0) as client:
+            tokens = {
+                "admin": await self._async_login(client, self.admin_credentials),
+                "user": await self._async_login(client, self.user_credentials)
+            }
+            if not tokens["admin"] or not tokens["user"]:
+                raise RuntimeError("Load mode requires working admin and user logins")
+
+            endpoints = [e for e, w in mix.items() if w > 0]
+            weights = [mix[e] for e in endpoints]
+            histograms = {e: LatencyHistogram() for e in endpoints}
+            errors = {e: 0 for e in endpoints}
+            phase_histograms = {e: {} for e in endpoints}
+            interval = users / rate if rate else 0
+
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*[
+                self._virtual_user(client, i, endpoints, weights, tokens, interval,
+                                   deadline, histograms, errors, phase_histograms, seed)
+                for i in range(users)
+            ])
+            elapsed = time.perf_counter() - started
+
+        overall = LatencyHistogram()
+        report_endpoints = {}
+        for endpoint, histogram in histograms.items():
+            overall.merge(histogram)
+            count = histogram.total_count
+            report_endpoints[endpoint] = {
+                **histogram.summary(),
+                "errors": errors[endpoint],
+                "error_rate": round(errors[endpoint] / count, 4) if count else 0.0,
+                "throughput_rps": round(count / elapsed, 2),
+                "distribution": histogram.distribution(),
+                "server_phases": {phase: h.summary() for phase, h in phase_histograms[endpoint].items()}
+            }
+
+        total_errors = sum(errors.values())
+        return {
+            "base_url": self.base_url,
+            "virtual_users": users,
+            "duration_s": round(elapsed, 3),
+            "target_rate_rps": rate,
+            "mix": mix,
+            "seed": seed,
+            "overall": {
+                **overall.summary(),
+                "errors": total_errors,
+                "error_rate": round(total_errors / overall.total_count, 4) if overall.total_count else 0.0,
+                "throughput_rps": round(overall.total_count / elapsed, 2),
+                "distribution": overall.distribution()
+            },
+            "endpoints": report_endpoints,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def run_load_test(self, users: int = 10, duration: float = 30, rate: Optional[float] = None,
+                      mix: Dict[str, float] = None, seed: int = 42, output: str = None) -> Dict[str, Any]:
+        """Drive the API with N concurrent virtual users and report latency histograms.
+
+        Without a target rate each virtual user runs closed-loop (next request as
+        soon as the previous one returns); with a rate the load is spread evenly
+        across users on a fixed schedule.
+        """
+        print("🚀 Starting StockSync Load Test")
+        print(f"🌐 Testing against: {self.base_url}")
+        print(f"👥 Virtual users: {users}, duration: {duration}s, target rate: {rate or 'unbounded'} req/s")
+        print("=" * 60)
+
+        report = asyncio.run(self._run_load(users, duration, rate, mix or DEFAULT_LOAD_MIX, seed))
+        self.print_load_summary(report)
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Load report written to {output}")
+
+        return report
+
+    def print_load_summary(self, report: Dict[str, Any]):
+        """Print per-endpoint latency percentiles, throughput and error rates"""
+        print("\n📊 LOAD TEST SUMMARY")
+        print("=" * 60)
+        header = f"{'Endpoint':<22}{'Count':>8}{'RPS':>9}{'Err%':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+        print(header)
+        print("-" * len(header))
+        rows = list(report["endpoints"].items()) + [("TOTAL", report["overall"])]
+        for endpoint, stats in rows:
+            print(f"{endpoint:<22}{stats['count']:>8}{stats['throughput_rps']:>9.1f}"
+                  f"{stats['error_rate'] * 100:>6.1f}%{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}"
+                  f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+        print("(latencies in ms)")
+
+        for endpoint, stats in report["endpoints"].items():
+            if not stats.get("server_phases"):
+                continue
+            print(f"\n⏱️  Server phases for {endpoint} (from Server-Timing, ms):")
+            print(f"  {'Phase':<12}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+            print(f"  {'client':<12}{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+            for phase, phase_stats in stats["server_phases"].items():
+                print(f"  {phase:<12}{phase_stats['p50_ms']:>9.1f}{phase_stats['p90_ms']:>9.1f}"
+                      f"{phase_stats['p99_ms']:>9.1f}{phase_stats['max_ms']:>9.1f}")
+
+        print("\n📈 Overall latency distribution:")
+        for row in report["overall"]["distribution"]:
+            print(f"  p{row['percentile']:<7} {row['latency_ms']:>10.3f} ms")
+        print("\n" + "=" * 60)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse an endpoint mix like 'stocks/search=50,user/funds=50'"""
+    mix = {}
+    for part in value.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint.strip() not in DEFAULT_LOAD_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {endpoint}")
+        mix[endpoint.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_basket(value: str) -> List[Dict[str, Any]]:
+    """Parse basket legs like 'ITC:BUY:2,TCS:SELL:1'"""
+    legs = []
+    for part in value.split(","):
+        try:
+            symbol, side, quantity = part.strip().split(":")
+            legs.append({"symbol": symbol.upper(), "transactionType": side.upper(), "quantity": int(quantity)})
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid basket leg (want SYMBOL:SIDE:QTY): {part}")
+    return legs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="StockSync backend API tests")
+    parser.add_argument("--base-url", help="API base URL (default: $STOCKSYNC_BASE_URL or the preview deployment)")
+    parser.add_argument("--load", action="store_true", help="Run load mode instead of the functional tests")
+    parser.add_argument("--users", type=int, default=10, help="Number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Load test duration in seconds")
+    parser.add_argument("--rate", type=float, help="Target aggregate request rate (req/s); unbounded if omitted")
+    parser.add_argument("--mix", type=parse_mix, help="Endpoint weights, e.g. 'stocks/search=50,user/funds=50'")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the endpoint mix")
+    parser.add_argument("--output", help="Write the JSON load, stream or basket report to this file")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Stream the full execution history and print reconciliation totals")
+    parser.add_argument("--basket", type=parse_basket, nargs="?", const=DEFAULT_BASKET, metavar="LEGS",
+                        help="Compare one basket call with sequential execute-order calls, "
+                             "e.g. 'ITC:BUY:2,TCS:SELL:1' (default: the test basket)")
+    parser.add_argument("--stream-order", metavar="SYMBOL",
+                        help="Execute a 1-share BUY of SYMBOL with a progress stream and report time-to-first-result")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    tester = StockSyncTester()
-    tester.run_all_tests()
\ No newline at end of file
+    args = parse_args()
+    tester = StockSyncTester(args.base_url)
+    if args.load:
+        tester.run_load_test(users=args.users, duration=args.duration, rate=args.rate,
+                             mix=args.mix, seed=args.seed, output=args.output)
+    elif args.reconcile:
+        login = tester.make_request('POST', 'auth/login', tester.admin_credentials)
+        if not login["success"]:
+            raise SystemExit(f"Admin login failed: {login['data']}")
+        print(json.dumps(tester.reconcile_executions(login["data"]["token"]), indent=2))
+    elif args.basket:
+        login = tester.make_request('POST', 'auth/login', tester.admin_credentials)
+        if not login["success"]:
+            raise SystemExit(f"Admin login failed: {login['data']}")
+        report = tester.measure_basket_throughput(login["data"]["token"], args.basket)
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Basket report written to {args.output}")
+    elif args.stream_order:
+        login = tester.make_request('POST', 'auth/login', tester.admin_credentials)
+        if not login["success"]:
+            raise SystemExit(f"Admin login failed: {login['data']}")
+        order = {"symbol": args.stream_order, "transactionType": "BUY", "orderType": "MARKET",
+                 "quantity": 1, "productType": "CNC"}
+        report = tester.measure_execution_stream(login["data"]["token"], order)
+        print(f"⏱️  First result after {report['time_to_first_result_ms']} ms; "
+              f"{report['results']}/{report['total_subscribers']} results in {report['total_ms']} ms; "
+              f"milestones {report['milestones']}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Stream report written to {args.output}")
+    else:
+        tester.run_all_tests()
\ No newline at end of file
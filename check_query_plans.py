@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Query plan checker for StockSync's hot MongoDB queries
+
+Runs explain() on every query shape the API issues per request and fails if
+any winning plan contains a COLLSCAN or an in-memory SORT stage.
+
+    python check_query_plans.py            # check only
+    python check_query_plans.py --create   # provision indexes first
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterator
+
+from setup_default_accounts import get_database, ensure_indexes
+
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT"}
+
+# (description, collection, filter, sort, limit) mirroring route.js
+HOT_QUERIES = [
+    ("authenticateUser", "users", {"token": "token_check"}, None, 1),
+    ("auth/login", "users", {"email": "check@example.com", "password": "check"}, None, 1),
+    ("auth/register duplicate check", "users", {"email": "check@example.com"}, None, 1),
+    ("execute-order active subscribers", "users", {"subscriptionStatus": "active", "role": "user"}, None, 0),
+    ("admin/subscribers", "users", {"role": "user"}, None, 0),
+    ("update by user id", "users", {"id": "check"}, None, 1),
+    ("broker verifier due batch", "users",
+     {"brokerConnections": {"$elemMatch": {"nextVerifyAt": {"$lte": datetime(2024, 1, 1, tzinfo=timezone.utc)}}}}, None, 200),
+    ("broker verifier claimed batch", "users", {"brokerConnections.verifyToken": "check"}, None, 0),
+    ("admin/execution-history", "order_executions", {}, [("timestamp", -1), ("id", -1)], 101),
+    ("user/orders", "order_executions", {"userId": "check"}, [("timestamp", -1), ("id", -1)], 51),
+    ("execution-history keyset page", "order_executions",
+     {"$or": [{"timestamp": {"$lt": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+              {"timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc), "id": {"$lt": "check"}}]},
+     [("timestamp", -1), ("id", -1)], 101),
+    ("admin/execution-results", "order_executions", {"executionId": "check"}, [("timestamp", -1), ("id", -1)], 101),
+    ("admin/execution-status", "execution_jobs", {"executionId": "check"}, None, 1),
+    ("order reconciler due batch", "order_executions",
+     {"reconciliation": "pending", "nextReconcileAt": {"$lte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+     [("nextReconcileAt", 1)], 200),
+    ("order reconciler claimed batch", "order_executions", {"reconcileToken": "check"}, None, 0),
+    ("execution worker queued claim", "execution_tasks", {"status": "queued"}, [("createdAt", 1)], 50),
+    ("execution worker expired leases", "execution_tasks",
+     {"status": "leased", "leaseUntil": {"$lt": datetime(2024, 1, 1, tzinfo=timezone.utc)}}, None, 50),
+    ("execution worker claimed batch", "execution_tasks", {"leaseToken": "check"}, None, 0),
+    ("admin/execution-stats by symbol", "execution_rollups",
+     {"scope": "symbol", "symbol": "CHECK", "day": {"$gte": "2024-01-01", "$lte": "2024-01-30"}}, [("day", 1)], 0),
+    ("admin/execution-stats by user", "execution_rollups",
+     {"scope": "user", "userId": "check", "day": {"$gte": "2024-01-01", "$lte": "2024-01-30"}}, [("day", 1)], 0)
+]
+
+
+def plan_stages(plan: Dict[str, Any]) -> Iterator[str]:
+    """Yield every stage name in an explain() plan tree"""
+    if "queryPlan" in plan:
+        # Slot-based engine wraps the classic tree in queryPlan
+        plan = plan["queryPlan"]
+    if "stage" in plan:
+        yield plan["stage"]
+    if "inputStage" in plan:
+        yield from plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def check_query(db, description: str, collection: str, query: Dict, sort: List = None, limit: int = 0) -> List[str]:
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    explain = cursor.explain()
+    stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+    problems = sorted(FORBIDDEN_STAGES.intersection(stages))
+
+    status = "❌ FAIL" if problems else "✅ PASS"
+    print(f"{status} {description}: {' -> '.join(reversed(stages))}")
+    return problems
+
+
+def check_query_plans(db) -> bool:
+    failures = 0
+    for description, collection, query, sort, limit in HOT_QUERIES:
+        if check_query(db, description, collection, query, sort, limit):
+            failures += 1
+
+    print(f"\n📊 {len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} query shapes use an index without in-memory sort")
+    return failures == 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Verify StockSync hot queries are index-backed")
+    parser.add_argument("--create", action="store_true", help="Provision indexes before checking")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    db = get_database()
+    if args.create:
+        ensure_indexes(db)
+    sys.exit(0 if check_query_plans(db) else 1)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Offline Dhan API v2 stand-in server for StockSync benchmarking
+
+Implements the endpoints DhanBroker uses (POST /orders, GET /orders/{orderId},
+GET /holdings, GET /fundlimit, GET /positions) with per-client state keyed by
+the access-token header. Latency, error rate, HTTP 429 rate limiting and slow
+tails are configurable so fan-out behaviour can be measured when the broker
+degrades.
+
+Point the app at it with:
+    DHAN_BASE_URL=http://localhost:8900 yarn dev
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, Any, List, Optional
+
+from aiohttp import web
+
+# Reference prices for the securities StockSync trades (securityId -> price)
+REFERENCE_PRICES = {
+    "2885": ("RELIANCE", 2950.50),
+    "11536": ("TCS", 4120.75),
+    "1333": ("HDFCBANK", 1580.25),
+    "1594": ("INFY", 1805.60),
+    "4963": ("ICICIBANK", 1245.80),
+    "356": ("HINDUNILVR", 2380.90),
+    "424": ("ITC", 465.35),
+    "10604": ("BHARTIARTL", 1520.40),
+    "1922": ("KOTAKBANK", 1890.65),
+    "11483": ("LT", 3560.25)
+}
+
+# Dhan's documented per-account limits (requests/second)
+ORDER_API_RPS = 25
+NON_TRADING_API_RPS = 20
+
+
+class LatencyModel:
+    """Samples response latency (seconds) from a configured distribution.
+
+    Spec formats (all values in milliseconds):
+        fixed:20            always 20ms
+        uniform:10:50       uniform between 10ms and 50ms
+        lognormal:20:0.5    log-normal with 20ms median and sigma 0.5
+        exponential:20      exponential with 20ms mean
+    """
+
+    def __init__(self, spec: str, rng: random.Random, slow_tail_rate: float = 0.0, slow_tail_ms: float = 0.0):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng
+        self.slow_tail_rate = slow_tail_rate
+        self.slow_tail_ms = slow_tail_ms
+        if kind not in ("fixed", "uniform", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            ms = median * self.rng.lognormvariate(0, sigma)
+        else:
+            ms = self.rng.expovariate(1 / self.params[0])
+
+        if self.slow_tail_rate and self.rng.random() < self.slow_tail_rate:
+            ms += self.slow_tail_ms
+        return ms / 1000
+
+
+class TokenBucket:
+    """Classic token bucket; `take()` returns False when the caller is over its rate"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ClientAccount:
+    """Per access-token broker state: funds, holdings and orders"""
+
+    def __init__(self, client_id: str, starting_cash: float, order_rps: float, data_rps: float):
+        self.client_id = client_id
+        self.cash = starting_cash
+        self.holdings: Dict[str, Dict[str, Any]] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.order_bucket = TokenBucket(order_rps)
+        self.data_bucket = TokenBucket(data_rps)
+
+
+class DhanStandIn:
+    def __init__(self, config: argparse.Namespace):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.latency = LatencyModel(config.latency, self.rng, config.slow_tail_rate, config.slow_tail_ms)
+        self.accounts: Dict[str, ClientAccount] = {}
+        self.app_bucket = TokenBucket(config.app_rps) if config.app_rps else None
+        self.order_ids = itertools.count(int(time.time()) * 1000)
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "orders": 0, "rejected": 0}
+
+    def account(self, request: web.Request) -> Optional[ClientAccount]:
+        token = request.headers.get("access-token")
+        if not token or (self.config.expired_token_prefix and token.startswith(self.config.expired_token_prefix)):
+            return None
+        if token not in self.accounts:
+            self.accounts[token] = ClientAccount(
+                client_id=f"STANDIN{len(self.accounts) + 1}",
+                starting_cash=self.config.starting_cash,
+                order_rps=self.config.order_rps,
+                data_rps=self.config.data_rps
+            )
+        return self.accounts[token]
+
+    @staticmethod
+    def error(status: int, code: str, message: str, error_type: str = "Input_Exception") -> web.Response:
+        # Dhan reports errors as errorType/errorCode/errorMessage; DhanBroker reads `message`
+        return web.json_response({
+            "errorType": error_type,
+            "errorCode": code,
+            "errorMessage": message,
+            "message": message
+        }, status=status)
+
+    async def gate(self, request: web.Request, order_api: bool):
+        """Shared preamble: auth, rate limiting, latency and injected errors"""
+        self.stats["requests"] += 1
+        account = self.account(request)
+        if account is None:
+            return None, self.error(401, "DH-901", "Invalid access token", "Invalid_Authentication")
+
+        bucket = account.order_bucket if order_api else account.data_bucket
+        if (self.app_bucket and not self.app_bucket.take()) or not bucket.take():
+            self.stats["rate_limited"] += 1
+            return None, self.error(429, "DH-904", "Too many requests", "Rate_Limit")
+
+        await asyncio.sleep(self.latency.sample())
+
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return None, self.error(500, "DH-908", "Internal server error", "Internal_Server_Error")
+
+        return account, None
+
+    def settle(self, account: ClientAccount, order: Dict[str, Any]):
+        """Move a pending order to its final state once the fill delay has passed"""
+        if order["orderStatus"] != "PENDING":
+            return
+        if time.monotonic() < order["_fillAt"]:
+            return
+
+        quantity = order["quantity"]
+        notional = quantity * order["price"]
+        holding = account.holdings.get(order["securityId"])
+
+        if order["_reject"]:
+            order["orderStatus"] = "REJECTED"
+            order["omsErrorDescription"] = "RMS rejected the order"
+        elif order["transactionType"] == "BUY":
+            if notional > account.cash:
+                order["orderStatus"] = "REJECTED"
+                order["omsErrorDescription"] = "Insufficient funds"
+            else:
+                account.cash -= notional
+                if holding is None:
+                    holding = account.holdings[order["securityId"]] = {
+                        "exchange": "NSE",
+                        "tradingSymbol": order["tradingSymbol"],
+                        "securityId": order["securityId"],
+                        "totalQty": 0,
+                        "availableQty": 0,
+                        "avgCostPrice": 0.0
+                    }
+                total_cost = holding["avgCostPrice"] * holding["totalQty"] + notional
+                holding["totalQty"] += quantity
+                holding["availableQty"] += quantity
+                holding["avgCostPrice"] = round(total_cost / holding["totalQty"], 2)
+                order["orderStatus"] = "TRADED"
+        else:
+            if holding is None or holding["availableQty"] < quantity:
+                order["orderStatus"] = "REJECTED"
+                order["omsErrorDescription"] = "Insufficient holdings"
+            else:
+                account.cash += notional
+                holding["totalQty"] -= quantity
+                holding["availableQty"] -= quantity
+                if holding["totalQty"] == 0:
+                    del account.holdings[order["securityId"]]
+                order["orderStatus"] = "TRADED"
+
+        if order["orderStatus"] == "TRADED":
+            order["filledQty"] = quantity
+            order["averageTradedPrice"] = order["price"]
+        else:
+            self.stats["rejected"] += 1
+        order["updateTime"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def public_order(order: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in order.items() if not k.startswith("_")}
+
+    async def place_order(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=True)
+        if failure:
+            return failure
+
+        try:
+            body = await request.json()
+            quantity = int(body["quantity"])
+            security_id = str(body["securityId"])
+        except (ValueError, KeyError):
+            return self.error(400, "DH-905", "Missing or invalid order parameters")
+
+        symbol, reference_price = REFERENCE_PRICES.get(security_id, (body.get("tradingSymbol", security_id), 100.0))
+        order_id = str(next(self.order_ids))
+        order = {
+            "dhanClientId": body.get("dhanClientId", account.client_id),
+            "orderId": order_id,
+            "correlationId": body.get("correlationId", ""),
+            "orderStatus": "PENDING",
+            "transactionType": body.get("transactionType"),
+            "exchangeSegment": body.get("exchangeSegment"),
+            "productType": body.get("productType"),
+            "orderType": body.get("orderType"),
+            "validity": body.get("validity", "DAY"),
+            "tradingSymbol": symbol,
+            "securityId": security_id,
+            "quantity": quantity,
+            "price": float(body.get("price") or reference_price),
+            "filledQty": 0,
+            "averageTradedPrice": 0,
+            "createTime": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "updateTime": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "_fillAt": time.monotonic() + self.config.fill_delay_ms / 1000,
+            "_reject": self.rng.random() < self.config.reject_rate
+        }
+        account.orders[order_id] = order
+        self.stats["orders"] += 1
+        return web.json_response({"orderId": order_id, "orderStatus": "PENDING"})
+
+    async def get_order(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=False)
+        if failure:
+            return failure
+
+        order = account.orders.get(request.match_info["order_id"])
+        if order is None:
+            return self.error(404, "DH-906", "Order not found")
+        self.settle(account, order)
+        return web.json_response(self.public_order(order))
+
+    async def cancel_order(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=True)
+        if failure:
+            return failure
+
+        order = account.orders.get(request.match_info["order_id"])
+        if order is None:
+            return self.error(404, "DH-906", "Order not found")
+        self.settle(account, order)
+        if order["orderStatus"] == "PENDING":
+            order["orderStatus"] = "CANCELLED"
+        return web.json_response({"orderId": order["orderId"], "orderStatus": order["orderStatus"]})
+
+    def settle_all(self, account: ClientAccount):
+        for order in account.orders.values():
+            self.settle(account, order)
+
+    async def get_holdings(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=False)
+        if failure:
+            return failure
+        self.settle_all(account)
+        return web.json_response(list(account.holdings.values()))
+
+    async def get_positions(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=False)
+        if failure:
+            return failure
+        return web.json_response([])
+
+    async def get_funds(self, request: web.Request) -> web.Response:
+        account, failure = await self.gate(request, order_api=False)
+        if failure:
+            return failure
+        self.settle_all(account)
+        utilized = self.config.starting_cash - account.cash
+        return web.json_response({
+            "dhanClientId": account.client_id,
+            "availabelBalance": round(account.cash, 2),
+            "sodLimit": self.config.starting_cash,
+            "collateralAmount": 0,
+            "receiveableAmount": 0,
+            "utilizedAmount": round(max(utilized, 0), 2),
+            "blockedPayoutAmount": 0,
+            "withdrawableBalance": round(account.cash, 2)
+        })
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "accounts": len(self.accounts)})
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.accounts.clear()
+        self.stats = {k: 0 for k in self.stats}
+        return web.json_response({"reset": True})
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/orders", self.place_order),
+            web.get("/orders/{order_id}", self.get_order),
+            web.delete("/orders/{order_id}", self.cancel_order),
+            web.get("/holdings", self.get_holdings),
+            web.get("/positions", self.get_positions),
+            web.get("/fundlimit", self.get_funds),
+            web.get("/_standin/stats", self.get_stats),
+            web.post("/_standin/reset", self.reset)
+        ])
+        return app
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline Dhan API v2 stand-in server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for latency, errors and rejections")
+    parser.add_argument("--latency", default="lognormal:20:0.5",
+                        help="Latency distribution: fixed:MS, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA, exponential:MEAN")
+    parser.add_argument("--slow-tail-rate", type=float, default=0.0, help="Share of requests that hit the slow tail")
+    parser.add_argument("--slow-tail-ms", type=float, default=2000, help="Extra latency added on a slow-tail hit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of accepted orders later REJECTED")
+    parser.add_argument("--fill-delay-ms", type=float, default=500, help="Time before a PENDING order settles")
+    parser.add_argument("--order-rps", type=float, default=ORDER_API_RPS, help="Per-account order API limit")
+    parser.add_argument("--data-rps", type=float, default=NON_TRADING_API_RPS, help="Per-account non-trading API limit")
+    parser.add_argument("--app-rps", type=float, default=0, help="Limit across all accounts (0 = unlimited)")
+    parser.add_argument("--starting-cash", type=float, default=500000, help="Opening balance for each account")
+    parser.add_argument("--expired-token-prefix", default="expired_",
+                        help="Reject access tokens with this prefix as expired (DH-901); empty disables")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    standin = DhanStandIn(args)
+    print(f"🧪 Dhan stand-in listening on http://{args.host}:{args.port} (latency={args.latency}, "
+          f"errors={args.error_rate}, order limit={args.order_rps}/s)")
+    web.run_app(standin.build_app(), host=args.host, port=args.port, print=None)
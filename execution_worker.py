@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Execution task worker for StockSync
+
+Processes the per-subscriber tasks that `admin/execute-order` enqueues with
+`queue: true`. Any number of workers can run on any number of machines
+against the same Mongo:
+
+- tasks are claimed in batches with a lease (conditional update_many, so two
+  workers never hold the same task)
+- a heartbeat thread renews the lease of every task the worker still holds,
+  so a slow batch is not claimed again while it is being worked on
+- a task whose lease expires (worker crashed or stalled) is claimed again,
+  up to --max-attempts
+- each batch is sized and placed in parallel, results are bulk-inserted into
+  order_executions and the job counters are bumped with one $inc per job
+
+Right before placing an order the worker re-checks its lease token; a task
+that was claimed again by another worker is dropped, not placed. Mock orders
+are idempotent by order key, so a retried task never fills a mock account
+twice. Dhan does not deduplicate orders: a worker stalled for longer than the
+lease between that check and the broker call can still place a second order,
+which carries the same correlationId (a hash of executionId and userId, as
+in the API) for reconciliation.
+Execution records reuse the task id, so the unique index keeps a retried task
+from being recorded or counted twice.
+
+    python execution_worker.py                         # run until stopped
+    python execution_worker.py --exit-when-idle        # drain the queue and exit
+    python execution_worker.py --processes 4           # four worker processes
+"""
+
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import requests
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from mock_broker import MockBroker
+from rollup_executions import rollup_operations
+from setup_default_accounts import get_database
+
+DHAN_BASE_URL = os.environ.get("DHAN_BASE_URL", "https://api.dhan.co/v2")
+# Same settings (and defaults) as the API, so queued and inline executions agree
+BUY_CAPITAL_FRACTION = float(os.environ.get("BUY_CAPITAL_FRACTION", "0.25"))
+DHAN_ACCOUNT_LIMITS = {
+    "order": float(os.environ.get("DHAN_ACCOUNT_ORDER_RPS", "25")),
+    "data": float(os.environ.get("DHAN_ACCOUNT_DATA_RPS", "20"))
+}
+DHAN_REQUEST_DEADLINE_S = int(os.environ.get("DHAN_REQUEST_DEADLINE_MS", "10000")) / 1000
+BASE_BACKOFF_S = 0.1
+MAX_BACKOFF_S = 2.0
+FINAL_ORDER_STATUSES = {"TRADED", "REJECTED", "CANCELLED", "EXPIRED"}
+DUPLICATE_KEY = 11000
+
+PRODUCT_TYPES = {"CNC": "CNC", "MIS": "INTRADAY", "DELIVERY": "CNC", "INTRADAY": "INTRADAY"}
+EXCHANGE_SEGMENTS = {"NSE": "NSE_EQ", "BSE": "BSE_EQ"}
+
+
+def claimable(now: datetime) -> Dict[str, Any]:
+    return {"$or": [{"status": "queued"}, {"status": "leased", "leaseUntil": {"$lt": now}}]}
+
+
+def dhan_connection(user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for connection in user.get("brokerConnections") or []:
+        if connection.get("brokerName") == "Dhan" and connection.get("status") == "connected" \
+                and connection.get("accessToken"):
+            return connection
+    return None
+
+
+def order_correlation_id(execution_id: str, user_id: str) -> str:
+    """Same id as orderCorrelationId in lib/brokers/dhan.js, so both paths tag an order alike"""
+    return "SS" + hashlib.sha1(f"{execution_id}:{user_id}".encode()).hexdigest()[:23]
+
+
+class AccountRateLimiter:
+    """Per-account Dhan request budget shared by every worker process.
+
+    The API's scheduler (lib/brokers/scheduler.js) only sees its own process,
+    so workers count requests per (account, category, second) in Mongo
+    (broker_rate_limits, expired by a TTL index). A request past the limit
+    waits for the next second; one that would wait past its deadline fails.
+    Windows are wall-clock seconds, so worker hosts need synchronized clocks.
+    """
+
+    def __init__(self, db, limits: Dict[str, float]):
+        self.collection = db.broker_rate_limits
+        self.limits = limits
+
+    def acquire(self, account_id: str, category: str, deadline: float):
+        limit = self.limits.get(category)
+        if not limit:
+            return
+        while True:
+            now = time.time()
+            window = int(now)
+            counter = self.collection.find_one_and_update(
+                {"_id": f"{account_id}:{category}:{window}"},
+                {"$inc": {"count": 1},
+                 "$setOnInsert": {"expiresAt": datetime.fromtimestamp(window + 60, timezone.utc)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            if counter["count"] <= max(1, math.floor(limit)):
+                return
+            wait = window + 1 - now
+            if now + wait >= deadline:
+                raise RuntimeError("Rate limit wait exceeds deadline")
+            # Spread the waiters over the start of the next window
+            time.sleep(wait + random.uniform(0, 0.05))
+
+
+def is_retryable(status: Optional[int], method: str) -> bool:
+    """Same rule as isRetryable in lib/brokers/dhan.js: 429 always, other failures only for reads"""
+    if status == 429:
+        return True
+    return method == "GET" and (status is None or status >= 500)
+
+
+class ExecutionWorker:
+    def __init__(self, worker_id: str = None, batch_size: int = 50, concurrency: int = 8,
+                 lease_seconds: float = 60, max_attempts: int = 3, mock_latency_ms: float = None):
+        self.db = get_database()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Subscribers without a broker trade against the same mock accounts as the API
+        self.mock_broker = MockBroker(self.db, latency_ms=mock_latency_ms)
+        self.session = requests.Session()
+        self.rate_limiter = AccountRateLimiter(self.db, DHAN_ACCOUNT_LIMITS)
+        self.stats = {"claimed": 0, "processed": 0, "duplicates": 0, "batches": 0, "leaseLost": 0}
+        # Tasks claimed and not finished yet, by _id -> leaseToken; renewed by the heartbeat
+        self.held: Dict[Any, str] = {}
+        self.held_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Queue
+    # ------------------------------------------------------------------
+
+    def claim(self) -> List[Dict[str, Any]]:
+        """Lease up to batch_size tasks; returns only the tasks this worker won"""
+        now = datetime.now(timezone.utc)
+        # Expired leases first (they have waited longest), then queued tasks oldest first
+        candidates = [t["_id"] for t in self.db.execution_tasks.find(
+            {"status": "leased", "leaseUntil": {"$lt": now}}, {"_id": 1}).limit(self.batch_size)]
+        if len(candidates) < self.batch_size:
+            candidates += [t["_id"] for t in self.db.execution_tasks.find({"status": "queued"}, {"_id": 1})
+                           .sort("createdAt", 1).limit(self.batch_size - len(candidates))]
+        if not candidates:
+            return []
+
+        lease_token = uuid.uuid4().hex
+        # Re-checking claimability per document makes the claim atomic against other workers
+        self.db.execution_tasks.update_many(
+            {"_id": {"$in": candidates}, **claimable(now)},
+            {
+                "$set": {"status": "leased", "leaseToken": lease_token, "workerId": self.worker_id,
+                         "leaseUntil": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1}
+            }
+        )
+        tasks = list(self.db.execution_tasks.find({"leaseToken": lease_token}))
+        with self.held_lock:
+            self.held.update((task["_id"], lease_token) for task in tasks)
+        self.stats["claimed"] += len(tasks)
+        return tasks
+
+    def release(self, tasks: List[Dict[str, Any]]):
+        with self.held_lock:
+            for task in tasks:
+                self.held.pop(task["_id"], None)
+
+    def renew_leases(self) -> int:
+        """Extend leaseUntil of every task still held; returns how many were renewed"""
+        with self.held_lock:
+            by_token = {}
+            for task_id, lease_token in self.held.items():
+                by_token.setdefault(lease_token, []).append(task_id)
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        renewed = 0
+        for lease_token, task_ids in by_token.items():
+            renewed += self.db.execution_tasks.update_many(
+                {"_id": {"$in": task_ids}, "leaseToken": lease_token, "status": "leased"},
+                {"$set": {"leaseUntil": lease_until}}
+            ).modified_count
+        return renewed
+
+    def heartbeat(self, stop: threading.Event):
+        """Renew held leases every third of the lease until `stop` is set"""
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew_leases()
+            except Exception as error:
+                # A missed renewal is covered by the next one or by the pre-placement check
+                print(f"⚠️  Lease renewal failed: {error}")
+
+    def still_leased(self, task: Dict[str, Any]) -> bool:
+        """Re-check (and extend) this worker's lease on a task right before placing its order"""
+        result = self.db.execution_tasks.update_one(
+            {"_id": task["_id"], "leaseToken": task["leaseToken"], "status": "leased"},
+            {"$set": {"leaseUntil": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.matched_count == 1
+
+    def complete(self, tasks: List[Dict[str, Any]], executions: List[Dict[str, Any]]):
+        """Write results, release the tasks and bump the job counters"""
+        inserted_ids = {e["id"] for e in executions}
+        try:
+            self.db.order_executions.insert_many(executions, ordered=False)
+        except BulkWriteError as error:
+            duplicates = {executions[e["index"]]["id"] for e in error.details["writeErrors"]
+                          if e["code"] == DUPLICATE_KEY}
+            if len(duplicates) != len(error.details["writeErrors"]):
+                raise
+            # Already written by an earlier attempt of the same task
+            inserted_ids -= duplicates
+            self.stats["duplicates"] += len(duplicates)
+        rollups = rollup_operations(e for e in executions if e["id"] in inserted_ids)
+        if rollups:
+            self.db.execution_rollups.bulk_write(rollups, ordered=False)
+
+        now = datetime.now(timezone.utc)
+        self.db.execution_tasks.bulk_write([
+            UpdateOne({"_id": task["_id"], "leaseToken": task["leaseToken"]},
+                      {"$set": {"status": "done", "completedAt": now}, "$unset": {"leaseToken": ""}})
+            for task in tasks
+        ], ordered=False)
+
+        counters = {}
+        for execution in executions:
+            if execution["id"] not in inserted_ids:
+                continue
+            job = counters.setdefault(execution["executionId"], {"processed": 0, "successfulExecutions": 0,
+                                                                 "failedExecutions": 0})
+            job["processed"] += 1
+            job["successfulExecutions" if execution["status"] == "SUCCESS" else "failedExecutions"] += 1
+        for execution_id, increments in counters.items():
+            self.db.execution_jobs.update_one({"executionId": execution_id},
+                                              {"$inc": increments, "$set": {"updatedAt": now}})
+            self.db.execution_jobs.update_one(
+                {"executionId": execution_id, "status": "running",
+                 "$expr": {"$gte": ["$processed", "$totalSubscribers"]}},
+                {"$set": {"status": "completed", "completedAt": now}}
+            )
+        self.stats["processed"] += len(inserted_ids)
+
+    # ------------------------------------------------------------------
+    # Sizing and placement (same rules as executeForSubscriber in route.js)
+    # ------------------------------------------------------------------
+
+    def dhan_request(self, method: str, path: str, connection: Dict[str, Any], body: Dict = None) -> Dict:
+        """Dhan call under the shared per-account budget, retried like the API's DhanBroker.request"""
+        category = "data" if method == "GET" else "order"
+        deadline = time.time() + DHAN_REQUEST_DEADLINE_S
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(connection["clientId"], category, deadline)
+            retry_after = None
+            try:
+                response = self.session.request(method, f"{DHAN_BASE_URL}{path}", json=body, timeout=10,
+                                                headers={"access-token": connection["accessToken"]})
+            except requests.RequestException as error:
+                status, failure = None, RuntimeError(str(error))
+            else:
+                data = response.json() if response.content else {}
+                if response.status_code < 400:
+                    return data
+                status = response.status_code
+                failure = RuntimeError(data.get("errorMessage") or data.get("message") or f"HTTP {status}")
+                try:
+                    retry_after = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    pass
+
+            if not is_retryable(status, method):
+                raise failure
+            delay = retry_after or random.uniform(0, min(MAX_BACKOFF_S, BASE_BACKOFF_S * 2 ** attempt))
+            if time.time() + delay >= deadline:
+                raise failure
+            time.sleep(delay)
+            attempt += 1
+
+    def size(self, task: Dict[str, Any], user: Dict[str, Any], connection) -> Tuple[int, Optional[str]]:
+        order, stock = task["order"], task["stock"]
+        quantity = order["quantity"]
+        if order["transactionType"] == "BUY":
+            unit_price = stock.get("price") or order.get("price")
+            affordable = math.floor(user.get("maxCapital", 0) * BUY_CAPITAL_FRACTION / unit_price)
+            quantity = min(quantity, affordable)
+            return quantity, None if quantity > 0 else "Insufficient funds - cannot afford even 1 share"
+
+        if connection:
+            data = self.dhan_request("GET", "/holdings", connection)
+            rows = data if isinstance(data, list) else data.get("data", [])
+            holdings = {row.get("tradingSymbol"): row.get("availableQty", row.get("totalQty", 0)) for row in rows}
+        else:
+            holdings = self.mock_broker.get_holdings(task["userId"])
+        held = holdings.get(order["symbol"])
+        if held is None:
+            return 0, "Stock not available in portfolio"
+        return min(quantity, held), None
+
+    def place(self, task: Dict[str, Any], quantity: int, connection) -> Tuple[Dict[str, Any], Optional[str]]:
+        order, stock = task["order"], task["stock"]
+        price = order.get("price") or stock["price"]
+        if connection:
+            data = self.dhan_request("POST", "/orders", connection, {
+                "dhanClientId": connection["clientId"],
+                "correlationId": order_correlation_id(task["executionId"], task["userId"]),
+                "transactionType": order["transactionType"],
+                "exchangeSegment": EXCHANGE_SEGMENTS.get(stock["exchange"], "NSE_EQ"),
+                "productType": PRODUCT_TYPES.get(order.get("productType"), "CNC"),
+                "orderType": order["orderType"],
+                "validity": "DAY",
+                "securityId": stock["securityId"],
+                "quantity": str(quantity),
+                "price": str(price) if order["orderType"] == "LIMIT" else "",
+                "afterMarketOrder": False
+            })
+            accepted = data.get("orderStatus") in ("PENDING", "TRANSIT", "TRADED")
+            result = {"success": True, "orderId": data.get("orderId"), "orderStatus": data.get("orderStatus"),
+                      "broker": "Dhan", "status": "EXECUTED" if accepted else "FAILED", "details": data}
+            return result, None
+
+        result = self.mock_broker.place_order(task["userId"], f"{task['executionId']}:{task['userId']}", {
+            "transactionType": order["transactionType"], "exchangeSegment": stock["exchange"],
+            "productType": order.get("productType"), "orderType": order["orderType"],
+            "tradingSymbol": order["symbol"], "securityId": stock["securityId"], "quantity": quantity, "price": price
+        })
+        return result, result.get("reason")
+
+    def execute(self, task: Dict[str, Any], user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Size and place one task. Never raises: failures are recorded on the execution.
+
+        Returns None when the lease was lost to another worker before the order was placed.
+        """
+        order, stock = task["order"], task["stock"]
+        execution = {
+            "id": task["id"],
+            "executionId": task["executionId"],
+            "userId": task["userId"],
+            "userEmail": user.get("email") if user else None,
+            "symbol": order["symbol"],
+            "transactionType": order["transactionType"],
+            "orderType": order["orderType"],
+            "productType": order.get("productType"),
+            "requestedQuantity": order["quantity"],
+            "executedQuantity": 0,
+            "price": order.get("price") or stock["price"],
+            "status": "FAILED",
+            "errorReason": None,
+            "orderDetails": None,
+            "workerId": self.worker_id
+        }
+
+        if task["attempts"] > self.max_attempts:
+            execution["errorReason"] = f"System error: task lease expired {task['attempts'] - 1} times"
+        elif user is None:
+            execution["errorReason"] = "System error: subscriber not found"
+        else:
+            connection = dhan_connection(user)
+            try:
+                quantity, reason = self.size(task, user, connection)
+                if reason is None:
+                    if not self.still_leased(task):
+                        self.stats["leaseLost"] += 1
+                        return None
+                    result, reason = self.place(task, quantity, connection)
+                    execution["orderDetails"] = result
+                    if result["status"] == "EXECUTED" and reason is None:
+                        execution.update(status="SUCCESS", executedQuantity=quantity)
+                        if connection and result["orderStatus"] not in FINAL_ORDER_STATUSES:
+                            execution.update(reconciliation="pending", nextReconcileAt=datetime.now(timezone.utc))
+                execution["errorReason"] = reason
+            except Exception as error:
+                prefix = "Dhan API error" if connection else "System error"
+                execution["errorReason"] = f"{prefix}: {error}"
+
+        execution["timestamp"] = datetime.now(timezone.utc)
+        return execution
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    def run_batch(self, pool: ThreadPoolExecutor) -> int:
+        tasks = self.claim()
+        if not tasks:
+            return 0
+        users = {u["id"]: u for u in self.db.users.find({"id": {"$in": list({t["userId"] for t in tasks})}},
+                                                        {"_id": 0, "password": 0, "token": 0})}
+        try:
+            results = list(pool.map(lambda task: self.execute(task, users.get(task["userId"])), tasks))
+            # Tasks whose lease was lost belong to another worker now
+            owned = [(task, execution) for task, execution in zip(tasks, results) if execution is not None]
+            if owned:
+                self.complete([task for task, _ in owned], [execution for _, execution in owned])
+        finally:
+            # Leases are renewed until the results are written
+            self.release(tasks)
+        self.stats["batches"] += 1
+        return len(tasks)
+
+    def run(self, exit_when_idle: bool = False, poll_interval: float = 0.5) -> Dict[str, int]:
+        print(f"👷 Worker {self.worker_id} started (batch={self.batch_size}, concurrency={self.concurrency})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(stop,), daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                while True:
+                    if self.run_batch(pool):
+                        continue
+                    if exit_when_idle:
+                        break
+                    time.sleep(poll_interval)
+        finally:
+            stop.set()
+            heartbeat.join()
+        print(f"👷 Worker {self.worker_id} done: {self.stats}")
+        return self.stats
+
+
+def _run_worker(options: Dict[str, Any]) -> Dict[str, int]:
+    exit_when_idle = options.pop("exit_when_idle")
+    return ExecutionWorker(**options).run(exit_when_idle=exit_when_idle)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Process queued StockSync execution tasks")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to run")
+    parser.add_argument("--batch-size", type=int, default=50, help="Tasks claimed per lease")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tasks placed in parallel per process")
+    parser.add_argument("--lease-seconds", type=float, default=60,
+                        help="Lease length; renewed every third of it while a task is held")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Claims before a task is failed")
+    parser.add_argument("--mock-latency-ms", type=float,
+                        help="Mock broker round-trip for subscribers without a broker (default: $MOCK_BROKER_LATENCY_MS)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit once the queue is empty")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    options = {
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        "lease_seconds": args.lease_seconds,
+        "max_attempts": args.max_attempts,
+        "mock_latency_ms": args.mock_latency_ms,
+        "exit_when_idle": args.exit_when_idle
+    }
+    if args.processes == 1:
+        _run_worker(options)
+    else:
+        # spawn: pymongo clients are not fork-safe, each worker opens its own
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            pool.map(_run_worker, [dict(options) for _ in range(args.processes)])
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Instrument master ingestion for StockSync
+
+Streams Dhan's scrip-master CSV (local file or URL) into the `instruments`
+collection without loading it whole. Each run is an incremental diff against
+what is already stored: only new or changed rows are upserted (unordered bulk
+writes), and instruments missing from the file are marked inactive rather
+than deleted so past executions still resolve.
+
+    python ingest_instruments.py                                # download and ingest equities
+    python ingest_instruments.py --source api-scrip-master.csv  # local file
+    python ingest_instruments.py --export instruments.json      # also write the search file
+
+The exported file is the compact format read by the API's instrument search
+index (INSTRUMENTS_FILE).
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import requests
+from pymongo import UpdateOne, DESCENDING
+
+from setup_default_accounts import get_database, ensure_indexes
+
+DEFAULT_SOURCE = "https://images.dhan.co/api-data/api-scrip-master.csv"
+COMPACT_FORMAT_VERSION = 1
+COMPACT_FIELDS = ["symbol", "securityId", "name", "price", "exchange"]
+
+# Instrument document field -> scrip-master column
+COLUMNS = {
+    "exchange": "SEM_EXM_EXCH_ID",
+    "segment": "SEM_SEGMENT",
+    "securityId": "SEM_SMST_SECURITY_ID",
+    "instrument": "SEM_INSTRUMENT_NAME",
+    "symbol": "SEM_TRADING_SYMBOL",
+    "customSymbol": "SEM_CUSTOM_SYMBOL",
+    "name": "SM_SYMBOL_NAME",
+    "series": "SEM_SERIES",
+    "lotSize": "SEM_LOT_UNITS",
+    "tickSize": "SEM_TICK_SIZE",
+    "expiry": "SEM_EXPIRY_DATE",
+    "strike": "SEM_STRIKE_PRICE",
+    "optionType": "SEM_OPTION_TYPE"
+}
+NUMERIC_FIELDS = {"lotSize", "tickSize", "strike"}
+
+
+def open_source(source: str) -> Iterator[str]:
+    """Yield CSV lines from a local path or an HTTP(S) URL, streaming either way"""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, stream=True, timeout=60)
+        response.raise_for_status()
+        response.encoding = response.encoding or "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            yield line.lstrip("\ufeff")
+    else:
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            yield from f
+
+
+def parse_number(value: str) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def parse_row(row: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Map one scrip-master row to an instrument document (None if unusable)"""
+    doc = {}
+    for field, column in COLUMNS.items():
+        value = (row.get(column) or "").strip()
+        if field in NUMERIC_FIELDS:
+            value = parse_number(value)
+        doc[field] = value if value not in ("", "NA") else None
+
+    if not doc["exchange"] or not doc["securityId"] or not doc["symbol"]:
+        return None
+    doc["name"] = doc["name"] or doc["customSymbol"] or doc["symbol"]
+    return doc
+
+
+def content_hash(doc: Dict[str, Any]) -> str:
+    """Stable hash of the master fields, used to skip unchanged rows"""
+    payload = json.dumps([doc[field] for field in COLUMNS], separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def iter_instruments(source: str, instruments: Optional[List[str]] = None,
+                     exchanges: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream parsed instrument documents, filtered by instrument type and exchange"""
+    for row in csv.DictReader(open_source(source)):
+        doc = parse_row(row)
+        if doc is None:
+            continue
+        if instruments and doc["instrument"] not in instruments:
+            continue
+        if exchanges and doc["exchange"] not in exchanges:
+            continue
+        yield doc
+
+
+def load_existing(db, scope: Dict[str, Any]) -> Dict[Tuple[str, str], Tuple[str, bool]]:
+    """(exchange, securityId) -> (contentHash, active) for stored instruments in scope"""
+    existing = {}
+    cursor = db.instruments.find(scope, {"_id": 0, "exchange": 1, "securityId": 1, "contentHash": 1, "active": 1})
+    for doc in cursor.batch_size(10000):
+        existing[(doc["exchange"], doc["securityId"])] = (doc.get("contentHash"), doc.get("active", True))
+    return existing
+
+
+def ingest_instruments(source: str = DEFAULT_SOURCE, instruments: Optional[List[str]] = None,
+                       exchanges: Optional[List[str]] = None, batch_size: int = 5000,
+                       dry_run: bool = False) -> Dict[str, int]:
+    """Diff the scrip master against the `instruments` collection and apply the changes"""
+    db = get_database()
+    if not dry_run:
+        ensure_indexes(db)
+
+    # Only instruments the file is expected to contain may be deactivated
+    scope = {}
+    if instruments:
+        scope["instrument"] = {"$in": instruments}
+    if exchanges:
+        scope["exchange"] = {"$in": exchanges}
+    existing = load_existing(db, scope)
+
+    print(f"\n📥 Ingesting instruments from {source}")
+    print(f"   {len(existing)} instruments already stored in scope")
+
+    stats = {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deactivated": 0, "duplicates": 0}
+    run_at = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    seen = set()
+    ops = []
+
+    def flush():
+        if ops and not dry_run:
+            db.instruments.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for doc in iter_instruments(source, instruments, exchanges):
+        stats["read"] += 1
+        key = (doc["exchange"], doc["securityId"])
+        if key in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(key)
+
+        digest = content_hash(doc)
+        stored = existing.get(key)
+        if stored == (digest, True):
+            stats["unchanged"] += 1
+            continue
+
+        stats["inserted" if stored is None else "updated"] += 1
+        ops.append(UpdateOne(
+            {"exchange": doc["exchange"], "securityId": doc["securityId"]},
+            {
+                "$set": {**doc, "contentHash": digest, "active": True, "updatedAt": run_at},
+                "$setOnInsert": {"createdAt": run_at}
+            },
+            upsert=True
+        ))
+        if len(ops) >= batch_size:
+            flush()
+            print(f"   {stats['read']} rows read", end="\r", flush=True)
+
+    for key, (_, active) in existing.items():
+        if active and key not in seen:
+            stats["deactivated"] += 1
+            ops.append(UpdateOne(
+                {"exchange": key[0], "securityId": key[1]},
+                {"$set": {"active": False, "updatedAt": run_at}}
+            ))
+            if len(ops) >= batch_size:
+                flush()
+    flush()
+
+    elapsed = time.perf_counter() - started
+    prefix = "🔍 Dry run:" if dry_run else "✅"
+    print(f"\n{prefix} {stats['read']} rows in {elapsed:.1f}s ({stats['read'] / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(f"   Inserted: {stats['inserted']}, updated: {stats['updated']}, unchanged: {stats['unchanged']}, "
+          f"deactivated: {stats['deactivated']}, duplicate rows: {stats['duplicates']}")
+    return stats
+
+
+def export_compact(path: str, query: Optional[Dict[str, Any]] = None) -> int:
+    """Write active instruments as the compact search file used by INSTRUMENTS_FILE"""
+    db = get_database()
+    query = {"active": True, **(query or {})}
+    projection = {"_id": 0, **{field: 1 for field in COMPACT_FIELDS}}
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'{{"version": {COMPACT_FORMAT_VERSION}, "fields": {json.dumps(COMPACT_FIELDS)}, "rows": [')
+        # NSE before BSE, so a symbol listed on both resolves to its NSE listing
+        cursor = db.instruments.find(query, projection).sort("exchange", DESCENDING).batch_size(10000)
+        for doc in cursor:
+            f.write(("," if count else "") + "\n" + json.dumps([doc.get(field) for field in COMPACT_FIELDS]))
+            count += 1
+        f.write("\n]}\n")
+
+    print(f"💾 Exported {count} instruments to {path}")
+    return count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest Dhan's scrip master into the instruments collection")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Scrip-master CSV path or URL")
+    parser.add_argument("--instrument", default="EQUITY",
+                        help="Comma-separated instrument types to keep, or 'all' (default: EQUITY)")
+    parser.add_argument("--exchange", default="NSE,BSE",
+                        help="Comma-separated exchanges to keep, or 'all' (default: NSE,BSE)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Upserts per bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Report the diff without writing")
+    parser.add_argument("--export", help="Write the compact search file to this path after ingesting")
+    return parser.parse_args()
+
+
+def parse_list(value: str) -> Optional[List[str]]:
+    if value.lower() == "all":
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    ingest_instruments(args.source, instruments=parse_list(args.instrument), exchanges=parse_list(args.exchange),
+                       batch_size=args.batch_size, dry_run=args.dry_run)
+    if args.export:
+        export_compact(args.export)
@@ -1,8 +1,88 @@
+import { createHash } from 'crypto';
+import { BrokerScheduler } from './scheduler';
+
+export const DHAN_BASE_URL = process.env.DHAN_BASE_URL || 'https://api.dhan.co/v2';
+
+// One scheduler per process so every DhanBroker instance shares the per-account
+// and app-wide budgets. Defaults follow Dhan's documented per-account limits.
+export const dhanScheduler = new BrokerScheduler({
+  accountLimits: {
+    order: parseFloat(process.env.DHAN_ACCOUNT_ORDER_RPS || '25'),
+    data: parseFloat(process.env.DHAN_ACCOUNT_DATA_RPS || '20')
+  },
+  appLimits: {
+    order: parseFloat(process.env.DHAN_APP_ORDER_RPS || '0'),
+    data: parseFloat(process.env.DHAN_APP_DATA_RPS || '0')
+  },
+  deadlineMs: parseInt(process.env.DHAN_REQUEST_DEADLINE_MS || '10000', 10)
+});
+
+// 429 means the request was never processed, so it is always safe to retry.
+// Other 5xx (503 included: a gateway can answer 503 after the exchange took
+// the order) and network failures are only retried for reads; retrying an
+// order POST could double-fill.
+function isRetryable(error, method) {
+  if (error.status === 429) {
+    return true;
+  }
+  return method === 'GET' && (error.status === undefined || error.status >= 500);
+}
+
+// correlationId for one subscriber's order in an execution. Orders placed in
+// the same fan-out share a millisecond, so the id is derived from
+// "<executionId>:<userId>" (hashed to stay within Dhan's field length) and
+// stays unique per order and recomputable from the execution record.
+export function orderCorrelationId(executionId, userId) {
+  return `SS${createHash('sha1').update(`${executionId}:${userId}`).digest('hex').slice(0, 23)}`;
+}
+
 export class DhanBroker {
-  constructor(clientId, accessToken) {
-    this.baseUrl = 'https://api.dhan.co/v2';
+  // baseUrl can be pointed at an offline stand-in (see dhan_standin.py)
+  // either per instance or globally through DHAN_BASE_URL
+  constructor(clientId, accessToken, baseUrl = DHAN_BASE_URL, scheduler = dhanScheduler) {
+    this.baseUrl = baseUrl;
     this.clientId = clientId;
     this.accessToken = accessToken;
+    this.scheduler = scheduler;
+  }
+
+  // Rate-limited, retried request. Node's fetch keeps connections to the
+  // broker alive in its global pool, so calls reuse sockets across instances.
+  async request(method, path, { body, category = 'data', errorMessage }) {
+    const send = async () => {
+      const response = await fetch(`${this.baseUrl}${path}`, {
+        method,
+        headers: {
+          'Content-Type': 'application/json',
+          'access-token': this.accessToken
+        },
+        body: body ? JSON.stringify(body) : undefined
+      });
+
+      const text = await response.text();
+      let data = {};
+      try {
+        data = text ? JSON.parse(text) : {};
+      } catch (error) {
+        data = { message: text };
+      }
+
+      if (!response.ok) {
+        const error = new Error(data.message || data.errorMessage || errorMessage(response.status));
+        error.status = response.status;
+        const retryAfter = parseFloat(response.headers.get('retry-after'));
+        if (retryAfter > 0) {
+          error.retryAfterMs = retryAfter * 1000;
+        }
+        throw error;
+      }
+
+      return data;
+    };
+
+    return this.scheduler.schedule(this.clientId, category, send, {
+      isRetryable: (error) => isRetryable(error, method)
+    });
   }
 
   async placeOrder(orderParams) {
@@ -40,24 +120,16 @@ export class DhanBroker {
       boStopLossValue: ''
     };
 
-    const response = await fetch(`${this.baseUrl}/orders`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      },
-      body: JSON.stringify(requestBody)
+    const data = await this.request('POST', '/orders', {
+      body: requestBody,
+      category: 'order',
+      errorMessage: (status) => `Order placement failed: ${status}`
     });
 
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || `Order placement failed: ${response.status}`);
-    }
-
     return {
       success: true,
       orderId: data.orderId,
+      correlationId,
       orderStatus: data.orderStatus,
       broker: 'Dhan',
       timestamp: new Date().toISOString(),
@@ -66,93 +138,34 @@ export class DhanBroker {
   }
 
   async getOrderStatus(orderId) {
-    const response = await fetch(`${this.baseUrl}/orders/${orderId}`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      }
+    return this.request('GET', `/orders/${orderId}`, {
+      errorMessage: () => 'Failed to fetch order status'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to fetch order status');
-    }
-
-    return data;
   }
 
   async getHoldings() {
-    const response = await fetch(`${this.baseUrl}/holdings`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      }
+    return this.request('GET', '/holdings', {
+      errorMessage: () => 'Failed to fetch holdings'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to fetch holdings');
-    }
-
-    return data;
   }
 
   async getFunds() {
-    const response = await fetch(`${this.baseUrl}/fundlimit`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      }
+    return this.request('GET', '/fundlimit', {
+      errorMessage: () => 'Failed to fetch funds'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to fetch funds');
-    }
-
-    return data;
   }
 
   async getPositions() {
-    const response = await fetch(`${this.baseUrl}/positions`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      }
+    return this.request('GET', '/positions', {
+      errorMessage: () => 'Failed to fetch positions'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to fetch positions');
-    }
-
-    return data;
   }
 
   async cancelOrder(orderId) {
-    const response = await fetch(`${this.baseUrl}/orders/${orderId}`, {
-      method: 'DELETE',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      }
+    return this.request('DELETE', `/orders/${orderId}`, {
+      category: 'order',
+      errorMessage: () => 'Failed to cancel order'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to cancel order');
-    }
-
-    return data;
   }
 
   async modifyOrder(orderId, modifications) {
@@ -178,22 +191,11 @@ export class DhanBroker {
       validity: validity || 'DAY'
     };
 
-    const response = await fetch(`${this.baseUrl}/orders/${orderId}`, {
-      method: 'PUT',
-      headers: {
-        'Content-Type': 'application/json',
-        'access-token': this.accessToken
-      },
-      body: JSON.stringify(requestBody)
+    return this.request('PUT', `/orders/${orderId}`, {
+      body: requestBody,
+      category: 'order',
+      errorMessage: () => 'Failed to modify order'
     });
-
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.message || 'Failed to modify order');
-    }
-
-    return data;
   }
 }
 
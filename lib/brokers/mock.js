@@ -0,0 +1,235 @@
+// Stateful mock broker for subscribers without a broker connection.
+//
+// Each subscriber has an account in mock_accounts ({ userId, funds, holdings })
+// that changes as mock orders fill: BUY debits cash and adds to the position
+// at a weighted average price, SELL does the reverse. Both are conditional
+// updates, so concurrent orders can't overdraw cash or oversell a holding.
+// Holdings are an array of { symbol, quantity, avgPrice } matched by symbol,
+// never field paths built from symbols, which may contain '.' (e.g. M.M).
+//
+// Everything random is derived from a seed: the starting portfolio from
+// (seed, userId) and each order's failure and latency from (seed, order key),
+// where the key is "<executionId>:<userId>". Runs are repeatable regardless of
+// concurrency. Accounts are created on first use; mock_broker.py generates
+// the same portfolios so setup_default_accounts.py can seed them in bulk.
+//
+// Orders are idempotent by order key: the fill records the key in the
+// account's appliedOrders (the last APPLIED_ORDER_KEYS of them) in the same
+// update, and a key already there is reported as executed without being
+// applied again. A retried placement (e.g. a queue task claimed twice)
+// can't fill the account twice.
+
+const MOCK_ACCOUNTS = 'mock_accounts';
+export const APPLIED_ORDER_KEYS = 1000;
+
+// 32-bit FNV-1a, the seed for mulberry32
+function fnv1a(text) {
+  let hash = 0x811c9dc5;
+  for (let i = 0; i < text.length; i++) {
+    hash ^= text.charCodeAt(i);
+    hash = Math.imul(hash, 0x01000193);
+  }
+  return hash >>> 0;
+}
+
+export function mulberry32(seed) {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6D2B79F5) >>> 0;
+    let t = state;
+    t = Math.imul(t ^ (t >>> 15), t | 1);
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+export function seededRandom(...parts) {
+  return mulberry32(fnv1a(parts.join(':')));
+}
+
+const round2 = (value) => Math.round(value * 100) / 100;
+
+// Starting cash and holdings of one subscriber; must match mock_broker.py
+export function generatePortfolio(seed, userId, universe) {
+  const rng = seededRandom(seed, 'portfolio', userId);
+  const availablecash = 100000 + Math.floor(rng() * 500000);
+  const holdings = [];
+  for (const stock of universe) {
+    if (rng() < 0.3) {
+      holdings.push({
+        symbol: stock.symbol,
+        quantity: 1 + Math.floor(rng() * 200),
+        avgPrice: round2(stock.price * (0.8 + 0.4 * rng()))
+      });
+    }
+  }
+  return { funds: { availablecash, collateral: 0 }, holdings };
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Pipeline expression for the holdings array after buying `quantity` of
+// `symbol` for `cost`: the position is averaged in place, or appended
+function boughtHoldings(symbol, quantity, cost) {
+  const held = { $arrayElemAt: [{ $filter: { input: '$$holdings', cond: { $eq: ['$$this.symbol', { $literal: symbol }] } } }, 0] };
+  const heldQuantity = { $ifNull: ['$$held.quantity', 0] };
+  const bought = {
+    symbol: { $literal: symbol },
+    quantity: { $add: [heldQuantity, quantity] },
+    avgPrice: {
+      $round: [{
+        $divide: [
+          { $add: [{ $multiply: [heldQuantity, { $ifNull: ['$$held.avgPrice', 0] }] }, cost] },
+          { $add: [heldQuantity, quantity] }
+        ]
+      }, 2]
+    }
+  };
+  return {
+    $let: {
+      vars: { holdings: { $ifNull: ['$holdings', []] } },
+      in: {
+        $let: {
+          vars: { held },
+          in: {
+            $cond: [
+              { $eq: [{ $type: '$$held' }, 'missing'] },
+              { $concatArrays: ['$$holdings', [bought]] },
+              { $map: { input: '$$holdings', as: 'h', in: { $cond: [{ $eq: ['$$h.symbol', { $literal: symbol }] }, bought, '$$h'] } } }
+            ]
+          }
+        }
+      }
+    }
+  };
+}
+
+export class MockBroker {
+  constructor({ seed = 42, failureRate = 0.1, latencyMs = 0, jitterMs = 0, universe = [] } = {}) {
+    this.seed = seed;
+    this.failureRate = failureRate;
+    this.latencyMs = latencyMs;
+    this.jitterMs = jitterMs;
+    this.universe = universe;
+    this.prices = new Map(universe.map(stock => [stock.symbol, stock.price]));
+    this.database = null;
+    this.metrics = { accountsCreated: 0, orders: 0, filled: 0, failed: 0, rejected: 0, duplicates: 0 };
+  }
+
+  connect(database) {
+    this.database = database;
+  }
+
+  get accounts() {
+    return this.database.collection(MOCK_ACCOUNTS);
+  }
+
+  async getAccount(userId) {
+    const account = await this.accounts.findOne({ userId });
+    if (account) {
+      return account;
+    }
+    // Upsert so concurrent first uses agree on one account
+    const created = { userId, seed: this.seed, ...generatePortfolio(this.seed, userId, this.universe), createdAt: new Date() };
+    const result = await this.accounts.updateOne({ userId }, { $setOnInsert: created }, { upsert: true });
+    if (result.upsertedCount) {
+      this.metrics.accountsCreated++;
+    }
+    return this.accounts.findOne({ userId });
+  }
+
+  async getHoldings(userId) {
+    const account = await this.getAccount(userId);
+    return (account.holdings || [])
+      .filter(holding => holding.quantity > 0)
+      .map(holding => {
+        const currentPrice = this.prices.get(holding.symbol) ?? holding.avgPrice;
+        return {
+          symbol: holding.symbol,
+          quantity: holding.quantity,
+          avgPrice: holding.avgPrice,
+          currentPrice,
+          totalValue: round2(holding.quantity * currentPrice)
+        };
+      });
+  }
+
+  async getFunds(userId) {
+    const { funds } = await this.getAccount(userId);
+    return { ...funds, total: funds.availablecash + funds.collateral };
+  }
+
+  // Place and immediately fill (or fail) an order. Returns the order with
+  // status EXECUTED or FAILED and, when failed, a `reason`.
+  async placeOrder(userId, orderKey, orderData) {
+    const rng = seededRandom(this.seed, 'order', orderKey);
+    const latency = this.latencyMs + rng() * this.jitterMs;
+    if (latency > 0) {
+      await sleep(latency);
+    }
+    this.metrics.orders++;
+
+    const { transactionType, tradingSymbol, quantity, price } = orderData;
+    const order = {
+      orderId: `MOCK${fnv1a(`${this.seed}:${orderKey}`).toString(16).toUpperCase()}`,
+      orderStatus: 'TRADED',
+      ...orderData,
+      timestamp: new Date().toISOString()
+    };
+
+    if (rng() < this.failureRate) {
+      this.metrics.failed++;
+      return { ...order, orderStatus: 'REJECTED', status: 'FAILED', reason: 'Mock execution - order rejected by broker' };
+    }
+
+    await this.getAccount(userId);
+    const cost = quantity * price;
+    let result;
+    if (transactionType === 'BUY') {
+      result = await this.accounts.updateOne(
+        { userId, 'funds.availablecash': { $gte: cost }, appliedOrders: { $ne: orderKey } },
+        [{
+          $set: {
+            'funds.availablecash': { $subtract: ['$funds.availablecash', cost] },
+            holdings: boughtHoldings(tradingSymbol, quantity, cost),
+            appliedOrders: {
+              $slice: [{ $concatArrays: [{ $ifNull: ['$appliedOrders', []] }, [{ $literal: orderKey }]] }, -APPLIED_ORDER_KEYS]
+            },
+            updatedAt: '$$NOW'
+          }
+        }]
+      );
+    } else {
+      result = await this.accounts.updateOne(
+        {
+          userId,
+          holdings: { $elemMatch: { symbol: tradingSymbol, quantity: { $gte: quantity } } },
+          appliedOrders: { $ne: orderKey }
+        },
+        {
+          $inc: { 'holdings.$[held].quantity': -quantity, 'funds.availablecash': cost },
+          $push: { appliedOrders: { $each: [orderKey], $slice: -APPLIED_ORDER_KEYS } },
+          $currentDate: { updatedAt: true }
+        },
+        { arrayFilters: [{ 'held.symbol': tradingSymbol }] }
+      );
+    }
+
+    if (result.matchedCount === 0 && await this.accounts.countDocuments({ userId, appliedOrders: orderKey }, { limit: 1 })) {
+      // Already filled by an earlier placement of the same order
+      this.metrics.duplicates++;
+      return { ...order, status: 'EXECUTED', duplicate: true };
+    }
+    if (result.matchedCount === 0) {
+      this.metrics.rejected++;
+      const reason = transactionType === 'BUY' ? 'Insufficient funds in mock account' : 'Insufficient holdings in mock account';
+      return { ...order, orderStatus: 'REJECTED', status: 'FAILED', reason };
+    }
+    this.metrics.filled++;
+    return { ...order, status: 'EXECUTED' };
+  }
+
+  stats() {
+    return { ...this.metrics, seed: this.seed, failureRate: this.failureRate, latencyMs: this.latencyMs, jitterMs: this.jitterMs };
+  }
+}
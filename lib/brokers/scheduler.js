@@ -0,0 +1,150 @@
+// Rate-limit scheduler shared by every broker client in the process.
+//
+// Each request takes a token from its account's bucket and from the app-wide
+// bucket for the same API category (orders vs. data). Buckets hand out
+// reservations, so waiters are served in arrival order and a burst is spread
+// out instead of being rejected by the broker with 429s. Retryable failures
+// are retried with full-jitter exponential backoff until the deadline.
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+export class TokenBucket {
+  constructor(ratePerSec, burst = ratePerSec) {
+    this.ratePerMs = ratePerSec / 1000;
+    this.capacity = burst;
+    this.tokens = burst;
+    this.updatedAt = Date.now();
+  }
+
+  // Reserve one token and return how long the caller must wait for it
+  reserve() {
+    const now = Date.now();
+    this.tokens = Math.min(this.capacity, this.tokens + (now - this.updatedAt) * this.ratePerMs);
+    this.updatedAt = now;
+    this.tokens -= 1;
+    return this.tokens >= 0 ? 0 : -this.tokens / this.ratePerMs;
+  }
+
+  // Give back a reservation that won't be used
+  release() {
+    this.tokens = Math.min(this.capacity, this.tokens + 1);
+  }
+}
+
+export class BrokerScheduler {
+  constructor({ accountLimits, appLimits = {}, deadlineMs = 10000, baseBackoffMs = 100, maxBackoffMs = 2000 }) {
+    this.accountLimits = accountLimits;
+    this.appLimits = appLimits;
+    this.deadlineMs = deadlineMs;
+    this.baseBackoffMs = baseBackoffMs;
+    this.maxBackoffMs = maxBackoffMs;
+    this.accountBuckets = new Map();
+    this.appBuckets = new Map();
+    this.metrics = {
+      requests: 0,
+      retries: 0,
+      rateLimited: 0,
+      serverErrors: 0,
+      failures: 0,
+      deadlineExceeded: 0,
+      throttledMs: 0,
+      queueDepth: 0,
+      maxQueueDepth: 0
+    };
+  }
+
+  bucketFor(buckets, key, ratePerSec) {
+    if (!ratePerSec) {
+      return null;
+    }
+    let bucket = buckets.get(key);
+    if (!bucket) {
+      bucket = new TokenBucket(ratePerSec);
+      buckets.set(key, bucket);
+    }
+    return bucket;
+  }
+
+  // Wait for a token from both buckets. If the wait would run past `deadline`
+  // the reservations are released and a 'Rate limit wait exceeds deadline'
+  // error is thrown instead of sleeping.
+  async acquire(accountId, category, deadline = Infinity) {
+    const accountBucket = this.bucketFor(this.accountBuckets, `${accountId}:${category}`, this.accountLimits[category]);
+    const appBucket = this.bucketFor(this.appBuckets, category, this.appLimits[category]);
+    const waitMs = Math.max(accountBucket ? accountBucket.reserve() : 0, appBucket ? appBucket.reserve() : 0);
+
+    if (waitMs > 0 && Date.now() + waitMs > deadline) {
+      accountBucket?.release();
+      appBucket?.release();
+      this.metrics.deadlineExceeded++;
+      const error = new Error('Rate limit wait exceeds deadline');
+      error.deadlineExceeded = true;
+      throw error;
+    }
+
+    if (waitMs > 0) {
+      this.metrics.queueDepth++;
+      this.metrics.maxQueueDepth = Math.max(this.metrics.maxQueueDepth, this.metrics.queueDepth);
+      this.metrics.throttledMs += waitMs;
+      await sleep(waitMs);
+      this.metrics.queueDepth--;
+    }
+  }
+
+  backoffMs(attempt, retryAfterMs) {
+    if (retryAfterMs) {
+      return retryAfterMs;
+    }
+    const ceiling = Math.min(this.maxBackoffMs, this.baseBackoffMs * 2 ** attempt);
+    return Math.random() * ceiling;
+  }
+
+  // Run `fn` under the account's and app's rate limits. `isRetryable(error)`
+  // decides whether a failed attempt may be repeated.
+  async schedule(accountId, category, fn, { isRetryable = () => false, deadlineMs = this.deadlineMs } = {}) {
+    const deadline = Date.now() + deadlineMs;
+    this.metrics.requests++;
+
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await this.acquire(accountId, category, deadline);
+      } catch (error) {
+        this.metrics.failures++;
+        throw error;
+      }
+      try {
+        return await fn();
+      } catch (error) {
+        if (error.status === 429) {
+          this.metrics.rateLimited++;
+        } else if (error.status >= 500) {
+          this.metrics.serverErrors++;
+        }
+
+        if (!isRetryable(error)) {
+          this.metrics.failures++;
+          throw error;
+        }
+
+        const delay = this.backoffMs(attempt, error.retryAfterMs);
+        if (Date.now() + delay >= deadline) {
+          this.metrics.deadlineExceeded++;
+          this.metrics.failures++;
+          throw error;
+        }
+
+        this.metrics.retries++;
+        await sleep(delay);
+      }
+    }
+  }
+
+  stats() {
+    return {
+      ...this.metrics,
+      accounts: new Set([...this.accountBuckets.keys()].map(key => key.split(':')[0])).size,
+      accountLimits: this.accountLimits,
+      appLimits: this.appLimits
+    };
+  }
+}
@@ -0,0 +1,90 @@
+// Bounded in-process LRU cache with per-entry TTL.
+//
+// Map iteration order is insertion order, so re-inserting on every hit keeps
+// the least recently used entry first and eviction is O(1).
+export class LRUCache {
+  constructor({ maxSize = 10000, ttlMs = 30000, onEvict = null } = {}) {
+    this.maxSize = maxSize;
+    this.ttlMs = ttlMs;
+    this.onEvict = onEvict;
+    this.entries = new Map();
+    this.hits = 0;
+    this.misses = 0;
+    this.evictions = 0;
+    this.expirations = 0;
+    this.invalidations = 0;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt <= Date.now()) {
+      this.expirations++;
+      this.misses++;
+      this.remove(key, entry);
+      return undefined;
+    }
+
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  set(key, value, ttlMs = this.ttlMs) {
+    const existing = this.entries.get(key);
+    if (existing) {
+      this.remove(key, existing);
+    }
+
+    this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+
+    while (this.entries.size > this.maxSize) {
+      const [oldestKey, oldest] = this.entries.entries().next().value;
+      this.evictions++;
+      this.remove(oldestKey, oldest);
+    }
+  }
+
+  delete(key) {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      return false;
+    }
+    this.invalidations++;
+    this.remove(key, entry);
+    return true;
+  }
+
+  remove(key, entry) {
+    this.entries.delete(key);
+    if (this.onEvict) {
+      this.onEvict(key, entry.value);
+    }
+  }
+
+  clear() {
+    for (const [key, entry] of this.entries) {
+      this.remove(key, entry);
+    }
+  }
+
+  stats() {
+    const lookups = this.hits + this.misses;
+    return {
+      size: this.entries.size,
+      maxSize: this.maxSize,
+      ttlMs: this.ttlMs,
+      hits: this.hits,
+      misses: this.misses,
+      hitRate: lookups > 0 ? this.hits / lookups : 0,
+      evictions: this.evictions,
+      expirations: this.expirations,
+      invalidations: this.invalidations
+    };
+  }
+}
@@ -0,0 +1,77 @@
+// Helpers for fanning work out across many subscribers without unbounded
+// concurrency or one database round-trip per result.
+
+export const DEFAULT_FANOUT_CONCURRENCY = parseInt(process.env.ORDER_FANOUT_CONCURRENCY || '25', 10);
+export const DEFAULT_WRITE_BATCH_SIZE = parseInt(process.env.ORDER_WRITE_BATCH_SIZE || '500', 10);
+
+// Run fn over items with at most `limit` calls in flight. Results keep the
+// order of the input array.
+export async function mapWithConcurrency(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+
+  async function worker() {
+    while (next < items.length) {
+      const index = next++;
+      results[index] = await fn(items[index], index);
+    }
+  }
+
+  const workers = Math.max(1, Math.min(limit, items.length));
+  await Promise.all(Array.from({ length: workers }, worker));
+  return results;
+}
+
+// Buffers documents and writes them with unordered insertMany calls once
+// `batchSize` documents have accumulated. Call flush() to write the rest.
+// `onWrite(ms, count)` is called with the time of each insertMany alone;
+// `afterInsert(docs)` is awaited with the batch once it has been written,
+// and `onAfterInsert(ms, count)` gets the time that took.
+export class BatchWriter {
+  constructor(collection, batchSize = DEFAULT_WRITE_BATCH_SIZE, { onWrite = null, afterInsert = null, onAfterInsert = null } = {}) {
+    this.collection = collection;
+    this.batchSize = batchSize;
+    this.onWrite = onWrite;
+    this.afterInsert = afterInsert;
+    this.onAfterInsert = onAfterInsert;
+    this.buffer = [];
+    this.pending = [];
+  }
+
+  add(doc) {
+    this.buffer.push(doc);
+    if (this.buffer.length >= this.batchSize) {
+      const write = this.write();
+      // Errors are surfaced by flush(); avoid an unhandled rejection meanwhile
+      write.catch(() => {});
+      this.pending.push(write);
+    }
+  }
+
+  async write() {
+    const docs = this.buffer;
+    this.buffer = [];
+    if (docs.length === 0) {
+      return;
+    }
+    let started = performance.now();
+    await this.collection.insertMany(docs, { ordered: false });
+    if (this.onWrite) {
+      this.onWrite(performance.now() - started, docs.length);
+    }
+    if (this.afterInsert) {
+      started = performance.now();
+      await this.afterInsert(docs);
+      if (this.onAfterInsert) {
+        this.onAfterInsert(performance.now() - started, docs.length);
+      }
+    }
+  }
+
+  async flush() {
+    this.pending.push(this.write());
+    const pending = this.pending;
+    this.pending = [];
+    await Promise.all(pending);
+  }
+}
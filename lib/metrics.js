@@ -0,0 +1,141 @@
+// Request phase timing and process-wide latency histograms.
+//
+// A PhaseTimer collects per-request phase durations (auth, subscriber scan,
+// sizing, broker placement, DB writes, serialization) and renders them as a
+// Server-Timing header. Every recorded duration is also observed into the
+// shared registry, which renders Prometheus text exposition format.
+
+// Histogram upper bounds in seconds (Prometheus convention)
+export const DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+export class Histogram {
+  constructor(buckets = DEFAULT_BUCKETS) {
+    this.buckets = buckets;
+    this.counts = new Array(buckets.length).fill(0);
+    this.count = 0;
+    this.sum = 0;
+  }
+
+  observe(seconds) {
+    this.count++;
+    this.sum += seconds;
+    for (let i = 0; i < this.buckets.length; i++) {
+      if (seconds <= this.buckets[i]) {
+        this.counts[i]++;
+        break;
+      }
+    }
+  }
+}
+
+function formatLabels(labels) {
+  const entries = Object.entries(labels);
+  if (entries.length === 0) {
+    return '';
+  }
+  return entries.map(([key, value]) => `${key}="${String(value).replace(/["\\\n]/g, '\\$&')}"`).join(',');
+}
+
+export class MetricsRegistry {
+  constructor() {
+    this.families = new Map();
+  }
+
+  family(name, help) {
+    let family = this.families.get(name);
+    if (!family) {
+      family = { help, series: new Map() };
+      this.families.set(name, family);
+    }
+    return family;
+  }
+
+  observe(name, help, labels, seconds) {
+    const family = this.family(name, help);
+    const key = formatLabels(labels);
+    let series = family.series.get(key);
+    if (!series) {
+      series = new Histogram();
+      family.series.set(key, series);
+    }
+    series.observe(seconds);
+  }
+
+  // Prometheus text exposition format (version 0.0.4)
+  render() {
+    const lines = [];
+    for (const [name, family] of this.families) {
+      lines.push(`# HELP ${name} ${family.help}`);
+      lines.push(`# TYPE ${name} histogram`);
+      for (const [labels, histogram] of family.series) {
+        const prefix = labels ? `${labels},` : '';
+        let cumulative = 0;
+        histogram.buckets.forEach((bound, i) => {
+          cumulative += histogram.counts[i];
+          lines.push(`${name}_bucket{${prefix}le="${bound}"} ${cumulative}`);
+        });
+        lines.push(`${name}_bucket{${prefix}le="+Inf"} ${histogram.count}`);
+        lines.push(`${name}_sum${labels ? `{${labels}}` : ''} ${histogram.sum}`);
+        lines.push(`${name}_count${labels ? `{${labels}}` : ''} ${histogram.count}`);
+      }
+    }
+    return lines.join('\n') + '\n';
+  }
+}
+
+export const metrics = new MetricsRegistry();
+
+const PHASE_METRIC = 'stocksync_request_phase_seconds';
+const PHASE_HELP = 'Time spent per request phase';
+
+// Per-request phase timer. Phases recorded more than once (per-subscriber
+// sizing, broker placements) are summed in the header and reported with
+// their count; each occurrence is observed individually in the histogram.
+export class PhaseTimer {
+  constructor(route, registry = metrics) {
+    this.route = route;
+    this.registry = registry;
+    this.startedAt = performance.now();
+    this.phases = new Map();
+  }
+
+  record(phase, ms) {
+    const entry = this.phases.get(phase) || { ms: 0, count: 0 };
+    entry.ms += ms;
+    entry.count++;
+    this.phases.set(phase, entry);
+    this.registry.observe(PHASE_METRIC, PHASE_HELP, { route: this.route, phase }, ms / 1000);
+  }
+
+  async time(phase, fn) {
+    const started = performance.now();
+    try {
+      return await fn();
+    } finally {
+      this.record(phase, performance.now() - started);
+    }
+  }
+
+  timeSync(phase, fn) {
+    const started = performance.now();
+    try {
+      return fn();
+    } finally {
+      this.record(phase, performance.now() - started);
+    }
+  }
+
+  // Observe the whole request and return the Server-Timing header value,
+  // e.g. `auth;dur=0.4, broker;dur=812.3;desc="n=100", total;dur=910.2`
+  finish() {
+    const totalMs = performance.now() - this.startedAt;
+    this.registry.observe(PHASE_METRIC, PHASE_HELP, { route: this.route, phase: 'total' }, totalMs / 1000);
+
+    const parts = [];
+    for (const [phase, { ms, count }] of this.phases) {
+      parts.push(`${phase};dur=${ms.toFixed(1)}${count > 1 ? `;desc="n=${count}"` : ''}`);
+    }
+    parts.push(`total;dur=${totalMs.toFixed(1)}`);
+    return parts.join(', ');
+  }
+}
@@ -0,0 +1,103 @@
+// Keyset pagination and NDJSON streaming for timestamp-ordered collections.
+//
+// Pages are ordered by (timestamp desc, id desc); the cursor is the sort key
+// of the last document on the previous page, so every page is an index range
+// scan no matter how deep it is.
+
+export const MAX_PAGE_SIZE = 1000;
+export const KEYSET_SORT = { timestamp: -1, id: -1 };
+
+export function encodeCursor(doc) {
+  const key = { t: new Date(doc.timestamp).toISOString(), id: doc.id };
+  return Buffer.from(JSON.stringify(key)).toString('base64url');
+}
+
+export function decodeCursor(cursor) {
+  try {
+    const { t, id } = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    const timestamp = new Date(t);
+    if (Number.isNaN(timestamp.getTime()) || typeof id !== 'string') {
+      return null;
+    }
+    return { timestamp, id };
+  } catch (error) {
+    return null;
+  }
+}
+
+// Restrict `filter` to documents that sort after the cursor position
+export function keysetFilter(filter, cursorKey) {
+  if (!cursorKey) {
+    return filter;
+  }
+  return {
+    ...filter,
+    $or: [
+      { timestamp: { $lt: cursorKey.timestamp } },
+      { timestamp: cursorKey.timestamp, id: { $lt: cursorKey.id } }
+    ]
+  };
+}
+
+export function parsePageSize(value, defaultSize) {
+  const size = parseInt(value, 10);
+  if (!size || size < 1) {
+    return defaultSize;
+  }
+  return Math.min(size, MAX_PAGE_SIZE);
+}
+
+// Fetch one page; asks for one extra document to know whether more exist
+export async function fetchPage(collection, filter, cursorKey, pageSize) {
+  const docs = await collection
+    .find(keysetFilter(filter, cursorKey))
+    .sort(KEYSET_SORT)
+    .limit(pageSize + 1)
+    .toArray();
+
+  const hasMore = docs.length > pageSize;
+  const page = hasMore ? docs.slice(0, pageSize) : docs;
+  return {
+    docs: page,
+    nextCursor: hasMore ? encodeCursor(page[page.length - 1]) : null
+  };
+}
+
+// Stream a Mongo cursor as newline-delimited JSON. Documents are written as
+// the driver yields them (whatever is already buffered goes out as one
+// chunk), so memory stays bounded by the driver's batch size.
+export function ndjsonStream(cursor) {
+  const encoder = new TextEncoder();
+
+  return new ReadableStream({
+    async pull(controller) {
+      try {
+        const doc = await cursor.next();
+        if (!doc) {
+          await cursor.close();
+          controller.close();
+          return;
+        }
+
+        let chunk = JSON.stringify(doc) + '\n';
+        let buffered = cursor.bufferedCount();
+        while (buffered-- > 0) {
+          chunk += JSON.stringify(await cursor.next()) + '\n';
+        }
+        controller.enqueue(encoder.encode(chunk));
+      } catch (error) {
+        await cursor.close();
+        controller.error(error);
+      }
+    },
+    async cancel() {
+      await cursor.close();
+    }
+  });
+}
+
+export function ndjsonResponse(cursor) {
+  return new Response(ndjsonStream(cursor), {
+    headers: { 'Content-Type': 'application/x-ndjson' }
+  });
+}
@@ -0,0 +1,283 @@
+import { randomUUID } from 'crypto';
+import { DhanBroker } from './brokers/dhan';
+import { TokenBucket } from './brokers/scheduler';
+import { mapWithConcurrency } from './fanout';
+import { metrics as metricsRegistry } from './metrics';
+import { applyRollups } from './rollups';
+
+// Background order-status reconciliation.
+//
+// execute-order records a Dhan order as soon as the broker accepts it, before
+// it is traded. Those executions are stored with reconciliation: 'pending';
+// this worker polls getOrderStatus for the ones that are due, in batches,
+// under its own request budget on top of the shared per-account scheduler,
+// and writes the broker's fill state back with one bulkWrite per batch.
+// Orders that are still open are re-polled with exponential backoff. When a
+// final status changes an execution's outcome, its rollups are corrected.
+//
+// Every API instance runs this worker, so due executions are claimed before
+// they are polled: one conditional updateMany moves their nextReconcileAt to
+// the end of a lease and stamps the batch's reconcileToken. Each execution is
+// polled by the one instance that won it; if that instance dies, the
+// execution becomes due again when the lease ends and is claimed anew.
+
+export const FINAL_ORDER_STATUSES = new Set(['TRADED', 'REJECTED', 'CANCELLED', 'EXPIRED']);
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+export class OrderReconciler {
+  constructor({
+    intervalMs = 5000,
+    batchSize = 200,
+    concurrency = 10,
+    ratePerSec = 20,
+    maxAttempts = 40,
+    baseBackoffMs = 2000,
+    maxBackoffMs = 300000,
+    leaseMs = 60000
+  } = {}) {
+    this.intervalMs = intervalMs;
+    this.batchSize = batchSize;
+    this.concurrency = concurrency;
+    this.bucket = ratePerSec > 0 ? new TokenBucket(ratePerSec) : null;
+    this.maxAttempts = maxAttempts;
+    this.baseBackoffMs = baseBackoffMs;
+    this.maxBackoffMs = maxBackoffMs;
+    this.leaseMs = leaseMs;
+    this.timer = null;
+    this.running = false;
+    this.metrics = {
+      ticks: 0,
+      polled: 0,
+      finalized: 0,
+      corrected: 0,
+      stillOpen: 0,
+      pollErrors: 0,
+      abandoned: 0,
+      claimConflicts: 0,
+      lastTickAt: null,
+      lastTickMs: 0,
+      lagMs: 0,
+      backlog: 0
+    };
+  }
+
+  start(database) {
+    if (this.timer || !this.intervalMs) {
+      return;
+    }
+    this.database = database;
+    this.timer = setInterval(() => {
+      this.tick().catch((error) => console.error('Order reconciliation failed:', error));
+    }, this.intervalMs);
+    // Don't keep the process alive just for reconciliation
+    this.timer.unref?.();
+  }
+
+  stop() {
+    clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  backoffMs(attempts) {
+    return Math.min(this.maxBackoffMs, this.baseBackoffMs * 2 ** attempts);
+  }
+
+  // Reconcile batches until nothing is due (or a tick's worth of time passed)
+  async tick() {
+    if (this.running) {
+      return;
+    }
+    this.running = true;
+    const started = Date.now();
+    try {
+      const executions = this.database.collection('order_executions');
+      let processed;
+      do {
+        processed = await this.reconcileBatch(executions);
+      } while (processed === this.batchSize && Date.now() - started < this.intervalMs);
+
+      // Lag: how long the oldest due execution has been waiting past its check time
+      const now = new Date();
+      const [oldest] = await executions.find({ reconciliation: 'pending', nextReconcileAt: { $lte: now } })
+        .sort({ nextReconcileAt: 1 }).limit(1).project({ nextReconcileAt: 1 }).toArray();
+      this.metrics.lagMs = oldest ? now - oldest.nextReconcileAt : 0;
+      this.metrics.backlog = await executions.countDocuments({ reconciliation: 'pending', nextReconcileAt: { $lte: now } });
+    } finally {
+      this.metrics.ticks++;
+      this.metrics.lastTickAt = new Date();
+      this.metrics.lastTickMs = Date.now() - started;
+      this.running = false;
+    }
+  }
+
+  // Claim up to batchSize due executions (expired leases included, they are
+  // due again) for this instance: the ones it won, and how many were due
+  async claimBatch(executions) {
+    const now = new Date();
+    const candidates = await executions.find({ reconciliation: 'pending', nextReconcileAt: { $lte: now } })
+      .sort({ nextReconcileAt: 1 })
+      .limit(this.batchSize)
+      .project({ id: 1 })
+      .toArray();
+    if (candidates.length === 0) {
+      return { found: 0, claimed: [] };
+    }
+
+    // Re-checking the due condition per document makes the claim atomic against other instances
+    const token = randomUUID();
+    const result = await executions.updateMany(
+      { id: { $in: candidates.map(e => e.id) }, reconciliation: 'pending', nextReconcileAt: { $lte: now } },
+      { $set: { nextReconcileAt: new Date(now.getTime() + this.leaseMs), reconcileToken: token } }
+    );
+    this.metrics.claimConflicts += candidates.length - result.modifiedCount;
+    const claimed = result.modifiedCount === 0 ? [] : await executions.find({ reconcileToken: token })
+      .project({
+        id: 1, executionId: 1, userId: 1, symbol: 1, price: 1, status: 1, timestamp: 1, reconcileToken: 1,
+        requestedQuantity: 1, executedQuantity: 1, reconcileAttempts: 1, 'orderDetails.orderId': 1
+      })
+      .toArray();
+    return { found: candidates.length, claimed };
+  }
+
+  async reconcileBatch(executions) {
+    const { found, claimed: due } = await this.claimBatch(executions);
+    if (due.length === 0) {
+      return found;
+    }
+
+    const users = await this.database.collection('users')
+      .find({ id: { $in: [...new Set(due.map(e => e.userId))] } })
+      .project({ id: 1, brokerConnections: 1 })
+      .toArray();
+    const connections = new Map(users.map(u => [
+      u.id,
+      u.brokerConnections?.find(bc => bc.brokerName === 'Dhan' && bc.status === 'connected' && bc.accessToken)
+    ]));
+
+    const operations = await mapWithConcurrency(due, this.concurrency, async (execution) => {
+      const connection = connections.get(execution.userId);
+      const attempts = (execution.reconcileAttempts || 0) + 1;
+      if (!connection) {
+        this.metrics.abandoned++;
+        return this.update(execution, { reconciliation: 'abandoned', reconcileError: 'Broker not connected' });
+      }
+
+      if (this.bucket) {
+        const waitMs = this.bucket.reserve();
+        if (waitMs > 0) {
+          await sleep(waitMs);
+        }
+      }
+
+      let order;
+      try {
+        const broker = new DhanBroker(connection.clientId, connection.accessToken);
+        const data = await broker.getOrderStatus(execution.orderDetails.orderId);
+        order = Array.isArray(data) ? data[0] : data;
+        this.metrics.polled++;
+      } catch (error) {
+        this.metrics.pollErrors++;
+        return this.retryLater(execution, attempts, { reconcileError: error.message });
+      }
+
+      return this.applyOrderStatus(execution, order, attempts);
+    });
+
+    // An execution whose outcome changed moves out of its old rollup counts and
+    // into the new ones. Those writes go one by one so the rollups are only
+    // corrected for executions whose write-back actually landed; everything
+    // else goes out in one bulkWrite.
+    const corrections = [];
+    const writes = [];
+    due.forEach((execution, index) => {
+      const fields = operations[index].updateOne.update.$set;
+      if ('status' in fields && (fields.status !== execution.status || fields.executedQuantity !== execution.executedQuantity)) {
+        corrections.push([execution, operations[index]]);
+      } else {
+        writes.push(operations[index]);
+      }
+    });
+
+    const [, corrected] = await Promise.all([
+      writes.length > 0 ? executions.bulkWrite(writes, { ordered: false }) : null,
+      Promise.all(corrections.map(([, { updateOne }]) => executions.updateOne(updateOne.filter, updateOne.update)))
+    ]);
+    const rollupChanges = [];
+    corrections.forEach(([execution, { updateOne }], index) => {
+      if (corrected[index].modifiedCount === 1) {
+        rollupChanges.push([execution, -1], [{ ...execution, ...updateOne.update.$set }, 1]);
+      }
+    });
+    if (rollupChanges.length > 0) {
+      await applyRollups(this.database, rollupChanges);
+    }
+    return found;
+  }
+
+  applyOrderStatus(execution, order, attempts) {
+    const brokerStatus = order?.orderStatus;
+    const filledQty = parseInt(order?.filledQty, 10) || 0;
+    const fields = {
+      brokerOrderStatus: brokerStatus,
+      filledQuantity: filledQty,
+      averageTradedPrice: parseFloat(order?.averageTradedPrice) || null,
+      reconcileError: null
+    };
+
+    if (!FINAL_ORDER_STATUSES.has(brokerStatus)) {
+      // Still open (TRANSIT, PENDING, PART_TRADED): record progress, check again later
+      this.metrics.stillOpen++;
+      return this.retryLater(execution, attempts, fields);
+    }
+
+    this.metrics.finalized++;
+    metricsRegistry.observe('stocksync_order_fill_seconds', 'Time from order placement to a final broker status',
+      { status: brokerStatus }, (Date.now() - new Date(execution.timestamp)) / 1000);
+
+    // A cancelled or expired order may still have filled partially
+    fields.reconciliation = 'done';
+    fields.executedQuantity = filledQty;
+    fields.status = filledQty > 0 ? 'SUCCESS' : 'FAILED';
+    if (brokerStatus !== 'TRADED') {
+      fields.errorReason = `Broker ${brokerStatus.toLowerCase()}: ${order.omsErrorDescription || 'no reason given'}`;
+    }
+    if (fields.status !== 'SUCCESS' || filledQty !== execution.executedQuantity) {
+      this.metrics.corrected++;
+    }
+    return this.update(execution, fields);
+  }
+
+  retryLater(execution, attempts, fields) {
+    if (attempts >= this.maxAttempts) {
+      this.metrics.abandoned++;
+      return this.update(execution, { ...fields, reconciliation: 'abandoned', reconcileAttempts: attempts });
+    }
+    return this.update(execution, {
+      ...fields,
+      reconcileAttempts: attempts,
+      nextReconcileAt: new Date(Date.now() + this.backoffMs(attempts))
+    });
+  }
+
+  // Write an outcome back, only while this instance still holds the claim
+  update(execution, fields) {
+    return {
+      updateOne: {
+        filter: { id: execution.id, reconciliation: 'pending', reconcileToken: execution.reconcileToken },
+        update: { $set: { ...fields, reconciledAt: new Date() }, $unset: { reconcileToken: '' } }
+      }
+    };
+  }
+
+  stats() {
+    return {
+      ...this.metrics,
+      intervalMs: this.intervalMs,
+      batchSize: this.batchSize,
+      concurrency: this.concurrency,
+      leaseMs: this.leaseMs,
+      running: this.running
+    };
+  }
+}
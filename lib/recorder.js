@@ -0,0 +1,26 @@
+import { createWriteStream } from 'fs';
+
+// Append-only API traffic log for replay_traffic.py.
+//
+// One JSON array per line, in completion order:
+//   [startedAtEpochMs, durationMs, method, pathWithQuery, status, actor, body]
+// actor is "<role>:<userId>" for authenticated calls and null otherwise;
+// body is only kept for routes whose body is needed to replay them and
+// never contains credentials.
+export class TrafficRecorder {
+  constructor(path) {
+    this.path = path;
+    this.stream = createWriteStream(path, { flags: 'a' });
+    this.recorded = 0;
+    this.stream.on('error', (error) => console.error('Traffic log write failed:', error));
+  }
+
+  record({ startedAt, durationMs, method, path, status, actor = null, body = null }) {
+    this.recorded++;
+    this.stream.write(JSON.stringify([startedAt, Math.round(durationMs * 10) / 10, method, path, status, actor, body]) + '\n');
+  }
+
+  stats() {
+    return { path: this.path, recorded: this.recorded, bufferedBytes: this.stream.writableLength };
+  }
+}
@@ -0,0 +1,98 @@
+// Pre-aggregated execution counters in execution_rollups.
+//
+// One document per executionId, per user per UTC day and per symbol per UTC
+// day, updated with $inc upserts as execution records are written (and
+// corrected when the reconciler changes an execution's outcome). Dashboards
+// read a handful of rollup documents instead of scanning order_executions.
+// rollup_executions.py rebuilds and verifies them from the raw history and
+// must compute the same keys and counters.
+
+export const ROLLUP_COLLECTION = 'execution_rollups';
+export const ROLLUP_SCOPES = ['execution', 'user', 'symbol'];
+
+export function rollupDay(timestamp) {
+  return new Date(timestamp).toISOString().slice(0, 10);
+}
+
+// [_id, dimensions] of every rollup an execution counts towards
+function rollupTargets(execution) {
+  const day = rollupDay(execution.timestamp);
+  return [
+    [`execution:${execution.executionId}`, { scope: 'execution', executionId: execution.executionId, symbol: execution.symbol }],
+    [`user:${execution.userId}:${day}`, { scope: 'user', userId: execution.userId, day }],
+    [`symbol:${execution.symbol}:${day}`, { scope: 'symbol', symbol: execution.symbol, day }]
+  ];
+}
+
+// Only successful executions count as filled: a FAILED record's
+// executedQuantity is not a fill and must not raise fillRate
+function rollupCounters(execution, sign) {
+  const success = execution.status === 'SUCCESS';
+  const executedQuantity = success ? execution.executedQuantity || 0 : 0;
+  return {
+    executions: sign,
+    successful: success ? sign : 0,
+    failed: success ? 0 : sign,
+    requestedQuantity: sign * (execution.requestedQuantity || 0),
+    executedQuantity: sign * executedQuantity,
+    notional: sign * executedQuantity * (execution.price || 0)
+  };
+}
+
+// Merge [execution, sign] pairs into one $inc upsert per rollup document
+export function rollupOperations(changes) {
+  const merged = new Map();
+  for (const [execution, sign] of changes) {
+    const counters = rollupCounters(execution, sign);
+    for (const [id, dimensions] of rollupTargets(execution)) {
+      let entry = merged.get(id);
+      if (!entry) {
+        entry = { dimensions, inc: {} };
+        merged.set(id, entry);
+      }
+      for (const [field, value] of Object.entries(counters)) {
+        entry.inc[field] = (entry.inc[field] || 0) + value;
+      }
+    }
+  }
+
+  const now = new Date();
+  const operations = [];
+  for (const [id, { dimensions, inc }] of merged) {
+    // A correction can cancel out entirely (e.g. an unchanged status)
+    if (Object.values(inc).every(value => value === 0)) {
+      continue;
+    }
+    operations.push({
+      updateOne: {
+        filter: { _id: id },
+        update: { $inc: inc, $setOnInsert: dimensions, $set: { updatedAt: now } },
+        upsert: true
+      }
+    });
+  }
+  return operations;
+}
+
+export async function applyRollups(database, changes) {
+  const operations = rollupOperations(changes);
+  if (operations.length > 0) {
+    await database.collection(ROLLUP_COLLECTION).bulkWrite(operations, { ordered: false });
+  }
+  return operations.length;
+}
+
+// Newly written execution records
+export function recordExecutionRollups(database, executions) {
+  return applyRollups(database, executions.map(execution => [execution, 1]));
+}
+
+// Success rates are derived on read so the counters stay additive
+export function withRates(rollup) {
+  const { _id, ...fields } = rollup;
+  return {
+    ...fields,
+    successRate: rollup.executions > 0 ? rollup.successful / rollup.executions : null,
+    fillRate: rollup.requestedQuantity > 0 ? rollup.executedQuantity / rollup.requestedQuantity : null
+  };
+}
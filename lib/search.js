@@ -0,0 +1,448 @@
+import { readFileSync } from 'fs';
+
+// Prebuilt in-memory search index over the instrument master.
+//
+// - symbol prefix: binary search over sorted lowercase symbols
+// - name token prefix: binary search over sorted lowercase name tokens
+// - fuzzy: symbol (and, for words of a multi-word query, name token) trigram
+//   candidates ranked by bounded edit distance
+//
+// Results are ranked exact symbol > symbol prefix > name token prefix > fuzzy,
+// then by symbol length and alphabetically. Every word of a multi-word query
+// must match (a name token or symbol prefix, or fuzzily when the word has no
+// prefix match at all). A symbol listed on several exchanges appears once, as
+// the listing getBySymbol returns.
+
+const COMPACT_FORMAT_VERSION = 1;
+const COMPACT_FIELDS = ['symbol', 'securityId', 'name', 'price', 'exchange'];
+const FUZZY_CANDIDATES = 64;
+
+const RANK_EXACT = 0;
+const RANK_SYMBOL_PREFIX = 1;
+const RANK_NAME_PREFIX = 2;
+const RANK_FUZZY = 3;
+
+function lowerBound(keys, target) {
+  let lo = 0;
+  let hi = keys.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >>> 1;
+    if (keys[mid] < target) {
+      lo = mid + 1;
+    } else {
+      hi = mid;
+    }
+  }
+  return lo;
+}
+
+// Lowercase name tokens split on anything but [a-z0-9&], without duplicates
+function nameTokens(name) {
+  const tokens = new Set();
+  let start = -1;
+  for (let i = 0; i <= name.length; i++) {
+    const c = i < name.length ? name.charCodeAt(i) : 32;
+    const word = (c >= 97 && c <= 122) || (c >= 48 && c <= 57) || c === 38;
+    if (word && start < 0) {
+      start = i;
+    } else if (!word && start >= 0) {
+      tokens.add(name.slice(start, i));
+      start = -1;
+    }
+  }
+  return tokens;
+}
+
+// Postings of every term starting with prefix, as postings[from..to); terms
+// are sorted, so they are contiguous
+function prefixRange(index, prefix) {
+  const { terms, starts, postings } = index;
+  const from = starts[lowerBound(terms, prefix)];
+  const to = starts[lowerBound(terms, `${prefix}\uffff`)];
+  return { postings, from, to, size: to - from };
+}
+
+function trigrams(text) {
+  const padded = `  ${text} `;
+  const grams = new Set();
+  for (let i = 0; i + 3 <= padded.length; i++) {
+    grams.add(padded.slice(i, i + 3));
+  }
+  return grams;
+}
+
+// Inverted index from term to instrument ids, stored as one flat postings
+// array (CSR layout): the ids for term t are postings[starts[t]..starts[t + 1]).
+// With `sorted`, term numbers follow lexicographic order so every prefix is a
+// contiguous range of `terms`.
+function buildPostings(count, termsFor, sorted) {
+  const termIds = new Map();
+  const pairTerm = [];
+  const pairId = [];
+
+  for (let id = 0; id < count; id++) {
+    for (const term of termsFor(id)) {
+      let t = termIds.get(term);
+      if (t === undefined) {
+        t = termIds.size;
+        termIds.set(term, t);
+      }
+      pairTerm.push(t);
+      pairId.push(id);
+    }
+  }
+
+  let terms = [...termIds.keys()];
+  if (sorted) {
+    terms.sort();
+    const rank = new Int32Array(terms.length);
+    terms.forEach((term, i) => {
+      rank[termIds.get(term)] = i;
+      termIds.set(term, i);
+    });
+    for (let i = 0; i < pairTerm.length; i++) {
+      pairTerm[i] = rank[pairTerm[i]];
+    }
+  }
+
+  const starts = new Int32Array(terms.length + 1);
+  for (const t of pairTerm) {
+    starts[t + 1]++;
+  }
+  for (let t = 0; t < terms.length; t++) {
+    starts[t + 1] += starts[t];
+  }
+
+  const fill = starts.slice(0, -1);
+  const postings = new Int32Array(pairTerm.length);
+  for (let i = 0; i < pairTerm.length; i++) {
+    postings[fill[pairTerm[i]]++] = pairId[i];
+  }
+  return { terms, termIds, starts, postings };
+}
+
+// Edit distance counting a swap of adjacent letters as one edit (optimal
+// string alignment), abandoning early once every cell exceeds maxDistance
+function boundedEditDistance(a, b, maxDistance) {
+  if (Math.abs(a.length - b.length) > maxDistance) {
+    return maxDistance + 1;
+  }
+  let beforePrevious = null;
+  let previous = Array.from({ length: b.length + 1 }, (_, i) => i);
+  for (let i = 1; i <= a.length; i++) {
+    const current = [i];
+    let rowMin = i;
+    for (let j = 1; j <= b.length; j++) {
+      const cost = a[i - 1] === b[j - 1] ? 0 : 1;
+      current[j] = Math.min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost);
+      if (i > 1 && j > 1 && a[i - 1] === b[j - 2] && a[i - 2] === b[j - 1]) {
+        current[j] = Math.min(current[j], beforePrevious[j - 2] + 1);
+      }
+      rowMin = Math.min(rowMin, current[j]);
+    }
+    if (rowMin > maxDistance) {
+      return maxDistance + 1;
+    }
+    beforePrevious = previous;
+    previous = current;
+  }
+  return previous[b.length];
+}
+
+export class InstrumentSearchIndex {
+  constructor(instruments) {
+    this.instruments = instruments;
+    this.bySymbol = new Map();
+    this.fuzzyCounts = new Uint16Array(instruments.length);
+    // 1 for the listing getBySymbol returns; other listings of the symbol are skipped
+    this.primary = new Uint8Array(instruments.length);
+
+    const symbolKeys = instruments.map(instrument => instrument.symbol.toLowerCase());
+    this.symbolKeys = symbolKeys;
+    instruments.forEach((instrument, id) => {
+      if (!this.bySymbol.has(instrument.symbol)) {
+        this.bySymbol.set(instrument.symbol, instrument);
+        this.primary[id] = 1;
+      }
+    });
+
+    this.symbols = buildPostings(instruments.length, id => [symbolKeys[id]], true);
+    this.tokens = buildPostings(instruments.length, id => nameTokens((instruments[id].name || '').toLowerCase()), true);
+    this.trigrams = buildPostings(instruments.length, id => trigrams(symbolKeys[id]), false);
+    // Trigrams of the name token terms, for fuzzy matching misspelled words
+    this.termTrigrams = buildPostings(this.tokens.terms.length, t => trigrams(this.tokens.terms[t]), false);
+    this.termCounts = new Uint16Array(this.tokens.terms.length);
+  }
+
+  static fromCompact(compact) {
+    if (compact.version !== COMPACT_FORMAT_VERSION) {
+      throw new Error(`Unsupported instrument index version: ${compact.version}`);
+    }
+    const fields = compact.fields || COMPACT_FIELDS;
+    const instruments = compact.rows.map(row => Object.fromEntries(fields.map((field, i) => [field, row[i]])));
+    return new InstrumentSearchIndex(instruments);
+  }
+
+  static fromFile(path) {
+    return InstrumentSearchIndex.fromCompact(JSON.parse(readFileSync(path, 'utf8')));
+  }
+
+  toCompact() {
+    return {
+      version: COMPACT_FORMAT_VERSION,
+      fields: COMPACT_FIELDS,
+      rows: this.instruments.map(instrument => COMPACT_FIELDS.map(field => instrument[field]))
+    };
+  }
+
+  get size() {
+    return this.instruments.length;
+  }
+
+  getBySymbol(symbol) {
+    return this.bySymbol.get(symbol) || null;
+  }
+
+  // Collect ids of terms starting with prefix, stopping after `max`
+  prefixScan(index, prefix, rank, hits, max) {
+    const { terms, starts, postings } = index;
+    for (let t = lowerBound(terms, prefix); t < terms.length && hits.size < max; t++) {
+      if (!terms[t].startsWith(prefix)) {
+        break;
+      }
+      const hitRank = rank === RANK_SYMBOL_PREFIX && terms[t] === prefix ? RANK_EXACT : rank;
+      for (let i = starts[t]; i < starts[t + 1] && hits.size < max; i++) {
+        if (!this.primary[postings[i]]) {
+          continue;
+        }
+        const existing = hits.get(postings[i]);
+        if (existing === undefined || hitRank < existing) {
+          hits.set(postings[i], hitRank);
+        }
+      }
+    }
+  }
+
+  // Keys of a trigram index sharing at least minShared trigrams with `grams`,
+  // most shared first. `counts` is scratch space sized to the keys.
+  trigramCandidates(index, counts, grams, minShared) {
+    const touched = [];
+    const { termIds, starts, postings } = index;
+    for (const gram of grams) {
+      const g = termIds.get(gram);
+      if (g === undefined) {
+        continue;
+      }
+      for (let i = starts[g]; i < starts[g + 1]; i++) {
+        const id = postings[i];
+        if (counts[id]++ === 0) {
+          touched.push(id);
+        }
+      }
+    }
+
+    const candidates = [];
+    for (const id of touched) {
+      if (counts[id] >= minShared) {
+        candidates.push(id);
+      }
+    }
+    candidates.sort((a, b) => counts[b] - counts[a]);
+    for (const id of touched) {
+      counts[id] = 0;
+    }
+    return candidates;
+  }
+
+  fuzzyScan(query, hits, max) {
+    const grams = trigrams(query);
+    const maxDistance = Math.max(1, Math.floor(query.length / 4));
+    // Each edit destroys at most 4 trigrams (a swap touches two letters), so
+    // closer symbols share at least this many
+    const minShared = Math.max(1, grams.size - 4 * maxDistance);
+
+    const candidates = this.trigramCandidates(this.trigrams, this.fuzzyCounts, grams, minShared)
+      .filter(id => this.primary[id]);
+    for (const id of candidates.slice(0, FUZZY_CANDIDATES)) {
+      if (hits.size >= max) {
+        break;
+      }
+      if (hits.has(id)) {
+        continue;
+      }
+      const distance = boundedEditDistance(query, this.instruments[id].symbol.toLowerCase(), maxDistance);
+      if (distance <= maxDistance) {
+        hits.set(id, RANK_FUZZY + distance);
+      }
+    }
+  }
+
+  // Symbols and name token terms within edit distance of word:
+  // { symbols: id -> rank, terms: term number -> rank }, rank RANK_FUZZY + distance
+  fuzzyWordMatches(word) {
+    const symbols = new Map();
+    this.fuzzyScan(word, symbols, FUZZY_CANDIDATES);
+
+    const grams = trigrams(word);
+    const maxDistance = Math.max(1, Math.floor(word.length / 4));
+    const minShared = Math.max(1, grams.size - 4 * maxDistance);
+    const terms = new Map();
+    const candidates = this.trigramCandidates(this.termTrigrams, this.termCounts, grams, minShared);
+    for (const t of candidates.slice(0, FUZZY_CANDIDATES)) {
+      const distance = boundedEditDistance(word, this.tokens.terms[t], maxDistance);
+      if (distance <= maxDistance) {
+        terms.set(t, RANK_FUZZY + distance);
+      }
+    }
+    return { symbols, terms, size: symbols.size + [...terms.keys()].reduce((sum, t) => sum + this.termSize(t), 0) };
+  }
+
+  // Single-word typo fallback: instruments whose symbol or a name token is
+  // within edit distance of word, closest first
+  fuzzyWord(word, hits, max) {
+    const { symbols, terms } = this.fuzzyWordMatches(word);
+    const matches = [...symbols].map(([id, rank]) => ({ rank, postings: [id], from: 0, to: 1 }));
+    for (const [t, rank] of terms) {
+      matches.push({ rank, postings: this.tokens.postings, from: this.tokens.starts[t], to: this.tokens.starts[t + 1] });
+    }
+    matches.sort((a, b) => a.rank - b.rank);
+
+    for (const { rank, postings, from, to } of matches) {
+      for (let i = from; i < to && hits.size < max; i++) {
+        const id = postings[i];
+        if (this.primary[id] && !hits.has(id)) {
+          hits.set(id, rank);
+        }
+      }
+    }
+  }
+
+  termSize(t) {
+    return this.tokens.starts[t + 1] - this.tokens.starts[t];
+  }
+
+  // Best fuzzy rank of instrument `id` for one word's matches, or undefined
+  fuzzyRank(id, { symbols, terms }) {
+    let rank = symbols.get(id);
+    for (const token of nameTokens((this.instruments[id].name || '').toLowerCase())) {
+      const termRank = terms.get(this.tokens.termIds.get(token));
+      if (termRank !== undefined && (rank === undefined || termRank < rank)) {
+        rank = termRank;
+      }
+    }
+    return rank;
+  }
+
+  // Whether instrument `id` has a symbol or name token starting with word
+  matchesWord(id, word) {
+    if (this.symbolKeys[id].startsWith(word)) {
+      return true;
+    }
+    for (const token of nameTokens((this.instruments[id].name || '').toLowerCase())) {
+      if (token.startsWith(word)) {
+        return true;
+      }
+    }
+    return false;
+  }
+
+  // Multi-word query: instruments matching every word. Words with prefix
+  // matches are checked by prefix; a word without any (a typo) falls back to
+  // fuzzy symbol and name token matching. Candidates come from the smallest
+  // posting range and are checked against the other words.
+  searchWords(words, hits, max) {
+    const prefixWords = [];
+    const fuzzyWords = [];
+    for (const word of words) {
+      const ranges = [prefixRange(this.symbols, word), prefixRange(this.tokens, word)];
+      const size = ranges[0].size + ranges[1].size;
+      if (size > 0) {
+        prefixWords.push({ word, ranges, size });
+      } else if (word.length >= 3) {
+        fuzzyWords.push(this.fuzzyWordMatches(word));
+      } else {
+        return;
+      }
+    }
+
+    // Rank: name prefix, or fuzzy plus the largest edit distance of a fuzzy word
+    const rankOf = (id) => {
+      let rank = RANK_NAME_PREFIX;
+      for (const matches of fuzzyWords) {
+        const fuzzyRank = this.fuzzyRank(id, matches);
+        if (fuzzyRank === undefined) {
+          return null;
+        }
+        rank = Math.max(rank, fuzzyRank);
+      }
+      return prefixWords.every(({ word }) => this.matchesWord(id, word)) ? rank : null;
+    };
+
+    let ranges;
+    if (prefixWords.length > 0) {
+      ({ ranges } = prefixWords.reduce((a, b) => (b.size < a.size ? b : a)));
+    } else {
+      const { symbols, terms } = fuzzyWords.reduce((a, b) => (b.size < a.size ? b : a));
+      const ids = Int32Array.from(symbols.keys());
+      ranges = [{ postings: ids, from: 0, to: ids.length }, ...[...terms.keys()].map(t => ({
+        postings: this.tokens.postings,
+        from: this.tokens.starts[t],
+        to: this.tokens.starts[t + 1]
+      }))];
+    }
+
+    for (const { postings, from, to } of ranges) {
+      for (let i = from; i < to && hits.size < max; i++) {
+        const id = postings[i];
+        if (!this.primary[id] || hits.has(id)) {
+          continue;
+        }
+        const rank = rankOf(id);
+        if (rank !== null) {
+          hits.set(id, rank);
+        }
+      }
+    }
+  }
+
+  search(query, limit = 20) {
+    const q = (query || '').trim().toLowerCase();
+    if (!q) {
+      const results = [];
+      for (let id = 0; id < this.instruments.length && results.length < limit; id++) {
+        if (this.primary[id]) {
+          results.push(this.instruments[id]);
+        }
+      }
+      return results;
+    }
+
+    // Over-collect so ranking can pick the best `limit` across match types
+    const max = limit * 4;
+    const hits = new Map();
+    const words = q.split(/\s+/);
+    if (words.length > 1) {
+      this.searchWords(words, hits, max);
+    } else {
+      this.prefixScan(this.symbols, q, RANK_SYMBOL_PREFIX, hits, max);
+      if (hits.size < max) {
+        this.prefixScan(this.tokens, q, RANK_NAME_PREFIX, hits, max);
+      }
+      if (hits.size < limit && q.length >= 3) {
+        this.fuzzyWord(q, hits, max);
+      }
+    }
+
+    return [...hits.entries()]
+      .sort((a, b) => {
+        if (a[1] !== b[1]) {
+          return a[1] - b[1];
+        }
+        const sa = this.instruments[a[0]].symbol;
+        const sb = this.instruments[b[0]].symbol;
+        return sa.length - sb.length || (sa < sb ? -1 : sa > sb ? 1 : 0);
+      })
+      .slice(0, limit)
+      .map(([id]) => this.instruments[id]);
+  }
+}
@@ -0,0 +1,143 @@
+import { mapWithConcurrency } from './fanout';
+
+// Per-key snapshot store for broker data (holdings, funds) with TTL,
+// stale-while-revalidate and request coalescing.
+//
+// - fresh (age < ttlMs): served from memory
+// - stale (age < staleTtlMs): served from memory, refreshed in the background
+// - expired or missing: fetched; concurrent callers share one in-flight fetch
+//
+// Callers that act on the value (SELL sizing) pass { allowStale: false }: a
+// stale entry is then fetched like an expired one instead of being served.
+export class SnapshotCache {
+  constructor({ ttlMs = 15000, staleTtlMs = 120000, maxSize = 50000 } = {}) {
+    this.ttlMs = ttlMs;
+    this.staleTtlMs = Math.max(staleTtlMs, ttlMs);
+    this.maxSize = maxSize;
+    this.entries = new Map();
+    this.inflight = new Map();
+    this.metrics = {
+      hits: 0,
+      staleHits: 0,
+      misses: 0,
+      coalesced: 0,
+      fetches: 0,
+      fetchErrors: 0,
+      backgroundRefreshes: 0,
+      invalidations: 0,
+      servedAgeTotalMs: 0,
+      servedAgeMaxMs: 0,
+      served: 0
+    };
+  }
+
+  async get(key, fetcher, { allowStale = true } = {}) {
+    const entry = this.entries.get(key);
+    const age = entry ? Date.now() - entry.fetchedAt : Infinity;
+
+    if (age < this.ttlMs) {
+      this.metrics.hits++;
+      return this.serve(entry, age, false);
+    }
+
+    if (allowStale && age < this.staleTtlMs) {
+      this.metrics.staleHits++;
+      if (!this.inflight.has(key)) {
+        this.metrics.backgroundRefreshes++;
+        this.fetch(key, fetcher).catch(() => {});
+      }
+      return this.serve(entry, age, true);
+    }
+
+    this.metrics.misses++;
+    const fresh = await this.fetch(key, fetcher);
+    return this.serve(fresh, 0, false);
+  }
+
+  fetch(key, fetcher) {
+    const pending = this.inflight.get(key);
+    if (pending) {
+      this.metrics.coalesced++;
+      return pending.request;
+    }
+
+    this.metrics.fetches++;
+    // invalidate() marks the in-flight fetch superseded so data read before
+    // the invalidating write is never stored
+    const flight = { superseded: false };
+    flight.request = (async () => {
+      try {
+        const value = await fetcher();
+        const entry = { value, fetchedAt: Date.now() };
+        if (!flight.superseded) {
+          this.store(key, entry);
+        }
+        return entry;
+      } catch (error) {
+        this.metrics.fetchErrors++;
+        throw error;
+      } finally {
+        if (this.inflight.get(key) === flight) {
+          this.inflight.delete(key);
+        }
+      }
+    })();
+
+    this.inflight.set(key, flight);
+    return flight.request;
+  }
+
+  // Fetch many keys up front (e.g. before a known SELL fan-out)
+  async prewarm(keys, fetcherFor, concurrency = 25) {
+    let warmed = 0;
+    let failed = 0;
+    await mapWithConcurrency(keys, concurrency, async (key) => {
+      try {
+        await this.fetch(key, fetcherFor(key));
+        warmed++;
+      } catch (error) {
+        failed++;
+      }
+    });
+    return { warmed, failed };
+  }
+
+  store(key, entry) {
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    while (this.entries.size > this.maxSize) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  }
+
+  serve(entry, ageMs, stale) {
+    this.metrics.served++;
+    this.metrics.servedAgeTotalMs += ageMs;
+    this.metrics.servedAgeMaxMs = Math.max(this.metrics.servedAgeMaxMs, ageMs);
+    return { value: entry.value, ageMs, stale };
+  }
+
+  invalidate(key) {
+    const pending = this.inflight.get(key);
+    if (pending) {
+      pending.superseded = true;
+      this.inflight.delete(key);
+    }
+    if (this.entries.delete(key)) {
+      this.metrics.invalidations++;
+    }
+  }
+
+  stats() {
+    const { servedAgeTotalMs, served, ...counters } = this.metrics;
+    return {
+      size: this.entries.size,
+      inflight: this.inflight.size,
+      ttlMs: this.ttlMs,
+      staleTtlMs: this.staleTtlMs,
+      ...counters,
+      served,
+      servedAgeAvgMs: served > 0 ? servedAgeTotalMs / served : 0
+    };
+  }
+}
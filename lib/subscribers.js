@@ -0,0 +1,258 @@
+// Materialized set of active subscribers for execute-order.
+//
+// Holds { id, email, maxCapital, dhanConnection } for every active user, so
+// a fan-out starts from memory instead of scanning users and searching each
+// brokerConnections array. Kept current by:
+//
+// - refresh(userId) from the routes that change a subscriber (write hooks)
+// - a change stream on users when the deployment supports one (replica set)
+// - a periodic full reload, which bounds staleness for writes made
+//   elsewhere (other instances, scripts) when no change stream is available
+//
+// Every change bumps `version`; list() is rebuilt at most once per version.
+
+export const ACTIVE_SUBSCRIBER_FILTER = { subscriptionStatus: 'active', role: 'user' };
+const PROJECTION = { _id: 1, id: 1, email: 1, role: 1, subscriptionStatus: 1, maxCapital: 1, brokerConnections: 1 };
+
+export function resolveDhanConnection(user) {
+  const connection = user.brokerConnections?.find(bc => bc.brokerName === 'Dhan' && bc.status === 'connected');
+  return connection && connection.accessToken ? connection : null;
+}
+
+function isActiveSubscriber(user) {
+  return user.subscriptionStatus === ACTIVE_SUBSCRIBER_FILTER.subscriptionStatus && user.role === ACTIVE_SUBSCRIBER_FILTER.role;
+}
+
+function toRecord(user) {
+  return Object.freeze({
+    id: user.id,
+    email: user.email,
+    maxCapital: user.maxCapital,
+    dhanConnection: resolveDhanConnection(user)
+  });
+}
+
+function sameRecord(a, b) {
+  return a.email === b.email && a.maxCapital === b.maxCapital
+    && JSON.stringify(a.dhanConnection) === JSON.stringify(b.dhanConnection);
+}
+
+export class ActiveSubscriberSet {
+  constructor({ resyncMs = 60000, useChangeStream = true } = {}) {
+    this.resyncMs = resyncMs;
+    this.useChangeStream = useChangeStream;
+    this.records = new Map();
+    this.idByObjectId = new Map();
+    this.version = 0;
+    this.cachedList = null;
+    this.cachedVersion = -1;
+    this.loading = null;
+    this.reloading = null;
+    this.pendingRefreshes = null;
+    this.timer = null;
+    this.changeStream = null;
+    this.metrics = {
+      reloads: 0,
+      lastReloadMs: 0,
+      loadedAt: null,
+      lastChangeAt: null,
+      hookRefreshes: 0,
+      changeEvents: 0,
+      changeStreamErrors: 0,
+      resyncCorrections: 0
+    };
+  }
+
+  // Resolves once the first load has finished; later calls return immediately
+  async ready(database) {
+    if (!this.database) {
+      this.database = database;
+      this.loading = this.reload().catch((error) => {
+        // Let the next caller retry from scratch
+        this.stop();
+        throw error;
+      });
+      this.watch();
+      if (this.resyncMs) {
+        this.timer = setInterval(() => {
+          this.reload().catch((error) => console.error('Active subscriber reload failed:', error));
+        }, this.resyncMs);
+        this.timer.unref?.();
+      }
+    }
+    await this.loading;
+    return this;
+  }
+
+  stop() {
+    clearInterval(this.timer);
+    this.timer = null;
+    this.changeStream?.close().catch(() => {});
+    this.changeStream = null;
+    this.database = null;
+  }
+
+  // Full reload; concurrent callers share the one in progress
+  reload() {
+    if (!this.reloading) {
+      this.reloading = this.load().finally(() => {
+        this.reloading = null;
+      });
+    }
+    return this.reloading;
+  }
+
+  async load() {
+    const started = Date.now();
+    this.pendingRefreshes = new Set();
+    try {
+      const users = await this.database.collection('users')
+        .find(ACTIVE_SUBSCRIBER_FILTER).project(PROJECTION).toArray();
+
+      const records = new Map();
+      const idByObjectId = new Map();
+      let corrections = 0;
+      for (const user of users) {
+        const record = toRecord(user);
+        records.set(user.id, record);
+        idByObjectId.set(String(user._id), user.id);
+        const previous = this.records.get(user.id);
+        if (!previous || !sameRecord(previous, record)) {
+          corrections++;
+        }
+      }
+      for (const id of this.records.keys()) {
+        if (!records.has(id)) {
+          corrections++;
+        }
+      }
+
+      const pending = this.pendingRefreshes;
+      this.pendingRefreshes = null;
+      this.records = records;
+      this.idByObjectId = idByObjectId;
+      if (corrections > 0 || this.metrics.reloads === 0) {
+        this.bump();
+      }
+      // After the first load, anything the reload had to fix was missed by hooks and the change stream
+      if (this.metrics.reloads > 0) {
+        this.metrics.resyncCorrections += corrections;
+      }
+      this.metrics.reloads++;
+      this.metrics.loadedAt = new Date();
+      this.metrics.lastReloadMs = Date.now() - started;
+      await Promise.all([...pending].map(userId => this.reread(userId)));
+    } finally {
+      this.pendingRefreshes = null;
+    }
+  }
+
+  watch() {
+    if (!this.useChangeStream) {
+      return;
+    }
+    try {
+      this.changeStream = this.database.collection('users').watch(
+        [{ $match: { operationType: { $in: ['insert', 'update', 'replace', 'delete'] } } }],
+        { fullDocument: 'updateLookup' }
+      );
+      this.changeStream.on('change', (event) => this.applyChange(event));
+      this.changeStream.on('error', (error) => {
+        // Standalone servers don't support change streams; hooks and reloads still apply
+        this.metrics.changeStreamErrors++;
+        console.error('Active subscriber change stream closed:', error.message);
+        this.changeStream?.close().catch(() => {});
+        this.changeStream = null;
+      });
+    } catch (error) {
+      this.metrics.changeStreamErrors++;
+      this.changeStream = null;
+    }
+  }
+
+  applyChange(event) {
+    this.metrics.changeEvents++;
+    if (event.operationType === 'delete') {
+      const userId = this.idByObjectId.get(String(event.documentKey._id));
+      if (userId) {
+        this.remove(userId);
+      }
+      return;
+    }
+    if (event.fullDocument) {
+      this.upsert(event.fullDocument);
+    }
+  }
+
+  // Write hook: re-read one user after a route changed it
+  async refresh(userId) {
+    if (!this.database) {
+      return;
+    }
+    this.metrics.hookRefreshes++;
+    await this.reread(userId);
+  }
+
+  async reread(userId) {
+    const user = await this.database.collection('users').findOne({ id: userId }, { projection: PROJECTION });
+    if (user) {
+      this.upsert(user);
+    } else {
+      this.remove(userId);
+    }
+  }
+
+  upsert(user) {
+    // Changes that land while a reload scans are re-read on top of it
+    this.pendingRefreshes?.add(user.id);
+    if (!isActiveSubscriber(user)) {
+      this.remove(user.id);
+      return;
+    }
+    const record = toRecord(user);
+    const previous = this.records.get(user.id);
+    if (previous && sameRecord(previous, record)) {
+      return;
+    }
+    this.records.set(user.id, record);
+    this.idByObjectId.set(String(user._id), user.id);
+    this.bump();
+  }
+
+  remove(userId) {
+    this.pendingRefreshes?.add(userId);
+    if (this.records.delete(userId)) {
+      this.bump();
+    }
+  }
+
+  bump() {
+    this.version++;
+    this.metrics.lastChangeAt = new Date();
+  }
+
+  // Records are frozen and replaced (never mutated), so a fan-out keeps a
+  // consistent view even if the set changes while it runs
+  list() {
+    if (this.cachedVersion !== this.version) {
+      this.cachedList = [...this.records.values()];
+      this.cachedVersion = this.version;
+    }
+    return this.cachedList;
+  }
+
+  stats() {
+    const now = Date.now();
+    return {
+      ...this.metrics,
+      version: this.version,
+      size: this.records.size,
+      source: this.changeStream ? 'changeStream' : 'hooks+reload',
+      resyncMs: this.resyncMs,
+      // Upper bound on how old a change made outside this process can be
+      // (without a change stream it is only picked up by the next reload)
+      sinceReloadMs: this.metrics.loadedAt ? now - this.metrics.loadedAt : null,
+      sinceChangeMs: this.metrics.lastChangeAt ? now - this.metrics.lastChangeAt : null
+    };
+  }
+}
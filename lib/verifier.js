@@ -0,0 +1,317 @@
+import { randomUUID } from 'crypto';
+import { DhanBroker } from './brokers/dhan';
+import { TokenBucket } from './brokers/scheduler';
+import { mapWithConcurrency } from './fanout';
+
+// Background broker credential verification.
+//
+// user/connect-broker stores a Dhan connection as status: 'pending' with
+// nextVerifyAt = now and returns immediately. This worker picks up due
+// connections in batches, checks each with a getFunds call under its own
+// request budget (on top of the shared per-account scheduler) and writes the
+// outcome back with one bulkWrite per batch:
+//
+//   pending   -> connected  credentials work; re-verified every reverifyMs
+//   pending   -> error      broker rejected the credentials (401/403)
+//   connected -> expired    a re-verification was rejected: the token lapsed
+//
+// Other failures (network, 5xx, exhausted 429 retries) are retried with
+// exponential backoff without changing the status, until maxAttempts turns a
+// pending connection into an error.
+//
+// Once a day, at sweepAt (IST, before the 09:15 open), every connected Dhan
+// connection not verified since then is made due, so expired tokens are
+// flagged ahead of execute-order instead of failing one order at a time.
+//
+// Every API instance runs this worker, so each due connection is claimed
+// before it is verified: a conditional update moves its nextVerifyAt to the
+// end of a lease and stamps the batch's verifyToken. Only one instance wins
+// a connection. Its write-back matches the token, so an instance that
+// outlived its lease can't overwrite a newer outcome. A connection whose
+// claimer died becomes due again when the lease ends.
+
+const IST_OFFSET_MS = 330 * 60000;
+const CREDENTIAL_ERROR_STATUSES = new Set([401, 403]);
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Most recent occurrence of `hhmm` (IST) at or before `now`
+export function lastSweepTime(hhmm, now = new Date()) {
+  const [hours, minutes] = hhmm.split(':').map(Number);
+  const istNow = new Date(now.getTime() + IST_OFFSET_MS);
+  let sweep = Date.UTC(istNow.getUTCFullYear(), istNow.getUTCMonth(), istNow.getUTCDate(), hours, minutes) - IST_OFFSET_MS;
+  if (sweep > now.getTime()) {
+    sweep -= 86400000;
+  }
+  return new Date(sweep);
+}
+
+export class ConnectionVerifier {
+  constructor({
+    intervalMs = 5000,
+    batchSize = 200,
+    concurrency = 10,
+    ratePerSec = 10,
+    maxAttempts = 5,
+    baseBackoffMs = 5000,
+    maxBackoffMs = 300000,
+    reverifyMs = 6 * 3600000,
+    leaseMs = 60000,
+    sweepAt = '08:30',
+    onChange = () => {}
+  } = {}) {
+    this.intervalMs = intervalMs;
+    this.batchSize = batchSize;
+    this.concurrency = concurrency;
+    this.bucket = ratePerSec > 0 ? new TokenBucket(ratePerSec) : null;
+    this.maxAttempts = maxAttempts;
+    this.baseBackoffMs = baseBackoffMs;
+    this.maxBackoffMs = maxBackoffMs;
+    this.reverifyMs = reverifyMs;
+    this.leaseMs = leaseMs;
+    this.sweepAt = sweepAt;
+    this.onChange = onChange;
+    this.timer = null;
+    this.running = false;
+    this.lastSweepAt = null;
+    this.metrics = {
+      ticks: 0,
+      checked: 0,
+      verified: 0,
+      rejected: 0,
+      expired: 0,
+      checkErrors: 0,
+      claimConflicts: 0,
+      sweeps: 0,
+      sweptConnections: 0,
+      lastTickAt: null,
+      lastTickMs: 0,
+      backlog: 0
+    };
+  }
+
+  start(database) {
+    if (this.timer || !this.intervalMs) {
+      return;
+    }
+    this.database = database;
+    this.timer = setInterval(() => this.wake(), this.intervalMs);
+    // Don't keep the process alive just for verification
+    this.timer.unref?.();
+  }
+
+  stop() {
+    clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  // Run a tick now (e.g. right after a connect) without waiting for it
+  wake() {
+    if (!this.database) {
+      return;
+    }
+    this.tick().catch((error) => console.error('Broker verification failed:', error));
+  }
+
+  backoffMs(attempts) {
+    return Math.min(this.maxBackoffMs, this.baseBackoffMs * 2 ** attempts);
+  }
+
+  // Verify batches until nothing is due (or a tick's worth of time passed)
+  async tick() {
+    if (this.running) {
+      return;
+    }
+    this.running = true;
+    const started = Date.now();
+    try {
+      const users = this.database.collection('users');
+      await this.sweep(users);
+      let processed;
+      do {
+        processed = await this.verifyBatch(users);
+      } while (processed === this.batchSize && Date.now() - started < this.intervalMs);
+
+      this.metrics.backlog = await users.countDocuments({
+        brokerConnections: { $elemMatch: { nextVerifyAt: { $lte: new Date() } } }
+      });
+    } finally {
+      this.metrics.ticks++;
+      this.metrics.lastTickAt = new Date();
+      this.metrics.lastTickMs = Date.now() - started;
+      this.running = false;
+    }
+  }
+
+  // Make every connected Dhan connection not verified since the last sweep
+  // time due. Idempotent, so several API instances can all run it.
+  async sweep(users) {
+    if (!this.sweepAt) {
+      return;
+    }
+    const sweepTime = lastSweepTime(this.sweepAt);
+    if (this.lastSweepAt && this.lastSweepAt >= sweepTime) {
+      return;
+    }
+    const stale = {
+      brokerName: 'Dhan',
+      status: 'connected',
+      accessToken: { $nin: [null, ''] },
+      verifiedAt: { $not: { $gte: sweepTime } },
+      nextVerifyAt: { $not: { $lte: sweepTime } },
+      // Claimed by an instance right now; making it due again would verify it twice
+      verifyToken: { $exists: false }
+    };
+    const result = await users.updateMany(
+      { brokerConnections: { $elemMatch: stale } },
+      { $set: { 'brokerConnections.$[c].nextVerifyAt': sweepTime } },
+      { arrayFilters: [Object.fromEntries(Object.entries(stale).map(([key, value]) => [`c.${key}`, value]))] }
+    );
+    this.lastSweepAt = sweepTime;
+    this.metrics.sweeps++;
+    this.metrics.sweptConnections += result.modifiedCount;
+  }
+
+  // Claim due connections for this instance: [{ userId, connection }] of the
+  // ones it won. `found` counts the users looked at, for the batch loop.
+  async claimBatch(users) {
+    const now = new Date();
+    const docs = await users.find({ brokerConnections: { $elemMatch: { nextVerifyAt: { $lte: now } } } })
+      .limit(this.batchSize)
+      .project({ id: 1, brokerConnections: 1 })
+      .toArray();
+    const due = docs.flatMap(user => (user.brokerConnections || [])
+      .filter(connection => connection.nextVerifyAt && connection.nextVerifyAt <= now)
+      .map(connection => ({ userId: user.id, connection })));
+    if (due.length === 0) {
+      return { found: docs.length, claimed: [] };
+    }
+
+    // Re-checking nextVerifyAt per connection makes the claim atomic against other instances
+    const token = randomUUID();
+    const leaseUntil = new Date(now.getTime() + this.leaseMs);
+    const result = await users.bulkWrite(due.map(({ userId, connection }) => ({
+      updateOne: {
+        filter: { id: userId, brokerConnections: { $elemMatch: { id: connection.id, nextVerifyAt: { $lte: now } } } },
+        update: { $set: { 'brokerConnections.$.nextVerifyAt': leaseUntil, 'brokerConnections.$.verifyToken': token } }
+      }
+    })), { ordered: false });
+    this.metrics.claimConflicts += due.length - result.modifiedCount;
+
+    const claimed = result.modifiedCount === 0 ? [] : (await users.find({ 'brokerConnections.verifyToken': token })
+      .project({ id: 1, brokerConnections: 1 })
+      .toArray())
+      .flatMap(user => user.brokerConnections
+        .filter(connection => connection.verifyToken === token)
+        .map(connection => ({ userId: user.id, connection })));
+    return { found: docs.length, claimed };
+  }
+
+  async verifyBatch(users) {
+    const { found, claimed: due } = await this.claimBatch(users);
+    if (due.length === 0) {
+      return found;
+    }
+
+    const outcomes = await mapWithConcurrency(due, this.concurrency, async ({ userId, connection }) => {
+      if (this.bucket) {
+        const waitMs = this.bucket.reserve();
+        if (waitMs > 0) {
+          await sleep(waitMs);
+        }
+      }
+
+      this.metrics.checked++;
+      try {
+        await new DhanBroker(connection.clientId, connection.accessToken).getFunds();
+      } catch (error) {
+        return this.applyFailure(connection, error);
+      }
+      if (connection.status !== 'connected') {
+        this.metrics.verified++;
+      }
+      return {
+        status: 'connected',
+        verified: true,
+        verifiedAt: new Date(),
+        error: null,
+        verifyAttempts: 0,
+        nextVerifyAt: new Date(Date.now() + this.reverifyMs)
+      };
+    });
+
+    const changed = new Set();
+    const operations = due.map(({ userId, connection }, index) => {
+      const fields = outcomes[index];
+      if (fields.status && fields.status !== connection.status) {
+        changed.add(userId);
+      }
+      return this.update(userId, connection, fields);
+    });
+
+    await users.bulkWrite(operations, { ordered: false });
+    if (changed.size > 0) {
+      await this.onChange([...changed]);
+    }
+    return found;
+  }
+
+  applyFailure(connection, error) {
+    const attempts = (connection.verifyAttempts || 0) + 1;
+    if (CREDENTIAL_ERROR_STATUSES.has(error.status)) {
+      const expired = connection.status === 'connected';
+      this.metrics[expired ? 'expired' : 'rejected']++;
+      return {
+        status: expired ? 'expired' : 'error',
+        verified: false,
+        error: error.message,
+        verifyAttempts: attempts,
+        nextVerifyAt: null
+      };
+    }
+
+    this.metrics.checkErrors++;
+    if (connection.status !== 'connected' && attempts >= this.maxAttempts) {
+      this.metrics.rejected++;
+      return { status: 'error', error: error.message, verifyAttempts: attempts, nextVerifyAt: null };
+    }
+    // Transient: keep the current status and check again later
+    return {
+      error: error.message,
+      verifyAttempts: attempts,
+      nextVerifyAt: new Date(Date.now() + this.backoffMs(attempts))
+    };
+  }
+
+  // Write an outcome back, only if this instance still holds the claim
+  update(userId, connection, fields) {
+    const $set = { 'brokerConnections.$.checkedAt': new Date() };
+    const $unset = { 'brokerConnections.$.verifyToken': '' };
+    for (const [key, value] of Object.entries(fields)) {
+      if (key === 'nextVerifyAt' && value === null) {
+        $unset['brokerConnections.$.nextVerifyAt'] = '';
+      } else {
+        $set[`brokerConnections.$.${key}`] = value;
+      }
+    }
+    return {
+      updateOne: {
+        filter: { id: userId, brokerConnections: { $elemMatch: { id: connection.id, verifyToken: connection.verifyToken } } },
+        update: { $set, $unset }
+      }
+    };
+  }
+
+  stats() {
+    return {
+      ...this.metrics,
+      intervalMs: this.intervalMs,
+      batchSize: this.batchSize,
+      concurrency: this.concurrency,
+      leaseMs: this.leaseMs,
+      sweepAt: this.sweepAt,
+      lastSweepAt: this.lastSweepAt,
+      running: this.running
+    };
+  }
+}
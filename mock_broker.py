@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Seeded, Mongo-backed mock broker (Python side of lib/brokers/mock.js)
+
+Subscribers without a broker connection trade against an account in
+mock_accounts ({userId, funds, holdings}) that changes as mock orders fill.
+Holdings are a list of {symbol, quantity, avgPrice} matched by symbol, since
+symbols may contain '.' and can't be used in field paths.
+The starting portfolio is derived from (seed, userId) and each order's
+failure and latency from (seed, "<executionId>:<userId>") with the same
+FNV-1a + mulberry32 generator as the API, so portfolios seeded here, created
+lazily by the API and used by execution_worker.py are identical. Orders are
+idempotent by order key in the same way (appliedOrders on the account).
+
+    python mock_broker.py user-id-1 user-id-2     # print the generated portfolios
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List
+
+from pymongo import UpdateOne
+
+MOCK_ACCOUNTS = "mock_accounts"
+# Order keys kept per account for idempotent fills; must match APPLIED_ORDER_KEYS in mock.js
+APPLIED_ORDER_KEYS = 1000
+MASK = 0xFFFFFFFF
+
+# Same symbols, prices and order as dhanMock.stocks in route.js
+MOCK_UNIVERSE = [
+    ("RELIANCE", 2950.50), ("TCS", 4120.75), ("HDFCBANK", 1580.25), ("INFY", 1805.60),
+    ("ICICIBANK", 1245.80), ("HINDUNILVR", 2380.90), ("ITC", 465.35), ("BHARTIARTL", 1520.40),
+    ("KOTAKBANK", 1890.65), ("LT", 3560.25)
+]
+MOCK_PRICES = dict(MOCK_UNIVERSE)
+
+
+def fnv1a(text: str) -> int:
+    """32-bit FNV-1a over UTF-16 code units, like String.charCodeAt"""
+    value = 0x811C9DC5
+    encoded = text.encode("utf-16-le")
+    for i in range(0, len(encoded), 2):
+        value ^= encoded[i] | (encoded[i + 1] << 8)
+        value = (value * 0x01000193) & MASK
+    return value
+
+
+def mulberry32(seed: int) -> Callable[[], float]:
+    state = seed & MASK
+
+    def next_value() -> float:
+        nonlocal state
+        state = (state + 0x6D2B79F5) & MASK
+        t = state
+        t = ((t ^ (t >> 15)) * (t | 1)) & MASK
+        t ^= (t + ((t ^ (t >> 7)) * (t | 61))) & MASK
+        return ((t ^ (t >> 14)) & MASK) / 4294967296
+
+    return next_value
+
+
+def seeded_random(*parts) -> Callable[[], float]:
+    return mulberry32(fnv1a(":".join(str(part) for part in parts)))
+
+
+def round2(value: float) -> float:
+    # Math.round semantics (half up), not Python's banker's rounding
+    return math.floor(value * 100 + 0.5) / 100
+
+
+def generate_portfolio(seed: int, user_id: str) -> Dict[str, Any]:
+    """Starting cash and holdings of one subscriber; must match generatePortfolio in mock.js"""
+    rng = seeded_random(seed, "portfolio", user_id)
+    cash = 100000 + math.floor(rng() * 500000)
+    holdings = []
+    for symbol, price in MOCK_UNIVERSE:
+        if rng() < 0.3:
+            quantity = 1 + math.floor(rng() * 200)
+            holdings.append({"symbol": symbol, "quantity": quantity, "avgPrice": round2(price * (0.8 + 0.4 * rng()))})
+    return {"funds": {"availablecash": cash, "collateral": 0}, "holdings": holdings}
+
+
+def bought_holdings(symbol: str, quantity: int, cost: float) -> Dict[str, Any]:
+    """Pipeline expression for holdings after a BUY; must match boughtHoldings in mock.js"""
+    held = {"$arrayElemAt": [{"$filter": {"input": "$$holdings",
+                                          "cond": {"$eq": ["$$this.symbol", {"$literal": symbol}]}}}, 0]}
+    held_quantity = {"$ifNull": ["$$held.quantity", 0]}
+    bought = {
+        "symbol": {"$literal": symbol},
+        "quantity": {"$add": [held_quantity, quantity]},
+        "avgPrice": {"$round": [{"$divide": [
+            {"$add": [{"$multiply": [held_quantity, {"$ifNull": ["$$held.avgPrice", 0]}]}, cost]},
+            {"$add": [held_quantity, quantity]}
+        ]}, 2]}
+    }
+    return {"$let": {"vars": {"holdings": {"$ifNull": ["$holdings", []]}}, "in": {"$let": {"vars": {"held": held}, "in": {
+        "$cond": [
+            {"$eq": [{"$type": "$$held"}, "missing"]},
+            {"$concatArrays": ["$$holdings", [bought]]},
+            {"$map": {"input": "$$holdings", "as": "h",
+                      "in": {"$cond": [{"$eq": ["$$h.symbol", {"$literal": symbol}]}, bought, "$$h"]}}}
+        ]
+    }}}}}
+
+
+def mock_account(seed: int, user_id: str) -> Dict[str, Any]:
+    return {"userId": user_id, "seed": seed, **generate_portfolio(seed, user_id),
+            "createdAt": datetime.now(timezone.utc)}
+
+
+class MockBroker:
+    def __init__(self, db, seed: int = None, failure_rate: float = None, latency_ms: float = None,
+                 jitter_ms: float = None):
+        # Defaults follow the API's environment so both sides agree
+        self.db = db
+        self.seed = int(os.environ.get("MOCK_BROKER_SEED", "42")) if seed is None else seed
+        self.failure_rate = float(os.environ.get("MOCK_BROKER_FAILURE_RATE", "0.1")) if failure_rate is None else failure_rate
+        self.latency_ms = float(os.environ.get("MOCK_BROKER_LATENCY_MS", "0")) if latency_ms is None else latency_ms
+        self.jitter_ms = float(os.environ.get("MOCK_BROKER_JITTER_MS", "0")) if jitter_ms is None else jitter_ms
+
+    @property
+    def accounts(self):
+        return self.db[MOCK_ACCOUNTS]
+
+    def get_account(self, user_id: str) -> Dict[str, Any]:
+        account = self.accounts.find_one({"userId": user_id})
+        if account is None:
+            self.accounts.update_one({"userId": user_id}, {"$setOnInsert": mock_account(self.seed, user_id)},
+                                     upsert=True)
+            account = self.accounts.find_one({"userId": user_id})
+        return account
+
+    def get_holdings(self, user_id: str) -> Dict[str, int]:
+        """{symbol: quantity} of positions with a non-zero quantity"""
+        holdings = self.get_account(user_id).get("holdings") or []
+        return {h["symbol"]: h["quantity"] for h in holdings if h["quantity"] > 0}
+
+    def place_order(self, user_id: str, order_key: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill or fail an order against the account; mirrors MockBroker.placeOrder.
+
+        An order key that was already filled is reported as executed without filling it again.
+        """
+        rng = seeded_random(self.seed, "order", order_key)
+        latency = self.latency_ms + rng() * self.jitter_ms
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+        result = {"orderId": f"MOCK{fnv1a(f'{self.seed}:{order_key}'):X}", "orderStatus": "TRADED", **order,
+                  "timestamp": datetime.now(timezone.utc).isoformat()}
+        if rng() < self.failure_rate:
+            return {**result, "orderStatus": "REJECTED", "status": "FAILED",
+                    "reason": "Mock execution - order rejected by broker"}
+
+        self.get_account(user_id)
+        quantity, symbol = order["quantity"], order["tradingSymbol"]
+        cost = quantity * order["price"]
+        if order["transactionType"] == "BUY":
+            update = self.accounts.update_one(
+                {"userId": user_id, "funds.availablecash": {"$gte": cost}, "appliedOrders": {"$ne": order_key}},
+                [{"$set": {
+                    "funds.availablecash": {"$subtract": ["$funds.availablecash", cost]},
+                    "holdings": bought_holdings(symbol, quantity, cost),
+                    "appliedOrders": {"$slice": [{"$concatArrays": [{"$ifNull": ["$appliedOrders", []]},
+                                                                    [{"$literal": order_key}]]},
+                                                 -APPLIED_ORDER_KEYS]},
+                    "updatedAt": "$$NOW"
+                }}]
+            )
+        else:
+            update = self.accounts.update_one(
+                {"userId": user_id, "holdings": {"$elemMatch": {"symbol": symbol, "quantity": {"$gte": quantity}}},
+                 "appliedOrders": {"$ne": order_key}},
+                {"$inc": {"holdings.$[held].quantity": -quantity, "funds.availablecash": cost},
+                 "$push": {"appliedOrders": {"$each": [order_key], "$slice": -APPLIED_ORDER_KEYS}},
+                 "$currentDate": {"updatedAt": True}},
+                array_filters=[{"held.symbol": symbol}]
+            )
+
+        if update.matched_count == 0 and self.accounts.count_documents({"userId": user_id, "appliedOrders": order_key},
+                                                                       limit=1):
+            # Already filled by an earlier placement of the same order
+            return {**result, "status": "EXECUTED", "duplicate": True}
+        if update.matched_count == 0:
+            side = "funds" if order["transactionType"] == "BUY" else "holdings"
+            return {**result, "orderStatus": "REJECTED", "status": "FAILED",
+                    "reason": f"Insufficient {side} in mock account"}
+        return {**result, "status": "EXECUTED"}
+
+
+def seed_mock_accounts(db, user_ids: List[str], seed: int, batch_size: int = 5000) -> int:
+    """Reset the mock accounts of `user_ids` to their generated starting portfolios"""
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        db[MOCK_ACCOUNTS].bulk_write([
+            UpdateOne({"userId": user_id}, {"$set": mock_account(seed, user_id)}, upsert=True)
+            for user_id in batch
+        ], ordered=False)
+        written += len(batch)
+    return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Print generated mock broker portfolios")
+    parser.add_argument("user_ids", nargs="+")
+    parser.add_argument("--seed", type=int, default=int(os.environ.get("MOCK_BROKER_SEED", "42")))
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for user_id in args.user_ids:
+        print(json.dumps({"userId": user_id, **generate_portfolio(args.seed, user_id)}))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Traffic replay for StockSync
+
+Plays back a traffic log written by the API (TRAFFIC_LOG_FILE) against a
+local stack through StockSyncTester.make_request (one pooled keep-alive
+client shared by all replay threads), then compares latencies
+with the recording.
+
+Calls start at their recorded offsets divided by --speed, so bursts such as
+the 9:15 open keep their shape. Calls that overlapped in the recording run
+concurrently. When an actor's call started only after that actor's previous
+call had finished, the replay waits for the same completion, so per-user
+ordering is preserved even at --speed max.
+
+    python replay_traffic.py traffic.log --speed 10
+    python replay_traffic.py traffic.log --speed max --tokens-from-db --output replay.json
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from backend_test import StockSyncTester, LatencyHistogram
+
+# Not replayable: they create users or need broker credentials that are never recorded
+SKIPPED_PATHS = {"auth/register", "user/connect-broker"}
+# How many earlier calls of the same actor to search for an ordering dependency
+DEPENDENCY_LOOKBACK = 32
+
+
+def load_recording(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Read a traffic log into events sorted by start time, offsets relative to the first call"""
+    events = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            started_at, duration_ms, method, endpoint, status, actor, body = json.loads(line)
+            if endpoint.split("?")[0] in SKIPPED_PATHS:
+                continue
+            events.append({
+                "started_at": started_at,
+                "duration_ms": duration_ms,
+                "method": method,
+                "endpoint": endpoint,
+                "status": status,
+                "actor": actor,
+                "body": body
+            })
+
+    events.sort(key=lambda e: e["started_at"])
+    if limit:
+        events = events[:limit]
+    if events:
+        origin = events[0]["started_at"]
+        for index, event in enumerate(events):
+            event["index"] = index
+            event["offset_ms"] = event["started_at"] - origin
+    return events
+
+
+def link_dependencies(events: List[Dict[str, Any]]):
+    """Point each event at the latest call of the same actor that had completed before it started"""
+    history = {}
+    for event in events:
+        event["depends_on"] = None
+        if event["actor"] is None:
+            continue
+        previous = history.setdefault(event["actor"], [])
+        best_end = None
+        for candidate in previous[-DEPENDENCY_LOOKBACK:]:
+            end = candidate["started_at"] + candidate["duration_ms"]
+            if end <= event["started_at"] and (best_end is None or end > best_end):
+                best_end = end
+                event["depends_on"] = candidate["index"]
+        previous.append(event)
+
+
+class TokenPool:
+    """Maps recorded actors onto tokens valid on the replay target"""
+
+    def __init__(self, tester: StockSyncTester, tokens_from_db: bool = False):
+        self.tester = tester
+        self.admin_token = self._login(tester.admin_credentials)
+        self.user_tokens = self._load_user_tokens() if tokens_from_db else []
+        if not self.user_tokens:
+            self.user_tokens = [self._login(tester.user_credentials)]
+        self.assigned = {}
+        self.lock = threading.Lock()
+
+    def _login(self, credentials: Dict) -> str:
+        response = self.tester.make_request('POST', 'auth/login', credentials)
+        if not response["success"]:
+            raise RuntimeError(f"Login failed for {credentials['email']}: {response['data']}")
+        return response["data"]["token"]
+
+    def _load_user_tokens(self) -> List[str]:
+        from setup_default_accounts import get_database
+
+        users = get_database().users.find({"role": "user"}, {"_id": 0, "token": 1}).sort("id", 1)
+        return [user["token"] for user in users if user.get("token")]
+
+    def headers_for(self, actor: Optional[str]) -> Optional[Dict[str, str]]:
+        if actor is None:
+            return None
+        if actor.startswith("admin:"):
+            return {"Authorization": f"Bearer {self.admin_token}"}
+        with self.lock:
+            # Distinct recorded users get distinct local users, in order of first appearance
+            token = self.assigned.get(actor)
+            if token is None:
+                token = self.user_tokens[len(self.assigned) % len(self.user_tokens)]
+                self.assigned[actor] = token
+        return {"Authorization": f"Bearer {token}"}
+
+
+class TrafficReplayer:
+    def __init__(self, tester: StockSyncTester, events: List[Dict[str, Any]], speed: Optional[float],
+                 max_inflight: int = 256, tokens_from_db: bool = False):
+        self.tester = tester
+        self.events = events
+        self.speed = speed
+        self.max_inflight = max_inflight
+        self.tokens = TokenPool(tester, tokens_from_db)
+        self.done = [threading.Event() for _ in events]
+        self.results = [None] * len(events)
+        link_dependencies(events)
+
+    def _fire(self, event: Dict[str, Any], scheduled: float):
+        try:
+            if event["depends_on"] is not None:
+                self.done[event["depends_on"]].wait()
+
+            body = event["body"]
+            if event["endpoint"] == "auth/login":
+                body = self.tester.user_credentials
+            headers = self.tokens.headers_for(event["actor"])
+
+            started = time.perf_counter()
+            response = self.tester.make_request(event["method"], event["endpoint"], body, headers)
+            self.results[event["index"]] = {
+                "endpoint": event["endpoint"].split("?")[0],
+                "original_ms": event["duration_ms"],
+                "replay_ms": (time.perf_counter() - started) * 1000,
+                "lag_ms": (started - scheduled) * 1000,
+                "original_status": event["status"],
+                "replay_status": response["status_code"]
+            }
+        finally:
+            self.done[event["index"]].set()
+
+    def run(self) -> float:
+        """Replay every event; returns the wall-clock duration in seconds"""
+        origin = time.perf_counter()
+        # Events are submitted in start order, so a dependency is always
+        # picked up by a worker before anything waiting on it
+        with ThreadPoolExecutor(max_workers=self.max_inflight) as pool:
+            for event in self.events:
+                scheduled = origin + (event["offset_ms"] / 1000 / self.speed if self.speed else 0)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._fire, event, scheduled)
+        return time.perf_counter() - origin
+
+
+def build_report(events: List[Dict[str, Any]], results: List[Dict[str, Any]], elapsed: float,
+                 speed: Optional[float]) -> Dict[str, Any]:
+    endpoints = {}
+    lag = LatencyHistogram()
+    for result in filter(None, results):
+        stats = endpoints.setdefault(result["endpoint"], {
+            "original": LatencyHistogram(), "replay": LatencyHistogram(), "status_mismatches": 0
+        })
+        stats["original"].record(result["original_ms"] / 1000)
+        stats["replay"].record(result["replay_ms"] / 1000)
+        lag.record(max(result["lag_ms"], 0) / 1000)
+        if result["original_status"] != result["replay_status"]:
+            stats["status_mismatches"] += 1
+
+    span_s = (events[-1]["offset_ms"] / 1000) if events else 0
+    return {
+        "events": len(events),
+        "speed": speed or "max",
+        "recorded_span_s": round(span_s, 3),
+        "replay_duration_s": round(elapsed, 3),
+        "schedule_lag": lag.summary(),
+        "endpoints": {
+            endpoint: {
+                "original": stats["original"].summary(),
+                "replay": stats["replay"].summary(),
+                "status_mismatches": stats["status_mismatches"]
+            }
+            for endpoint, stats in endpoints.items()
+        },
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print("\n📊 REPLAY SUMMARY")
+    print("=" * 60)
+    print(f"Events: {report['events']}, speed: {report['speed']}, recorded span: {report['recorded_span_s']}s, "
+          f"replayed in {report['replay_duration_s']}s")
+    print(f"Schedule lag p50/p99: {report['schedule_lag']['p50_ms']:.1f}/{report['schedule_lag']['p99_ms']:.1f} ms")
+
+    header = (f"{'Endpoint':<26}{'Count':>7}{'rec p50':>9}{'rep p50':>9}{'rec p99':>9}{'rep p99':>9}"
+              f"{'Δp99':>9}{'Status≠':>9}")
+    print("\n" + header)
+    print("-" * len(header))
+    for endpoint, stats in sorted(report["endpoints"].items()):
+        original, replay = stats["original"], stats["replay"]
+        print(f"{endpoint:<26}{replay['count']:>7}{original['p50_ms']:>9.1f}{replay['p50_ms']:>9.1f}"
+              f"{original['p99_ms']:>9.1f}{replay['p99_ms']:>9.1f}{replay['p99_ms'] - original['p99_ms']:>+9.1f}"
+              f"{stats['status_mismatches']:>9}")
+    print("(latencies in ms; rec = recording, rep = replay)")
+    print("\n" + "=" * 60)
+
+
+def parse_speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded StockSync API traffic")
+    parser.add_argument("log", help="Traffic log written via TRAFFIC_LOG_FILE")
+    parser.add_argument("--base-url", help="API base URL (default: $STOCKSYNC_BASE_URL or the preview deployment)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="Time compression: 1, 10, ... or 'max'")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Max concurrent replayed calls")
+    parser.add_argument("--tokens-from-db", action="store_true",
+                        help="Map recorded users onto distinct local users read from MongoDB")
+    parser.add_argument("--limit", type=int, help="Replay only the first N calls")
+    parser.add_argument("--output", help="Write the JSON replay report to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    events = load_recording(args.log, args.limit)
+    print(f"🎬 Replaying {len(events)} calls from {args.log} at {'max' if args.speed is None else f'{args.speed:g}x'} speed")
+
+    # Never retry: a replayed call must hit the server exactly once
+    tester = StockSyncTester(args.base_url, max_connections=args.max_inflight, max_retries=0)
+    replayer = TrafficReplayer(tester, events, args.speed, args.max_inflight, args.tokens_from_db)
+    elapsed = replayer.run()
+
+    report = build_report(events, replayer.results, elapsed, args.speed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Replay report written to {args.output}")
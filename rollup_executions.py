@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Execution rollup backfill and verification for StockSync
+
+execution_rollups holds pre-aggregated counters per executionId, per user per
+UTC day and per symbol per UTC day (see lib/rollups.js). The API and
+execution_worker.py keep them current with $inc upserts as executions are
+written; this tool rebuilds them from order_executions, e.g. for history
+written before rollups existed, and verifies them against the raw records.
+
+order_executions is streamed in batches; each batch is folded into one $inc
+upsert per rollup document, so memory stays bounded by the batch size.
+
+    python rollup_executions.py backfill            # rebuild into a new collection, then swap it in
+    python rollup_executions.py verify              # recompute and diff against execution_rollups
+"""
+
+import argparse
+import math
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+
+from setup_default_accounts import get_database, ensure_indexes
+
+ROLLUP_COLLECTION = "execution_rollups"
+COUNTERS = ("executions", "successful", "failed", "requestedQuantity", "executedQuantity", "notional")
+PROJECTION = {"_id": 0, "executionId": 1, "userId": 1, "symbol": 1, "status": 1, "timestamp": 1,
+              "requestedQuantity": 1, "executedQuantity": 1, "price": 1}
+
+
+def rollup_day(timestamp) -> str:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def rollup_targets(execution: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(_id, dimensions) of every rollup an execution counts towards; mirrors lib/rollups.js"""
+    day = rollup_day(execution["timestamp"])
+    return [
+        (f"execution:{execution['executionId']}",
+         {"scope": "execution", "executionId": execution["executionId"], "symbol": execution["symbol"]}),
+        (f"user:{execution['userId']}:{day}", {"scope": "user", "userId": execution["userId"], "day": day}),
+        (f"symbol:{execution['symbol']}:{day}", {"scope": "symbol", "symbol": execution["symbol"], "day": day})
+    ]
+
+
+def rollup_counters(execution: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """Counters of one execution; only successful executions count as filled"""
+    success = execution.get("status") == "SUCCESS"
+    executed = (execution.get("executedQuantity") or 0) if success else 0
+    return {
+        "executions": sign,
+        "successful": sign if success else 0,
+        "failed": 0 if success else sign,
+        "requestedQuantity": sign * (execution.get("requestedQuantity") or 0),
+        "executedQuantity": sign * executed,
+        "notional": sign * executed * (execution.get("price") or 0)
+    }
+
+
+def fold(executions: Iterable[Dict[str, Any]], into: Dict[str, Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """Add executions into {_id: {"dimensions": ..., "inc": {...}}}"""
+    merged = {} if into is None else into
+    for execution in executions:
+        counters = rollup_counters(execution)
+        for rollup_id, dimensions in rollup_targets(execution):
+            entry = merged.setdefault(rollup_id, {"dimensions": dimensions, "inc": dict.fromkeys(COUNTERS, 0)})
+            for field, value in counters.items():
+                entry["inc"][field] += value
+    return merged
+
+
+def rollup_operations(executions: Iterable[Dict[str, Any]]) -> List[UpdateOne]:
+    """One $inc upsert per rollup document touched by `executions`"""
+    now = datetime.now(timezone.utc)
+    return [
+        UpdateOne({"_id": rollup_id},
+                  {"$inc": entry["inc"], "$setOnInsert": entry["dimensions"], "$set": {"updatedAt": now}},
+                  upsert=True)
+        for rollup_id, entry in fold(executions).items()
+    ]
+
+
+def stream_executions(db, batch_size: int) -> Iterable[List[Dict[str, Any]]]:
+    batch = []
+    for execution in db.order_executions.find({}, PROJECTION).batch_size(batch_size):
+        batch.append(execution)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def backfill(db, batch_size: int) -> int:
+    """Rebuild all rollups into a scratch collection and swap it in atomically"""
+    scratch = db[f"{ROLLUP_COLLECTION}_rebuild"]
+    scratch.drop()
+    started = time.perf_counter()
+    processed = 0
+    for batch in stream_executions(db, batch_size):
+        scratch.bulk_write(rollup_operations(batch), ordered=False)
+        processed += len(batch)
+        print(f"   ... {processed} executions ({processed / (time.perf_counter() - started):.0f}/s)", end="\r")
+
+    if processed == 0:
+        print("ℹ️  No executions to roll up")
+        return 0
+    # Executions written while the rebuild ran are only in the live collection;
+    # run backfill while no orders are executing
+    scratch.rename(ROLLUP_COLLECTION, dropTarget=True)
+    ensure_indexes(db)
+    print(f"\n✅ Rebuilt {db[ROLLUP_COLLECTION].estimated_document_count()} rollups from {processed} executions "
+          f"in {time.perf_counter() - started:.1f}s")
+    return processed
+
+
+def verify(db, batch_size: int, show: int = 20) -> List[str]:
+    """Recompute every rollup from order_executions and diff against the stored documents"""
+    expected = {}
+    for batch in stream_executions(db, batch_size):
+        fold(batch, expected)
+
+    problems = []
+    seen = set()
+    for stored in db[ROLLUP_COLLECTION].find({}).batch_size(batch_size):
+        seen.add(stored["_id"])
+        entry = expected.get(stored["_id"])
+        if entry is None:
+            problems.append(f"{stored['_id']}: no executions")
+            continue
+        for field in COUNTERS:
+            if not math.isclose(stored.get(field, 0), entry["inc"][field], rel_tol=1e-9, abs_tol=1e-6):
+                problems.append(f"{stored['_id']}.{field}: {stored.get(field, 0)} != {entry['inc'][field]}")
+    problems.extend(f"{rollup_id}: missing" for rollup_id in expected.keys() - seen)
+
+    for problem in problems[:show]:
+        print(f"  ❌ {problem}")
+    if len(problems) > show:
+        print(f"  ... {len(problems) - show} more")
+    if not problems:
+        print(f"✅ {len(expected)} rollups match order_executions")
+    return problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rebuild or verify StockSync execution rollups")
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--batch-size", type=int, default=5000, help="Executions per streamed batch")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    database = get_database()
+    if args.command == "backfill":
+        backfill(database, args.batch_size)
+    else:
+        sys.exit(1 if verify(database, args.batch_size) else 0)
@@ -1,18 +1,111 @@
 #!/usr/bin/env python3
 """
 Setup default accounts for StockSync testing
+
+Run without arguments to reset the admin and sample user accounts. Pass
+--synthetic N to additionally seed N synthetic subscribers for scale testing
+(reproducible from --seed, generated in parallel worker processes).
 """
 
-from pymongo import MongoClient
-from uuid import uuid4
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from uuid import uuid4, UUID
+from datetime import datetime, timedelta, timezone
+import argparse
+import multiprocessing
+import random
+import time
 import os
 
-def setup_default_accounts():
+from mock_broker import seed_mock_accounts
+
+SYNTHETIC_EMAIL_DOMAIN = "synthetic.stocksync.local"
+
+
+# Indexes backing the API's hot query shapes (collection -> [(keys, options)])
+INDEXES = {
+    "users": [
+        # authenticateUser: findOne({ token }) on every protected request
+        ([("token", ASCENDING)], {"name": "token_unique", "unique": True}),
+        # auth/login: findOne({ email, password }) and auth/register duplicate check
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        # updateOne({ id }) from subscription, broker and capital updates
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # execute-order active scan and admin/subscribers ({ role } prefix)
+        ([("role", ASCENDING), ("subscriptionStatus", ASCENDING)], {"name": "role_subscriptionStatus"}),
+        # broker verifier: connections due for a (re-)verification
+        ([("brokerConnections.nextVerifyAt", ASCENDING)], {"name": "brokerConnections_nextVerifyAt", "sparse": True}),
+        # reading back the connections one verifier claim won
+        ([("brokerConnections.verifyToken", ASCENDING)], {"name": "brokerConnections_verifyToken", "sparse": True})
+    ],
+    "order_executions": [
+        # admin/execution-history: find({}).sort({ timestamp: -1, id: -1 }) keyset pages
+        ([("timestamp", DESCENDING), ("id", DESCENDING)], {"name": "timestamp_id_desc"}),
+        # user/orders: find({ userId }).sort({ timestamp: -1, id: -1 }) keyset pages
+        ([("userId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {"name": "userId_timestamp_id_desc"}),
+        # admin/execution-results pages and admin/execution-status aggregation
+        ([("executionId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+         {"name": "executionId_timestamp_id_desc"}),
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # order reconciler: due broker orders still awaiting a final status
+        ([("reconciliation", ASCENDING), ("nextReconcileAt", ASCENDING)],
+         {"name": "reconciliation_due", "partialFilterExpression": {"reconciliation": "pending"}}),
+        # reading back the executions one reconciler claim won
+        ([("reconcileToken", ASCENDING)], {"name": "reconcileToken", "sparse": True})
+    ],
+    "execution_jobs": [
+        ([("executionId", ASCENDING)], {"name": "executionId_unique", "unique": True})
+    ],
+    "execution_tasks": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # execution_worker.py claims: queued tasks oldest first, then expired leases
+        ([("status", ASCENDING), ("createdAt", ASCENDING)], {"name": "status_createdAt"}),
+        ([("status", ASCENDING), ("leaseUntil", ASCENDING)], {"name": "status_leaseUntil"}),
+        # reading back the tasks one claim won; the token is unset once a task is done
+        ([("leaseToken", ASCENDING)], {"name": "leaseToken", "sparse": True})
+    ],
+    "execution_rollups": [
+        # admin/execution-stats daily ranges (execution rollups are read by _id)
+        ([("scope", ASCENDING), ("symbol", ASCENDING), ("day", ASCENDING)], {"name": "scope_symbol_day"}),
+        ([("scope", ASCENDING), ("userId", ASCENDING), ("day", ASCENDING)], {"name": "scope_userId_day"})
+    ],
+    "mock_accounts": [
+        # mock broker account per subscriber; also the preview-order $lookup key
+        ([("userId", ASCENDING)], {"name": "userId_unique", "unique": True})
+    ],
+    "broker_rate_limits": [
+        # execution_worker.py per-account request counters, one document per second
+        ([("expiresAt", ASCENDING)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0})
+    ],
+    "instruments": [
+        # ingest_instruments.py upsert key; security ids are only unique per exchange
+        ([("exchange", ASCENDING), ("securityId", ASCENDING)], {"name": "exchange_securityId_unique", "unique": True}),
+        # symbol resolution for order routing and search exports
+        ([("symbol", ASCENDING), ("exchange", ASCENDING)], {"name": "symbol_exchange"}),
+        ([("securityId", ASCENDING)], {"name": "securityId"})
+    ]
+}
+
+
+def get_database():
     client = MongoClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-    db = client[os.environ.get('DB_NAME', 'stocksync')]
+    return client[os.environ.get('DB_NAME', 'stocksync')]
+
+
+def ensure_indexes(db):
+    """Create the indexes in INDEXES; existing identical indexes are left alone"""
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            db[collection].create_index(keys, **options)
+    print(f"🗂️  Indexes ensured on {', '.join(INDEXES)}")
+
+
+def setup_default_accounts():
+    db = get_database()
     
-    # Clear existing users
+    # Clear existing users (and the mock broker accounts keyed by their ids)
     db.users.delete_many({})
+    db.mock_accounts.delete_many({})
+    ensure_indexes(db)
     
     # Create admin account
     admin_id = str(uuid4())
@@ -57,5 +150,142 @@ def setup_default_accounts():
     for user in users:
         print(f"   {user['email']} - {user['role']} - {user['subscriptionStatus']}")
 
+
+def generate_synthetic_subscriber(rng: random.Random, index: int, profile: dict) -> dict:
+    """Build one synthetic subscriber document from a seeded RNG"""
+    user_id = str(UUID(int=rng.getrandbits(128), version=4))
+
+    # Capital is roughly log-normal: most subscribers allocate 50k-5L, with a
+    # long tail up to 1Cr. Rounded to the nearest thousand like real inputs.
+    max_capital = rng.lognormvariate(profile["capital_mu"], profile["capital_sigma"])
+    max_capital = int(min(max(max_capital, profile["capital_min"]), profile["capital_max"]) // 1000 * 1000)
+
+    created_at = profile["epoch"] + timedelta(seconds=rng.randrange(profile["history_seconds"]))
+
+    broker_connections = []
+    if rng.random() < profile["dhan_ratio"]:
+        broker_connections.append({
+            "id": str(UUID(int=rng.getrandbits(128), version=4)),
+            "brokerName": "Dhan",
+            "apiKey": "",
+            "apiSecret": "",
+            "clientId": f"{1100000000 + index}",
+            "accessToken": f"synthetic_{rng.getrandbits(64):016x}",
+            "status": "connected",
+            "connectedAt": created_at
+        })
+
+    return {
+        "id": user_id,
+        "email": f"subscriber{index}@{SYNTHETIC_EMAIL_DOMAIN}",
+        "password": "user123",
+        "name": f"Synthetic Subscriber {index}",
+        "role": "user",
+        "subscriptionStatus": "active" if rng.random() < profile["active_ratio"] else "inactive",
+        "brokerConnections": broker_connections,
+        "maxCapital": max_capital,
+        "token": f"token_{user_id}",
+        "synthetic": True,
+        "createdAt": created_at
+    }
+
+
+_worker_db = None
+
+
+def _seed_batch(task: tuple) -> int:
+    """Worker entry point: generate and insert one batch of subscribers"""
+    batch_index, start, stop, seed, profile = task
+
+    # Seeding per batch (rather than per worker) keeps the dataset identical
+    # regardless of how many workers were used to build it
+    rng = random.Random(f"{seed}:{batch_index}")
+    batch = [generate_synthetic_subscriber(rng, i, profile) for i in range(start, stop)]
+
+    global _worker_db
+    if _worker_db is None:
+        _worker_db = get_database()
+    _worker_db.users.insert_many(batch, ordered=False)
+    return len(batch)
+
+
+def seed_synthetic_subscribers(count: int, seed: int = 42, workers: int = None, batch_size: int = 5000,
+                               active_ratio: float = 0.7, dhan_ratio: float = 0.3):
+    """Seed `count` synthetic subscribers using parallel batched unordered inserts"""
+    db = get_database()
+    db.users.delete_many({"synthetic": True})
+
+    profile = {
+        "active_ratio": active_ratio,
+        "dhan_ratio": dhan_ratio,
+        "capital_mu": 11.9,       # median ~1.5L
+        "capital_sigma": 0.9,
+        "capital_min": 10000,
+        "capital_max": 10000000,
+        "epoch": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "history_seconds": 365 * 24 * 3600
+    }
+
+    tasks = [
+        (batch_index, start, min(start + batch_size, count), seed, profile)
+        for batch_index, start in enumerate(range(0, count, batch_size))
+    ]
+    workers = workers or os.cpu_count() or 1
+
+    print(f"\n🌱 Seeding {count} synthetic subscribers (seed={seed}, workers={workers}, batch={batch_size})")
+    started = time.perf_counter()
+    inserted = 0
+
+    # spawn: pymongo clients are not fork-safe, each worker opens its own
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for batch_count in pool.imap_unordered(_seed_batch, tasks):
+            inserted += batch_count
+            print(f"   {inserted}/{count} inserted", end="\r", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Seeded {inserted} subscribers in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):,.0f} docs/s)")
+
+    active = db.users.count_documents({"synthetic": True, "subscriptionStatus": "active"})
+    connected = db.users.count_documents({"synthetic": True, "brokerConnections.brokerName": "Dhan"})
+    print(f"   Active: {active}, with Dhan connection: {connected}")
+    return inserted
+
+
+def seed_mock_portfolios(seed: int = None, batch_size: int = 5000) -> int:
+    """Write the generated mock broker account of every subscriber without a Dhan connection"""
+    # Same seed as the API's mock broker, so accounts it creates lazily look alike
+    seed = int(os.environ.get("MOCK_BROKER_SEED", "42")) if seed is None else seed
+    db = get_database()
+    user_ids = [u["id"] for u in db.users.find({"role": "user", "brokerConnections.brokerName": {"$ne": "Dhan"}},
+                                               {"_id": 0, "id": 1}).batch_size(batch_size)]
+
+    print(f"\n💼 Seeding {len(user_ids)} mock broker portfolios (seed={seed})")
+    started = time.perf_counter()
+    written = seed_mock_accounts(db, user_ids, seed, batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Seeded {written} portfolios in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f} docs/s)")
+    return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Setup StockSync accounts")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic subscribers to seed")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for reproducible datasets")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many batch")
+    parser.add_argument("--active-ratio", type=float, default=0.7, help="Share of subscribers with an active subscription")
+    parser.add_argument("--dhan-ratio", type=float, default=0.3, help="Share of subscribers with a Dhan broker connection")
+    parser.add_argument("--mock-portfolios", action="store_true",
+                        help="Seed mock broker portfolios (MOCK_BROKER_SEED, default 42) for subscribers without Dhan")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    setup_default_accounts()
\ No newline at end of file
+    args = parse_args()
+    setup_default_accounts()
+    if args.synthetic:
+        seed_synthetic_subscribers(args.synthetic, seed=args.seed, workers=args.workers,
+                                   batch_size=args.batch_size, active_ratio=args.active_ratio,
+                                   dhan_ratio=args.dhan_ratio)
+    if args.mock_portfolios:
+        seed_mock_portfolios(batch_size=args.batch_size)
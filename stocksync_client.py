@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+StockSync API client
+
+Sync (StockSyncClient) and asyncio (AsyncStockSyncClient) clients for every
+auth, admin, user and stocks endpoint, on pooled keep-alive httpx
+connections:
+
+- idempotent GETs are retried with exponential backoff and jitter on
+  connection errors, 429 and 502/503/504 (honouring Retry-After)
+- keyset pages and NDJSON exports are exposed as iterators
+- every call is timed (client latency plus the server's Server-Timing phases)
+  and reported to `on_call` hooks and `call_stats()`
+
+    client = StockSyncClient("http://localhost:3000/api")
+    client.login("admin@stocksync.com", "admin123")
+    client.execute_order("TCS", "BUY", 5, responseMode="summary")
+    for execution in client.iter_execution_history():
+        ...
+
+    async with AsyncStockSyncClient() as client:
+        await client.login("john@example.com", "user123")
+        funds = await client.funds()
+
+with_token() returns a view that shares the connection pool, so one process
+can act as several users over the same connections.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Any, Iterator, AsyncIterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+DEFAULT_BASE_URL = "https://stocksync-app-2.preview.emergentagent.com/api"
+RETRY_STATUSES = {429, 502, 503, 504}
+# Keys holding the rows of a keyset page (execution-history, orders, execution-results)
+PAGE_KEYS = ("executions", "orders", "results")
+
+
+class StockSyncError(RuntimeError):
+    def __init__(self, method: str, endpoint: str, status_code: int, data: Any):
+        message = data.get("error") if isinstance(data, dict) else None
+        super().__init__(f"{method} {endpoint} failed with {status_code}: {message or data}")
+        self.status_code = status_code
+        self.data = data
+
+
+def parse_server_timing(value: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Parse a Server-Timing header into {phase: {"dur_ms": float, "count": int}}"""
+    phases = {}
+    for metric in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, *params = [p.strip() for p in metric.split(";")]
+        entry = {"dur_ms": 0.0, "count": 1}
+        for param in params:
+            key, _, raw = param.partition("=")
+            raw = raw.strip('"')
+            if key == "dur":
+                entry["dur_ms"] = float(raw)
+            elif key == "desc" and raw.startswith("n="):
+                entry["count"] = int(raw[2:])
+        phases[name] = entry
+    return phases
+
+
+class CallStats:
+    """Per-endpoint call counters shared by a client and its with_token() views"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.hooks: List[Callable[[Dict[str, Any]], None]] = []
+
+    def record(self, call: Dict[str, Any]):
+        with self.lock:
+            stats = self.endpoints.setdefault(call["endpoint"], {
+                "calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0
+            })
+            stats["calls"] += 1
+            stats["errors"] += 0 if call["success"] else 1
+            stats["retries"] += call["attempts"] - 1
+            stats["total_ms"] += call["elapsed_ms"]
+            stats["max_ms"] = max(stats["max_ms"], call["elapsed_ms"])
+        for hook in self.hooks:
+            hook(call)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                endpoint: {**stats, "mean_ms": round(stats["total_ms"] / stats["calls"], 3)}
+                for endpoint, stats in self.endpoints.items()
+            }
+
+
+class _StockSyncAPI:
+    """Endpoint methods shared by both clients.
+
+    Each method returns whatever `_call` returns: the decoded response body
+    for StockSyncClient, an awaitable of it for AsyncStockSyncClient.
+    """
+
+    token: Optional[str] = None
+
+    def _remember_token(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        self.token = data.get("token")
+        return data
+
+    # Auth
+    def register(self, email: str, password: str, name: str):
+        return self._call("POST", "auth/register", json={"email": email, "password": password, "name": name},
+                          on_result=self._remember_token)
+
+    def login(self, email: str, password: str):
+        return self._call("POST", "auth/login", json={"email": email, "password": password},
+                          on_result=self._remember_token)
+
+    # Public
+    def search_stocks(self, query: str = "", limit: int = None):
+        return self._call("GET", "stocks/search", params={"q": query, "limit": limit})
+
+    # User
+    def portfolio(self):
+        return self._call("GET", "user/portfolio")
+
+    def funds(self):
+        return self._call("GET", "user/funds")
+
+    def orders(self, limit: int = None, cursor: str = None):
+        return self._call("GET", "user/orders", params={"limit": limit, "cursor": cursor})
+
+    def connect_broker(self, broker_name: str, client_id: str = None, access_token: str = None,
+                       api_key: str = "", api_secret: str = ""):
+        return self._call("POST", "user/connect-broker", json={
+            "brokerName": broker_name, "clientId": client_id, "accessToken": access_token,
+            "apiKey": api_key, "apiSecret": api_secret
+        })
+
+    def broker_connections(self):
+        """Connection statuses (pending/connected/error/expired) without credentials"""
+        return self._call("GET", "user/broker-connections")
+
+    def update_capital(self, max_capital: float):
+        return self._call("POST", "user/update-capital", json={"maxCapital": max_capital})
+
+    # Admin
+    @staticmethod
+    def _order_body(symbol: str, transaction_type: str, quantity: int, order_type: str, product_type: str,
+                    price: Optional[float], options: Dict[str, Any]) -> Dict[str, Any]:
+        body = {"symbol": symbol, "transactionType": transaction_type, "quantity": quantity,
+                "orderType": order_type, "productType": product_type, **options}
+        if price is not None:
+            body["price"] = price
+        return body
+
+    def execute_order(self, symbol: str, transaction_type: str, quantity: int, order_type: str = "MARKET",
+                      product_type: str = "CNC", price: float = None, background: bool = False, **options):
+        """options are passed through as-is (responseMode, queue, concurrency, ...)"""
+        body = self._order_body(symbol, transaction_type, quantity, order_type, product_type, price, options)
+        if background:
+            body["async"] = True
+        return self._call("POST", "admin/execute-order", json=body)
+
+    def stream_execution(self, symbol: str, transaction_type: str, quantity: int, order_type: str = "MARKET",
+                         product_type: str = "CNC", price: float = None, **options):
+        """Execute an order and iterate its progress lines: started, one result per subscriber, completed"""
+        body = self._order_body(symbol, transaction_type, quantity, order_type, product_type, price, options)
+        return self.stream_ndjson("POST", "admin/execute-order", json={**body, "stream": True})
+
+    def execute_basket(self, legs: List[Dict[str, Any]], capital_fraction: float = None, **options):
+        """legs: [{"symbol", "transactionType", "quantity", optional "price", "weight", "orderType", "productType"}]"""
+        body = {"legs": legs, **options}
+        if capital_fraction is not None:
+            body["capitalFraction"] = capital_fraction
+        return self._call("POST", "admin/execute-basket", json=body)
+
+    def preview_order(self, symbol: str, transaction_type: str, quantity: int, price: float = None,
+                      rows: int = None):
+        body = {"symbol": symbol, "transactionType": transaction_type, "quantity": quantity}
+        if price is not None:
+            body["price"] = price
+        if rows is not None:
+            body["rows"] = rows
+        return self._call("POST", "admin/preview-order", json=body)
+
+    def execution_status(self, execution_id: str):
+        return self._call("GET", "admin/execution-status", params={"executionId": execution_id})
+
+    def execution_results(self, execution_id: str, limit: int = None, cursor: str = None):
+        return self._call("GET", "admin/execution-results",
+                          params={"executionId": execution_id, "limit": limit, "cursor": cursor})
+
+    def execution_history(self, limit: int = None, cursor: str = None, user_id: str = None):
+        return self._call("GET", "admin/execution-history",
+                          params={"limit": limit, "cursor": cursor, "userId": user_id})
+
+    def execution_stats(self, execution_id: str = None, symbol: str = None, user_id: str = None,
+                        from_day: str = None, to_day: str = None):
+        return self._call("GET", "admin/execution-stats", params={
+            "executionId": execution_id, "symbol": symbol, "userId": user_id, "from": from_day, "to": to_day
+        })
+
+    def subscribers(self):
+        return self._call("GET", "admin/subscribers")
+
+    def update_subscription(self, user_id: str, subscription_status: str):
+        return self._call("POST", "admin/update-subscription",
+                          json={"userId": user_id, "subscriptionStatus": subscription_status})
+
+    def prewarm_snapshots(self, kinds: List[str] = None, concurrency: int = None):
+        body = {}
+        if kinds:
+            body["kinds"] = kinds
+        if concurrency:
+            body["concurrency"] = concurrency
+        return self._call("POST", "admin/prewarm-snapshots", json=body)
+
+    def cache_stats(self):
+        return self._call("GET", "admin/cache-stats")
+
+    def broker_stats(self):
+        return self._call("GET", "admin/broker-stats")
+
+    def reconciler_stats(self):
+        return self._call("GET", "admin/reconciler-stats")
+
+    def verifier_stats(self):
+        return self._call("GET", "admin/verifier-stats")
+
+    def metrics(self):
+        """Prometheus text exposition"""
+        return self._call("GET", "admin/metrics")
+
+    # Shared plumbing
+    def _headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        merged = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        merged.update(headers or {})
+        return merged
+
+    def _backoff_s(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff_s)
+            except ValueError:
+                pass
+        return min(self.max_backoff_s, self.backoff_s * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _result(self, method: str, endpoint: str, response: Optional[httpx.Response], error: Optional[Exception],
+                elapsed_ms: float, attempts: int) -> Dict[str, Any]:
+        if response is None:
+            result = {"status_code": 0, "data": {"error": str(error)}, "success": False, "server_timing": {}}
+        else:
+            content_type = response.headers.get("content-type", "")
+            if not response.content:
+                data = {}
+            elif "json" in content_type:
+                try:
+                    data = response.json()
+                except json.JSONDecodeError as e:
+                    data = {"error": f"Invalid JSON response: {e}"}
+            else:
+                data = response.text
+            result = {
+                "status_code": response.status_code,
+                "data": data,
+                "success": response.status_code < 400,
+                "server_timing": parse_server_timing(response.headers.get("Server-Timing"))
+            }
+        result.update(elapsed_ms=elapsed_ms, attempts=attempts)
+        self._stats.record({"method": method, "endpoint": endpoint.split("?")[0], **result})
+        return result
+
+    def _retryable(self, method: str, attempt: int, response: Optional[httpx.Response]) -> bool:
+        if method != "GET" or attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUSES
+
+    @staticmethod
+    def _target(endpoint: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Split a query string off `endpoint` and merge it with `params` (None values dropped).
+
+        httpx replaces rather than extends a URL's query when params are given.
+        """
+        path, _, query = endpoint.partition("?")
+        merged = dict(parse_qsl(query))
+        merged.update({k: v for k, v in (params or {}).items() if v is not None})
+        return path, merged or None
+
+    @staticmethod
+    def _unwrap(method: str, endpoint: str, result: Dict[str, Any], on_result: Callable = None):
+        if not result["success"]:
+            raise StockSyncError(method, endpoint, result["status_code"], result["data"])
+        return on_result(result["data"]) if on_result else result["data"]
+
+    def on_call(self, hook: Callable[[Dict[str, Any]], None]):
+        """Call `hook(call)` after every request (shared with with_token() views)"""
+        self._stats.hooks.append(hook)
+
+    def call_stats(self) -> Dict[str, Dict[str, float]]:
+        return self._stats.summary()
+
+
+class StockSyncClient(_StockSyncAPI):
+    def __init__(self, base_url: str = None, token: str = None, timeout: float = 30, max_connections: int = 100,
+                 max_retries: int = 3, backoff_s: float = 0.2, max_backoff_s: float = 5.0,
+                 _http: httpx.Client = None, _stats: CallStats = None):
+        self.base_url = (base_url or os.environ.get("STOCKSYNC_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.token = token
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._http = _http or httpx.Client(
+            base_url=self.base_url, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self._stats = _stats or CallStats()
+
+    def with_token(self, token: str) -> "StockSyncClient":
+        return StockSyncClient(self.base_url, token, max_retries=self.max_retries, backoff_s=self.backoff_s,
+                               max_backoff_s=self.max_backoff_s, _http=self._http, _stats=self._stats)
+
+    def request(self, method: str, endpoint: str, json: Any = None, params: Dict[str, Any] = None,
+                headers: Dict[str, str] = None) -> Dict[str, Any]:
+        """Send one call; returns {status_code, data, success, elapsed_ms, server_timing, attempts}"""
+        method = method.upper()
+        path, query = self._target(endpoint, params)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = self._http.request(method, path, json=json, params=query,
+                                              headers=self._headers(headers))
+            except httpx.HTTPError as e:
+                error = e
+            if not self._retryable(method, attempt, response):
+                break
+            time.sleep(self._backoff_s(attempt, response))
+            attempt += 1
+        return self._result(method, endpoint, response, error, (time.perf_counter() - started) * 1000, attempt + 1)
+
+    def _call(self, method: str, endpoint: str, json: Any = None, params: Dict[str, Any] = None,
+              on_result: Callable = None):
+        return self._unwrap(method, endpoint, self.request(method, endpoint, json, params), on_result)
+
+    def paginate(self, endpoint: str, page_size: int = 1000, **params) -> Iterator[Dict[str, Any]]:
+        """Yield every row of a keyset-paged endpoint"""
+        cursor = None
+        while True:
+            page = self._call("GET", endpoint, params={**params, "limit": page_size, "cursor": cursor})
+            yield from next((page[key] for key in PAGE_KEYS if key in page), [])
+            cursor = page.get("nextCursor")
+            if not cursor:
+                return
+
+    def stream_ndjson(self, method: str, endpoint: str, json: Any = None,
+                      params: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Yield the records of an NDJSON export one line at a time (constant memory)"""
+        path, query = self._target(endpoint, params)
+        with self._http.stream(method, path, json=json, params=query,
+                               headers=self._headers(None), timeout=httpx.Timeout(10, read=300)) as response:
+            if response.status_code >= 400:
+                response.read()
+                raise StockSyncError(method, endpoint, response.status_code, response.text)
+            for line in response.iter_lines():
+                if line:
+                    yield json_loads(line)
+
+    def iter_execution_history(self, page_size: int = 1000, user_id: str = None):
+        return self.paginate("admin/execution-history", page_size, userId=user_id)
+
+    def iter_orders(self, page_size: int = 1000):
+        return self.paginate("user/orders", page_size)
+
+    def iter_execution_results(self, execution_id: str, page_size: int = 1000):
+        return self.paginate("admin/execution-results", page_size, executionId=execution_id)
+
+    def export_executions(self, endpoint: str = "admin/execution-history", **params):
+        return self.stream_ndjson("GET", endpoint, params={**params, "format": "ndjson"})
+
+    def stream_preview(self, symbol: str, transaction_type: str, quantity: int, price: float = None):
+        body = {"symbol": symbol, "transactionType": transaction_type, "quantity": quantity, "stream": True}
+        if price is not None:
+            body["price"] = price
+        return self.stream_ndjson("POST", "admin/preview-order", json=body)
+
+    def close(self):
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncStockSyncClient(_StockSyncAPI):
+    def __init__(self, base_url: str = None, token: str = None, timeout: float = 30, max_connections: int = 100,
+                 max_retries: int = 3, backoff_s: float = 0.2, max_backoff_s: float = 5.0,
+                 _http: httpx.AsyncClient = None, _stats: CallStats = None):
+        self.base_url = (base_url or os.environ.get("STOCKSYNC_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.token = token
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._http = _http or httpx.AsyncClient(
+            base_url=self.base_url, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self._stats = _stats or CallStats()
+
+    def with_token(self, token: str) -> "AsyncStockSyncClient":
+        return AsyncStockSyncClient(self.base_url, token, max_retries=self.max_retries, backoff_s=self.backoff_s,
+                                    max_backoff_s=self.max_backoff_s, _http=self._http, _stats=self._stats)
+
+    async def request(self, method: str, endpoint: str, json: Any = None, params: Dict[str, Any] = None,
+                      headers: Dict[str, str] = None) -> Dict[str, Any]:
+        method = method.upper()
+        path, query = self._target(endpoint, params)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = await self._http.request(method, path, json=json, params=query,
+                                                    headers=self._headers(headers))
+            except httpx.HTTPError as e:
+                error = e
+            if not self._retryable(method, attempt, response):
+                break
+            await asyncio.sleep(self._backoff_s(attempt, response))
+            attempt += 1
+        return self._result(method, endpoint, response, error, (time.perf_counter() - started) * 1000, attempt + 1)
+
+    async def _call(self, method: str, endpoint: str, json: Any = None, params: Dict[str, Any] = None,
+                    on_result: Callable = None):
+        return self._unwrap(method, endpoint, await self.request(method, endpoint, json, params), on_result)
+
+    async def paginate(self, endpoint: str, page_size: int = 1000, **params) -> AsyncIterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            page = await self._call("GET", endpoint, params={**params, "limit": page_size, "cursor": cursor})
+            for row in next((page[key] for key in PAGE_KEYS if key in page), []):
+                yield row
+            cursor = page.get("nextCursor")
+            if not cursor:
+                return
+
+    async def stream_ndjson(self, method: str, endpoint: str, json: Any = None,
+                            params: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        path, query = self._target(endpoint, params)
+        async with self._http.stream(method, path, json=json, params=query,
+                                     headers=self._headers(None), timeout=httpx.Timeout(10, read=300)) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise StockSyncError(method, endpoint, response.status_code, response.text)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json_loads(line)
+
+    def iter_execution_history(self, page_size: int = 1000, user_id: str = None):
+        return self.paginate("admin/execution-history", page_size, userId=user_id)
+
+    def iter_orders(self, page_size: int = 1000):
+        return self.paginate("user/orders", page_size)
+
+    def iter_execution_results(self, execution_id: str, page_size: int = 1000):
+        return self.paginate("admin/execution-results", page_size, executionId=execution_id)
+
+    def export_executions(self, endpoint: str = "admin/execution-history", **params):
+        return self.stream_ndjson("GET", endpoint, params={**params, "format": "ndjson"})
+
+    def stream_preview(self, symbol: str, transaction_type: str, quantity: int, price: float = None):
+        body = {"symbol": symbol, "transactionType": transaction_type, "quantity": quantity, "stream": True}
+        if price is not None:
+            body["price"] = price
+        return self.stream_ndjson("POST", "admin/preview-order", json=body)
+
+    async def close(self):
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+# `json` is shadowed by request-body parameters inside the client methods
+json_loads = json.loads
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+StockSync fan-out scaling benchmarks
+
+Seeds N active subscribers into a local Mongo, drives admin/execute-order,
+admin/execution-history and user/orders against a running app, and records
+wall time, per-subscriber cost and Mongo operation counts for each size.
+
+    python -m tests.bench_fanout run --sizes 100,1000,10000 --output bench.json
+    python -m tests.bench_fanout compare tests/benchmarks/fanout_baseline.json bench.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+from backend_test import StockSyncTester
+from setup_default_accounts import (
+    get_database,
+    setup_default_accounts,
+    seed_synthetic_subscribers,
+    seed_mock_portfolios,
+    SYNTHETIC_EMAIL_DOMAIN
+)
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+DEFAULT_BASELINE = "tests/benchmarks/fanout_baseline.json"
+
+# Metrics compared by `compare`; lower is better for all of them
+COMPARED_METRICS = ("wall_s", "per_subscriber_ms")
+
+BENCH_ORDER = {
+    "symbol": "ITC",
+    "transactionType": "BUY",
+    "orderType": "MARKET",
+    "quantity": 1,
+    "productType": "CNC"
+}
+
+
+def mongo_opcounters(db) -> Dict[str, int]:
+    counters = db.command("serverStatus")["opcounters"]
+    return {k: int(v) for k, v in counters.items()}
+
+
+def opcounter_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {k: after[k] - before.get(k, 0) for k in after}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class FanoutBenchmark:
+    def __init__(self, base_url: str = None, repeat: int = 3, workers: int = None, dhan_ratio: float = 0.0):
+        self.tester = StockSyncTester(base_url)
+        self.db = get_database()
+        self.repeat = repeat
+        self.workers = workers
+        self.dhan_ratio = dhan_ratio
+
+    def login(self, credentials: Dict) -> str:
+        response = self.tester.make_request('POST', 'auth/login', credentials)
+        if not response["success"]:
+            raise RuntimeError(f"Login failed for {credentials['email']}: {response['data']}")
+        return response["data"]["token"]
+
+    def measure(self, method: str, endpoint: str, data: Dict = None, token: str = None) -> Dict[str, Any]:
+        """Time one endpoint `repeat` times and keep the median run"""
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        runs = []
+        for _ in range(self.repeat):
+            before = mongo_opcounters(self.db)
+            started = time.perf_counter()
+            response = self.tester.make_request(method, endpoint, data, headers)
+            elapsed = time.perf_counter() - started
+            ops = opcounter_delta(before, mongo_opcounters(self.db))
+            if not response["success"]:
+                raise RuntimeError(f"{endpoint} failed with status {response['status_code']}: {response['data']}")
+            runs.append((elapsed, ops, response["data"]))
+
+        runs.sort(key=lambda run: run[0])
+        elapsed, ops, data = runs[len(runs) // 2]
+        return {
+            "wall_s": round(elapsed, 4),
+            "wall_runs_s": [round(run[0], 4) for run in runs],
+            "mongo_ops": ops,
+            "response": data
+        }
+
+    def run_size(self, size: int) -> Dict[str, Any]:
+        print(f"\n=== Fan-out benchmark: {size} subscribers ===")
+        setup_default_accounts()
+        seed_synthetic_subscribers(size, workers=self.workers, active_ratio=1.0, dhan_ratio=self.dhan_ratio)
+        # Same starting portfolios every run, so mock fills are repeatable
+        seed_mock_portfolios()
+        self.db.order_executions.delete_many({})
+
+        admin_token = self.login(self.tester.admin_credentials)
+        user_token = self.login({"email": f"subscriber0@{SYNTHETIC_EMAIL_DOMAIN}", "password": "user123"})
+
+        execute = self.measure('POST', 'admin/execute-order', BENCH_ORDER, admin_token)
+        subscribers = execute["response"].get("totalSubscribers", size)
+        execute["per_subscriber_ms"] = round(execute["wall_s"] * 1000 / max(subscribers, 1), 4)
+        execute["subscribers"] = subscribers
+        execute["failed"] = execute["response"].get("failedExecutions", 0)
+
+        history = self.measure('GET', 'admin/execution-history', token=admin_token)
+        orders = self.measure('GET', 'user/orders', token=user_token)
+
+        results = {}
+        for endpoint, result in (("admin/execute-order", execute),
+                                 ("admin/execution-history", history),
+                                 ("user/orders", orders)):
+            result.pop("response")
+            results[endpoint] = result
+            print(f"  {endpoint:<26} {result['wall_s'] * 1000:>10.1f} ms  "
+                  f"mongo ops: {sum(result['mongo_ops'].values())}")
+        print(f"  per-subscriber cost: {execute['per_subscriber_ms']:.3f} ms")
+        return results
+
+    def run(self, sizes: List[int]) -> Dict[str, Any]:
+        return {
+            "version": RESULTS_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "base_url": self.tester.base_url,
+            "repeat": self.repeat,
+            "results": {str(size): self.run_size(size) for size in sizes}
+        }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a description of every metric that regressed beyond `threshold`"""
+    if baseline.get("version") != current.get("version"):
+        raise ValueError(f"Results version mismatch: baseline v{baseline.get('version')}, "
+                         f"current v{current.get('version')}")
+
+    regressions = []
+    print(f"{'Size':>7}  {'Endpoint':<26}{'Metric':<19}{'Baseline':>12}{'Current':>12}{'Change':>9}")
+    for size, endpoints in current["results"].items():
+        for endpoint, metrics in endpoints.items():
+            base_metrics = baseline["results"].get(size, {}).get(endpoint)
+            if not base_metrics:
+                continue
+            for metric in COMPARED_METRICS:
+                if metric not in metrics or metric not in base_metrics:
+                    continue
+                base_value, value = base_metrics[metric], metrics[metric]
+                change = (value - base_value) / base_value if base_value else 0.0
+                flag = ""
+                if change > threshold:
+                    flag = "  ❌"
+                    regressions.append(f"{size} {endpoint} {metric}: {base_value} -> {value} ({change:+.1%})")
+                print(f"{size:>7}  {endpoint:<26}{metric:<19}{base_value:>12.3f}{value:>12.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="StockSync fan-out scaling benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Seed subscribers and benchmark the fan-out endpoints")
+    run.add_argument("--base-url", help="API base URL (default: $STOCKSYNC_BASE_URL)")
+    run.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                     help="Comma-separated subscriber counts")
+    run.add_argument("--repeat", type=int, default=3, help="Runs per endpoint (median is kept)")
+    run.add_argument("--workers", type=int, help="Seeding worker processes")
+    run.add_argument("--dhan-ratio", type=float, default=0.0,
+                     help="Share of subscribers routed through DhanBroker (use with the stand-in server)")
+    run.add_argument("--output", default="bench_fanout.json", help="Where to write the results")
+
+    compare = sub.add_parser("compare", help="Flag regressions against a baseline")
+    compare.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before flagging (0.15 = 15%%)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "run":
+        sizes = [int(s) for s in args.sizes.split(",")]
+        bench = FanoutBenchmark(args.base_url, repeat=args.repeat, workers=args.workers, dhan_ratio=args.dhan_ratio)
+        results = bench.run(sizes)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
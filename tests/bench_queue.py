@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+StockSync execution queue scaling benchmark
+
+Seeds N active subscribers, queues one admin/execute-order with `queue: true`
+per run and drains it with 1, 2, 4, ... execution_worker.py processes.
+Reports tasks/s and scaling efficiency relative to a single worker
+(throughput(k) / (k * throughput(1))).
+
+    python -m tests.bench_queue --subscribers 20000 --workers 1,2,4,8 --mock-latency-ms 20
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+from backend_test import StockSyncTester
+from setup_default_accounts import get_database, setup_default_accounts, seed_synthetic_subscribers, seed_mock_portfolios
+
+BENCH_ORDER = {
+    "symbol": "ITC",
+    "transactionType": "BUY",
+    "orderType": "MARKET",
+    "quantity": 1,
+    "productType": "CNC",
+    "queue": True
+}
+
+
+class QueueBenchmark:
+    def __init__(self, base_url: str = None, batch_size: int = 50, concurrency: int = 8,
+                 mock_latency_ms: float = 20, timeout_s: float = 600):
+        self.tester = StockSyncTester(base_url)
+        self.db = get_database()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.mock_latency_ms = mock_latency_ms
+        self.timeout_s = timeout_s
+        self.token = None
+
+    def login(self):
+        response = self.tester.make_request('POST', 'auth/login', self.tester.admin_credentials)
+        if not response["success"]:
+            raise RuntimeError(f"Admin login failed: {response['data']}")
+        self.token = response["data"]["token"]
+
+    def enqueue(self) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        response = self.tester.make_request('POST', 'admin/execute-order', BENCH_ORDER, headers)
+        if response["status_code"] != 202:
+            raise RuntimeError(f"execute-order failed with {response['status_code']}: {response['data']}")
+        return response["data"]
+
+    def spawn_workers(self, count: int) -> List[subprocess.Popen]:
+        command = [sys.executable, "execution_worker.py", "--exit-when-idle",
+                   "--batch-size", str(self.batch_size), "--concurrency", str(self.concurrency),
+                   "--mock-latency-ms", str(self.mock_latency_ms)]
+        return [subprocess.Popen(command, stdout=subprocess.DEVNULL) for _ in range(count)]
+
+    def run_workers(self, count: int) -> Dict[str, Any]:
+        self.db.execution_tasks.delete_many({})
+        self.db.order_executions.delete_many({})
+        # Every worker count starts from the same mock portfolios
+        seed_mock_portfolios()
+        started = time.perf_counter()
+        job = self.enqueue()
+        enqueue_s = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        workers = self.spawn_workers(count)
+        try:
+            while True:
+                status = self.db.execution_jobs.find_one({"executionId": job["executionId"]}, {"_id": 0})
+                if status["status"] == "completed":
+                    break
+                if time.perf_counter() - drain_started > self.timeout_s:
+                    raise RuntimeError(f"{count} workers did not finish within {self.timeout_s}s "
+                                       f"({status['processed']}/{status['totalSubscribers']})")
+                time.sleep(0.05)
+            drain_s = time.perf_counter() - drain_started
+        finally:
+            for worker in workers:
+                worker.wait(timeout=30)
+
+        tasks = status["totalSubscribers"]
+        duplicates = self.db.order_executions.count_documents({"executionId": job["executionId"]}) - tasks
+        return {
+            "workers": count,
+            "tasks": tasks,
+            "enqueue_s": round(enqueue_s, 3),
+            "drain_s": round(drain_s, 3),
+            "tasks_per_s": round(tasks / drain_s, 1),
+            "successful": status["successfulExecutions"],
+            "failed": status["failedExecutions"],
+            "duplicate_executions": duplicates
+        }
+
+    def run(self, subscribers: int, worker_counts: List[int]) -> Dict[str, Any]:
+        setup_default_accounts()
+        seed_synthetic_subscribers(subscribers, active_ratio=1.0, dhan_ratio=0.0)
+        self.login()
+
+        runs = []
+        for count in worker_counts:
+            print(f"\n=== {count} worker process(es) ===")
+            result = self.run_workers(count)
+            base = runs[0] if runs else result
+            result["efficiency"] = round(result["tasks_per_s"] / (base["tasks_per_s"] * count / base["workers"]), 3)
+            runs.append(result)
+            print(f"  {result['tasks']} tasks in {result['drain_s']:.2f}s -> {result['tasks_per_s']:.0f} tasks/s "
+                  f"(efficiency {result['efficiency']:.0%}, enqueue {result['enqueue_s']:.2f}s)")
+            if result["duplicate_executions"]:
+                print(f"  ❌ {result['duplicate_executions']} duplicate execution records")
+
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "subscribers": subscribers,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "mock_latency_ms": self.mock_latency_ms,
+            "runs": runs
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Execution queue worker scaling benchmark")
+    parser.add_argument("--base-url", help="API base URL (default: $STOCKSYNC_BASE_URL)")
+    parser.add_argument("--subscribers", type=int, default=20000, help="Synthetic subscribers (tasks per run)")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker process counts")
+    parser.add_argument("--batch-size", type=int, default=50, help="Tasks claimed per lease")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tasks placed in parallel per worker")
+    parser.add_argument("--mock-latency-ms", type=float, default=20, help="Simulated broker round-trip")
+    parser.add_argument("--timeout", type=float, default=600, help="Max seconds to drain one run")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    bench = QueueBenchmark(args.base_url, batch_size=args.batch_size, concurrency=args.concurrency,
+                           mock_latency_ms=args.mock_latency_ms, timeout_s=args.timeout)
+    results = bench.run(args.subscribers, [int(n) for n in args.workers.split(",")])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    return 1 if any(run["duplicate_executions"] for run in results["runs"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Cross-check of admin/preview-order sizing
+
+Seeds N synthetic subscribers, recomputes BUY/SELL sizing for all of them with
+vectorized NumPy straight from the users collection, and diffs the result
+against the rows streamed by admin/preview-order and the totals of its
+aggregation. Exits non-zero on any mismatch or if the preview exceeds its
+latency budget.
+
+    python -m tests.validate_sizing --users 100000
+    python -m tests.validate_sizing --no-seed --side SELL --symbol TCS --quantity 40
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+
+from backend_test import StockSyncTester
+from execution_worker import BUY_CAPITAL_FRACTION
+from setup_default_accounts import get_database, setup_default_accounts, seed_synthetic_subscribers, seed_mock_portfolios
+
+# Reference prices from dhanMock.stocks, used when --price is not given
+REFERENCE_PRICES = {"RELIANCE": 2950.50, "TCS": 4120.75, "HDFCBANK": 1580.25, "INFY": 1805.60, "ITC": 465.35}
+
+BUY_REJECTION = "Insufficient funds - cannot afford even 1 share"
+SELL_REJECTION = "Stock not available in portfolio"
+
+
+def load_mock_holdings(db, symbol: str) -> Dict[str, int]:
+    """{userId: quantity of `symbol`} for every mock broker account"""
+    projection = {"_id": 0, "userId": 1, "holdings": {"$elemMatch": {"symbol": symbol}}}
+    return {account["userId"]: sum(h["quantity"] for h in account.get("holdings", []))
+            for account in db.mock_accounts.find({}, projection).batch_size(10000)}
+
+
+def load_subscribers(db, symbol: str) -> Dict[str, np.ndarray]:
+    """Active subscribers as column arrays, with their mock holdings of `symbol`"""
+    mock_holdings = load_mock_holdings(db, symbol)
+    ids, capital, connected = [], [], []
+    cursor = db.users.find({"subscriptionStatus": "active", "role": "user"},
+                           {"_id": 0, "id": 1, "maxCapital": 1, "brokerConnections": 1})
+    for user in cursor.batch_size(10000):
+        ids.append(user["id"])
+        capital.append(user.get("maxCapital") or 0)
+        connected.append(any(bc.get("brokerName") == "Dhan" and bc.get("status") == "connected"
+                             for bc in user.get("brokerConnections") or []))
+    return {
+        "ids": np.array(ids, dtype=object),
+        "max_capital": np.array(capital, dtype=np.float64),
+        "connected": np.array(connected, dtype=bool),
+        "has_mock_account": np.array([user_id in mock_holdings for user_id in ids], dtype=bool),
+        "mock_held": np.array([mock_holdings.get(user_id, 0) for user_id in ids], dtype=np.float64)
+    }
+
+
+def expected_sizing(subscribers: Dict[str, np.ndarray], side: str, symbol: str, quantity: int,
+                    price: float, sizing_price: float = None) -> Dict[str, np.ndarray]:
+    """Vectorized BUY (BUY_CAPITAL_FRACTION of maxCapital at sizing_price) and SELL (capped at mock holdings) sizing"""
+    if side == "BUY":
+        affordable = np.floor(subscribers["max_capital"] * BUY_CAPITAL_FRACTION / (sizing_price or price))
+        qty = np.minimum(quantity, affordable)
+        rejection = BUY_REJECTION
+    else:
+        # Broker holdings and mock accounts not created yet are unknown to the preview
+        unknown = subscribers["connected"] | ~subscribers["has_mock_account"]
+        qty = np.where(unknown, quantity, np.minimum(quantity, subscribers["mock_held"]))
+        rejection = SELL_REJECTION
+
+    qty = np.maximum(qty, 0).astype(np.int64)
+    return {
+        "quantity": qty,
+        "notional": qty * price,
+        "rejected": qty <= 0,
+        "reason": np.where(qty <= 0, rejection, None)
+    }
+
+
+class SizingValidator:
+    def __init__(self, base_url: str = None, budget_s: float = 1.0):
+        self.tester = StockSyncTester(base_url)
+        self.db = get_database()
+        self.budget_s = budget_s
+        self.token = None
+
+    def login(self):
+        response = self.tester.make_request('POST', 'auth/login', self.tester.admin_credentials)
+        if not response["success"]:
+            raise RuntimeError(f"Admin login failed: {response['data']}")
+        self.token = response["data"]["token"]
+
+    def preview_totals(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        response = self.tester.make_request('POST', 'admin/preview-order', {**order, "rows": 0}, headers)
+        if not response["success"]:
+            raise RuntimeError(f"admin/preview-order failed with {response['status_code']}: {response['data']}")
+        return {**response["data"], "elapsed_ms": response["elapsed_ms"]}
+
+    def preview_rows(self, order: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        client = self.tester.client.with_token(self.token)
+        rows = {}
+        for row in client.stream_ndjson('POST', 'admin/preview-order', json={**order, "stream": True}):
+            rows[row["userId"]] = row
+        return rows
+
+    def diff_rows(self, subscribers: Dict[str, np.ndarray], expected: Dict[str, np.ndarray],
+                  rows: Dict[str, Dict[str, Any]]) -> List[str]:
+        problems = []
+        seen = set()
+        for i, user_id in enumerate(subscribers["ids"]):
+            row = rows.get(user_id)
+            if row is None:
+                problems.append(f"{user_id}: missing from preview")
+                continue
+            seen.add(user_id)
+            if row["quantity"] != expected["quantity"][i]:
+                problems.append(f"{user_id}: quantity {row['quantity']} != {expected['quantity'][i]}")
+            if not np.isclose(row["notional"], expected["notional"][i]):
+                problems.append(f"{user_id}: notional {row['notional']} != {expected['notional'][i]}")
+            if row["reason"] != expected["reason"][i]:
+                problems.append(f"{user_id}: reason {row['reason']!r} != {expected['reason'][i]!r}")
+        problems.extend(f"{user_id}: not an active subscriber" for user_id in rows.keys() - seen)
+        return problems
+
+    def diff_totals(self, expected: Dict[str, np.ndarray], totals: Dict[str, Any]) -> List[str]:
+        checks = {
+            "subscribers": len(expected["quantity"]),
+            "rejected": int(expected["rejected"].sum()),
+            "sizable": int((~expected["rejected"]).sum()),
+            "totalQuantity": int(expected["quantity"].sum()),
+            "totalNotional": float(expected["notional"].sum())
+        }
+        return [f"totals.{key}: {totals.get(key)} != {value}" for key, value in checks.items()
+                if not np.isclose(totals.get(key, 0), value)]
+
+    def validate(self, order: Dict[str, Any], price: float) -> bool:
+        print(f"\n=== Validating {order['transactionType']} {order['quantity']} {order['symbol']} @ {price} ===")
+        started = time.perf_counter()
+        subscribers = load_subscribers(self.db, order["symbol"])
+        # BUY orders are sized at the reference price when the instrument has one
+        sizing_price = REFERENCE_PRICES.get(order["symbol"]) or price
+        expected = expected_sizing(subscribers, order["transactionType"], order["symbol"], order["quantity"], price,
+                                   sizing_price)
+        print(f"  NumPy sizing for {len(subscribers['ids'])} subscribers in {time.perf_counter() - started:.2f}s")
+
+        preview = self.preview_totals(order)
+        print(f"  Preview aggregation: {preview['durationMs']} ms server, {preview['elapsed_ms']:.0f} ms client")
+        rows = self.preview_rows(order)
+        print(f"  Streamed {len(rows)} preview rows")
+
+        problems = self.diff_totals(expected, preview["totals"]) + self.diff_rows(subscribers, expected, rows)
+        if preview["elapsed_ms"] > self.budget_s * 1000:
+            problems.append(f"preview took {preview['elapsed_ms']:.0f} ms (budget {self.budget_s * 1000:.0f} ms)")
+
+        for problem in problems[:20]:
+            print(f"  ❌ {problem}")
+        if len(problems) > 20:
+            print(f"  ... {len(problems) - 20} more")
+        if not problems:
+            print(f"  ✅ {len(rows)} rows and totals match")
+        return not problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cross-check admin/preview-order against NumPy sizing")
+    parser.add_argument("--base-url", help="API base URL (default: $STOCKSYNC_BASE_URL)")
+    parser.add_argument("--users", type=int, default=100000, help="Synthetic subscribers to seed")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic subscribers")
+    parser.add_argument("--no-seed", action="store_true", help="Validate against the users already in Mongo")
+    parser.add_argument("--symbol", default="RELIANCE")
+    parser.add_argument("--side", choices=["BUY", "SELL", "both"], default="both")
+    parser.add_argument("--quantity", type=int, default=10)
+    parser.add_argument("--price", type=float, help="Order price (default: the mock reference price)")
+    parser.add_argument("--budget", type=float, default=1.0, help="Max preview latency in seconds")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    price = args.price or REFERENCE_PRICES.get(args.symbol)
+    if not price:
+        print(f"No reference price for {args.symbol}; pass --price")
+        return 2
+
+    if not args.no_seed:
+        setup_default_accounts()
+        seed_synthetic_subscribers(args.users, seed=args.seed)
+        seed_mock_portfolios()
+
+    validator = SizingValidator(args.base_url, budget_s=args.budget)
+    validator.login()
+    sides = ["BUY", "SELL"] if args.side == "both" else [args.side]
+    ok = True
+    for side in sides:
+        order = {"symbol": args.symbol, "transactionType": side, "quantity": args.quantity}
+        if args.price:
+            order["price"] = args.price
+        ok = validator.validate(order, price) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())